@@ -17,8 +17,19 @@ from src.core.utils import (
     parse_date
 )
 from src.core.date_handler import check_expiration_column, apply_date_replacement
-from src.services.zip_builder import generate_notes_zip
-from src.services.pdf_engine import get_html_template, list_templates
+from src.services.upload_cache import load_upload, get_preview
+from src.services.zip_builder import generate_notes_zip, generate_notes_pdf, resolve_worker_count
+from src.services.preflight import run_preflight
+from src.services.job_scheduler import (
+    JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED, SchedulerFullError, get_scheduler
+)
+from src.services.pdf_engine import (
+    get_compiled_template,
+    get_template_stats,
+    has_native_layout,
+    list_templates,
+    resolve_pdf_engine
+)
 from src.core.logger import logger
 from config.settings import settings
 
@@ -65,6 +76,7 @@ def check_password():
             # O token é apenas a senha em texto plano (simples para este caso)
             if user in secrets_pass and secrets_pass[user] == token:
                 st.session_state["password_correct"] = True
+                st.session_state["usuario"] = user
                 logger.info(f"Auto-login bem-sucedido para: {user}")
                 return True
         except:
@@ -80,6 +92,7 @@ def check_password():
             secrets_pass = st.secrets.get("passwords", {})
             if usuario in secrets_pass and secrets_pass[usuario] == senha:
                 st.session_state["password_correct"] = True
+                st.session_state["usuario"] = usuario
                 if lembrar:
                     # Cookie expira em 30 dias
                     val = f"{usuario}|{senha}"
@@ -115,18 +128,114 @@ st.markdown("""
 # ==========================================
 st.title(f"⚡ {settings.APP_NAME} | Gerador de Notas")
 
+# ==========================================
+# 📦 GERAÇÕES EM SEGUNDO PLANO
+# ==========================================
+# As gerações rodam na fila compartilhada do servidor (src/services/job_scheduler.py) e
+# sobrevivem a reruns e reconexões. Ao terminar, o ZIP é entregue uma vez à sessão
+# (receber_resultado) e sai do agendador; a sessão guarda o arquivo (no modo "disk", em disco),
+# não os bytes, e o fecha ao descartar o job.
+usuario = st.session_state.get("usuario", "anonimo")
+
+def receber_resultado(job):
+    """
+    Na primeira vez que a sessão vê o job concluído, retira o resultado do agendador e guarda o
+    arquivo do ZIP na sessão (sem lê-lo: no modo "disk" ele continua no disco). O buffer é só
+    desta sessão e é fechado por descartar_job (no modo "disk", o arquivo temporário é apagado).
+    """
+    entregues = st.session_state.setdefault("resultados_jobs", {})
+    if job.id not in entregues:
+        resultado = get_scheduler().take_result(job.id)
+        if resultado is None:
+            return None
+        zip_buffer, relatorio, erros = resultado
+        entregues[job.id] = {
+            "zip": zip_buffer,
+            "sucesso": sum(1 for r in relatorio if r['status'] == 'SUCESSO'),
+            "erros": erros,
+        }
+    return entregues[job.id]
+
+def ler_zip(resultado):
+    """Bytes do ZIP só para o botão de download desta execução; não ficam guardados na sessão."""
+    zip_buffer = resultado["zip"]
+    zip_buffer.seek(0)
+    return zip_buffer.read()
+
+def descartar_job(job_id):
+    get_scheduler().discard(job_id)
+    resultado = st.session_state.get("resultados_jobs", {}).pop(job_id, None)
+    if resultado is not None:
+        resultado["zip"].close()
+
+def render_jobs(jobs):
+    scheduler = get_scheduler()
+    for job in jobs:
+        with st.container(border=True):
+            st.markdown(f"**{job.label}**")
+            if job.status == JOB_PENDING:
+                st.info(f"⏳ Na fila (posição {scheduler.queue_position(job.id) or '-'}).")
+            elif job.status == JOB_RUNNING:
+                texto = f"Processando {job.current}/{job.total}..." if job.total else f"Processando {job.current}..."
+                st.progress(job.progress or 0.0, text=texto)
+            if not job.finished:
+                st.button("Cancelar", key=f"cancelar_{job.id}", on_click=scheduler.cancel, args=(job.id,))
+                continue
+
+            if job.status == JOB_DONE:
+                resultado = receber_resultado(job)
+                if resultado is None:
+                    st.info("O resultado desta geração foi entregue em outra aba ou sessão.")
+                    st.button("Descartar", key=f"descartar_{job.id}", on_click=descartar_job, args=(job.id,))
+                    continue
+                erros, sucesso = resultado["erros"], resultado["sucesso"]
+                if erros:
+                    st.error(f"⚠️ {len(erros)} erros encontrados.")
+                    with st.expander("Ver Erros"):
+                        for e in erros: st.write(e)
+                if sucesso > 0:
+                    st.success(f"✅ Geração concluída: {sucesso} notas prontas para download.")
+                    st.download_button(
+                        label=f"📥 Baixar {sucesso} Notas (.zip)",
+                        data=ler_zip(resultado),
+                        file_name=f"Notas_Hube_{datetime.fromtimestamp(job.finished_at).strftime('%d%m_%H%M')}.zip",
+                        mime="application/zip",
+                        key=f"baixar_{job.id}"
+                    )
+            elif job.status == JOB_FAILED:
+                st.error(f"Erro na geração: {job.error}")
+            else:
+                st.warning("🚫 Geração cancelada.")
+            st.button("Descartar", key=f"descartar_{job.id}", on_click=descartar_job, args=(job.id,))
+
+@st.fragment(run_every=1)
+def painel_em_andamento():
+    # Reexecuta só este trecho a cada segundo enquanto houver gerações na fila ou em execução
+    jobs = get_scheduler().jobs_for_user(usuario)
+    render_jobs(jobs)
+    if all(job.finished for job in jobs):
+        st.rerun()
+
+jobs_usuario = get_scheduler().jobs_for_user(usuario)
+if jobs_usuario:
+    st.subheader("📦 Minhas gerações")
+    if all(job.finished for job in jobs_usuario):
+        render_jobs(jobs_usuario)
+    else:
+        painel_em_andamento()
+
 uploaded_file = st.file_uploader("Upload da Base (.xlsx ou .csv)", type=["xlsx", "csv"])
 
 if uploaded_file:
     try:
         logger.info(f"Arquivo carregado: {uploaded_file.name}")
         
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file, sep=None, engine='python')
-        else:
-            df = pd.read_excel(uploaded_file)
-            
-        missing_cols = validate_columns(df)
+        # Leitura, validação, vencimentos e total ficam em cache entre reruns (mesmo arquivo)
+        upload = load_upload(uploaded_file.getvalue(), uploaded_file.name)
+        df = upload.df
+        preview_variant = None
+
+        missing_cols = upload.missing_cols
         if missing_cols:
             st.error("❌ A planilha enviada não possui todas as colunas necessárias:")
             for m in missing_cols:
@@ -137,17 +246,20 @@ if uploaded_file:
         st.success("✅ Estrutura do arquivo validada com sucesso!")
 
         # 1. Validação de Vencimento
-        col_vencimento = find_column_in_df(df, ['Vencimento', 'Data Vencimento'])
+        col_vencimento = upload.col_vencimento
         hoje = date.today()
 
         if not col_vencimento:
             st.warning("⚠️ A planilha não possui coluna de **Vencimento**.")
             venc_input = st.date_input("Informe a data de vencimento:", value=None, format="DD/MM/YYYY")
             if venc_input:
+                # O DataFrame do cache é compartilhado entre reruns: altera uma cópia
+                df = df.copy()
                 df['Vencimento'] = venc_input.strftime('%d/%m/%Y')
+                preview_variant = venc_input
                 st.info(f"📅 Vencimento definido para todas as notas: **{venc_input.strftime('%d/%m/%Y')}**")
         else:
-            linhas_expiradas = check_expiration_column(df, col_vencimento)
+            linhas_expiradas = upload.linhas_expiradas
             if linhas_expiradas:
                 st.warning(f"⚠️ **{len(linhas_expiradas)}** nota(s) possuem data de vencimento já expirada:")
                 st.dataframe(pd.DataFrame(linhas_expiradas), use_container_width=True, hide_index=True)
@@ -156,12 +268,14 @@ if uploaded_file:
                                  ["Manter originais", "Substituir por nova data"], horizontal=True)
                 if opcao == "Substituir por nova data":
                     nova_data = st.date_input("Nova data de vencimento:", value=hoje, format="DD/MM/YYYY")
-                    df = apply_date_replacement(df, col_vencimento, linhas_expiradas, nova_data)
+                    df = apply_date_replacement(df.copy(), col_vencimento, linhas_expiradas, nova_data)
+                    preview_variant = nova_data
                     st.info(f"📅 Datas substituídas para: **{nova_data.strftime('%d/%m/%Y')}**")
 
         # 2. Resumo Financeiro
-        col_total = find_column_in_df(df, ['Total a pagar', 'Total calculado R$', 'Valor consolidado', 'Valor emitido', 'Total'])
-        total_consolidado = df[col_total].apply(parse_currency).sum() if col_total else 0.0
+        total_consolidado = upload.total_consolidado
+        if upload.total_invalidos:
+            st.warning(f"⚠️ {upload.total_invalidos} valor(es) inválido(s) na coluna **{upload.col_total}** foram considerados R$ 0,00.")
         
         c1, c2 = st.columns(2)
         c1.metric("Registros", len(df))
@@ -174,8 +288,7 @@ if uploaded_file:
         ativar_lgpd = st.toggle("Ativar Mascaramento (LGPD)", value=default_lgpd)
         
         st.subheader("🔍 Pré-visualização")
-        preview = [prepare_context(row, mask_data=ativar_lgpd) for _, row in df.head(5).iterrows()]
-        st.dataframe(pd.DataFrame(preview).drop(columns=['_raw_total'], errors='ignore'))
+        st.dataframe(get_preview(upload, df, ativar_lgpd, preview_variant))
 
         # 4. Geração em Lote
         st.write("---")
@@ -193,43 +306,70 @@ if uploaded_file:
             
         template_escolhido = st.selectbox("Modelo de Nota", templates, index=template_idx)
 
+        # Modelos embutidos podem ser desenhados direto em ReportLab (sem conversão HTML → PDF)
+        motor_pdf = "xhtml2pdf"
+        if has_native_layout(template_escolhido):
+            renderizacao_rapida = st.toggle(
+                "Renderização rápida (ReportLab)",
+                value=resolve_pdf_engine(template_escolhido) == "reportlab",
+                help="Desenha o modelo direto em PDF. Desative para usar a conversão do HTML (xhtml2pdf)."
+            )
+            motor_pdf = "reportlab" if renderizacao_rapida else "xhtml2pdf"
+
         # Salva preferências sempre que mudarem (no próximo rerun)
         if template_escolhido != default_template or ativar_lgpd != default_lgpd:
             save_prefs(template_escolhido, ativar_lgpd)
 
+        formato_saida = st.radio(
+            "Formato de saída",
+            ["ZIP (um PDF por nota)", "PDF único para impressão"],
+            horizontal=True,
+            help="PDF único: várias notas por arquivo (até PDF_MERGE_NOTES_PER_FILE), com índice por número de cobrança."
+        )
+        pdf_unico = formato_saida == "PDF único para impressão"
+
+        # Pré-voo: valida o template e estima tempo/tamanho com uma amostra, sem gerar o lote
+        if st.button("Verificar antes de gerar", help="Valida o template e estima tempo e tamanho com algumas notas de amostra."):
+            with st.spinner("Verificando template e gerando notas de amostra..."):
+                relatorio_prevoo = run_preflight(
+                    df, template_escolhido, mask_data=ativar_lgpd, engine=motor_pdf,
+                    workers=1 if pdf_unico else min(resolve_worker_count(), len(df))
+                )
+            p1, p2, p3 = st.columns(3)
+            if relatorio_prevoo.estimated_seconds is not None:
+                p1.metric("Tempo estimado", f"{relatorio_prevoo.estimated_seconds / 60:.1f} min")
+                p2.metric("Tamanho estimado (ZIP)", f"{relatorio_prevoo.estimated_zip_bytes / 1024 / 1024:.1f} MB")
+            p3.metric("Erros previstos", relatorio_prevoo.estimated_failures)
+            if relatorio_prevoo.undefined_vars:
+                st.error(f"❌ Variáveis desconhecidas no template: {', '.join(relatorio_prevoo.undefined_vars)}")
+            if relatorio_prevoo.failed_rows:
+                st.warning("⚠️ Linhas que devem falhar na geração:")
+                st.dataframe(pd.DataFrame(relatorio_prevoo.failed_rows), use_container_width=True, hide_index=True)
+            elif relatorio_prevoo.ok:
+                st.success("✅ Template e amostra sem erros.")
+
         if st.button("Gerar Todas as Notas (ZIP)", type="primary"):
-            html_str = get_html_template(template_escolhido)
-            template_jinja = Template(html_str)
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            def update_progress(current, total):
-                progress_bar.progress(current / total)
-                status_text.text(f"Processando {current}/{total}...")
+            # Template compilado do registro (reaproveitado entre reruns e pelos processos paralelos)
+            template_jinja = get_compiled_template(template_escolhido)
+            logger.info(f"Cache de templates: {get_template_stats()}")
 
-            zip_buffer, relatorio, erros = generate_notes_zip(
-                df, template_jinja, mask_data=ativar_lgpd, progress_callback=update_progress
-            )
-            
-            status_text.empty()
-            progress_bar.empty()
-            
-            if erros:
-                st.error(f"⚠️ {len(erros)} erros encontrados.")
-                with st.expander("Ver Erros"):
-                    for e in erros: st.write(e)
-            
-            sucesso = sum(1 for r in relatorio if r['status'] == 'SUCESSO')
-            if sucesso > 0:
-                st.toast(f"🎉 {sucesso} notas geradas com sucesso!", icon="✅")
-                st.success(f"✅ Geração concluída: {sucesso} notas prontas para download.")
-                st.download_button(
-                    label=f"📥 Baixar {sucesso} Notas (.zip)",
-                    data=zip_buffer,
-                    file_name=f"Notas_Hube_{datetime.now().strftime('%d%m_%H%M')}.zip",
-                    mime="application/zip"
+            def gerar(progress_callback, df=df, mask_data=ativar_lgpd, engine=motor_pdf, pdf_unico=pdf_unico):
+                gerador = generate_notes_pdf if pdf_unico else generate_notes_zip
+                return gerador(
+                    df, template_jinja, mask_data=mask_data, progress_callback=progress_callback, engine=engine
                 )
+
+            try:
+                get_scheduler().submit(
+                    usuario, gerar,
+                    label=f"{uploaded_file.name}: {len(df)} notas ({template_escolhido}{', PDF único' if pdf_unico else ''})",
+                    # Resultado nunca entregue a uma sessão (expirado ou descartado): fechar o
+                    # buffer libera a memória ou, no modo "disk", apaga o ZIP temporário
+                    on_discard=lambda resultado: resultado[0].close()
+                )
+                st.rerun()
+            except SchedulerFullError as e:
+                st.warning(f"⏳ {e}")
             
     except Exception as e:
         logger.critical(f"Erro fatal: {e}")
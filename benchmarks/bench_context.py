@@ -0,0 +1,46 @@
+"""
+Benchmark do custo por linha da montagem de contexto.
+
+Compara o caminho antigo (iterrows + prepare_context por linha) com o plano compilado
+(prepare_contexts via itertuples).
+
+Uso: python -m benchmarks.bench_context [n_linhas]
+"""
+import sys
+import time
+import pandas as pd
+from src.core.utils import prepare_context, prepare_contexts
+
+def make_df(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'Instalação': [f'{100000 + i}' for i in range(n)],
+        'Nome': [f'Cliente Exemplo {i}' for i in range(n)],
+        'CNPJ/CPF': ['123.456.789-01' if i % 2 else '12.345.678/0001-90' for i in range(n)],
+        'Endereço': ['Rua das Flores, 100'] * n,
+        'Cidade': ['São Paulo'] * n,
+        'UF': ['SP'] * n,
+        'Número da conta': [f'{i:08d}' for i in range(n)],
+        'Nº da cobrança': [f'COB-{i:06d}' for i in range(n)],
+        'Vencimento': ['10/01/2099'] * n,
+        'Mês de Referência': ['12/2098'] * n,
+        'Total a pagar': ['R$ 1.234,56'] * n,
+        'Economia R$': ['123,45'] * n,
+    })
+
+def bench(label: str, fn, n: int) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.3f}s  {elapsed / n * 1e6:8.1f} µs/linha")
+    return elapsed
+
+def main(n: int = 10_000) -> None:
+    df = make_df(n)
+    for mask in (False, True):
+        print(f"\n{n} linhas | mask_data={mask}")
+        old = bench("iterrows + prepare_context", lambda: [prepare_context(r, mask) for _, r in df.iterrows()], n)
+        new = bench("plano compilado (prepare_contexts)", lambda: prepare_contexts(df, mask), n)
+        print(f"{'speedup':<40} {old / new:8.2f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,46 @@
+"""
+Benchmark da conversão de moeda: apply(parse_currency/format_currency) vs versões colunares.
+
+Uso: python -m benchmarks.bench_currency [n_linhas]
+"""
+import sys
+import time
+import random
+import pandas as pd
+from src.core.utils import parse_currency, format_currency, parse_currency_series, format_currency_series
+
+def make_series(n: int) -> pd.Series:
+    rnd = random.Random(42)
+    styles = [
+        lambda v: f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+        lambda v: f"{v:,.2f}",
+        lambda v: f"{v:.2f}",
+        lambda v: "",
+    ]
+    return pd.Series([rnd.choice(styles)(rnd.uniform(10, 50_000)) for _ in range(n)], name="Total a pagar")
+
+def bench(label: str, fn, n: int) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.3f}s  {elapsed / n * 1e6:8.2f} µs/célula")
+    return elapsed
+
+def main(n: int = 100_000) -> None:
+    unicos = make_series(n)
+    cenarios = {
+        "valores distintos (texto)": unicos,
+        "2k valores repetidos (texto)": pd.Series(unicos.iloc[:2000].sample(n, replace=True, random_state=1).to_numpy(), name=unicos.name),
+        "numérico (xlsx)": pd.Series([round(random.uniform(10, 50_000), 2) for _ in range(n)], name=unicos.name),
+    }
+    for nome, s in cenarios.items():
+        print(f"\n{n} células | {nome}")
+        old = bench("apply(parse_currency)", lambda: s.apply(parse_currency), n)
+        new = bench("parse_currency_series", lambda: parse_currency_series(s), n)
+        print(f"{'speedup':<40} {old / new:8.2f}x")
+        old = bench("apply(format_currency)", lambda: s.apply(format_currency), n)
+        new = bench("format_currency_series", lambda: format_currency_series(s), n)
+        print(f"{'speedup':<40} {old / new:8.2f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,41 @@
+"""
+Benchmark de latência por nota e vazão dos motores de PDF:
+- original: xhtml2pdf com Template a partir do fonte bruto;
+- otimizado: xhtml2pdf com template do registro (pré-processado e minificado);
+- nativo: layout ReportLab (generate_pdf_native), sem HTML.
+
+Uso: python -m benchmarks.bench_pdf_engine [linhas]
+"""
+import sys
+import time
+from jinja2 import Template
+from config.settings import settings
+from benchmarks.bench_context import make_df
+from src.core.utils import prepare_contexts
+from src.services.pdf_engine import generate_pdf, generate_pdf_native, get_compiled_template, get_html_template
+
+TEMPLATES = ("Modelo_Padrao_Hube.html", "Modelo_Simples_Hube.html")
+
+def _per_row_ms(render, contexts) -> float:
+    render(contexts[0])  # aquecimento
+    start = time.perf_counter()
+    for ctx in contexts:
+        render(ctx)
+    return (time.perf_counter() - start) * 1000 / len(contexts)
+
+def _html_render(template):
+    return lambda ctx: generate_pdf(template.render(**ctx))
+
+def main(n: int) -> None:
+    contexts = prepare_contexts(make_df(n))
+    print(f"{'template':<28} {'original (ms)':>14} {'otimizado (ms)':>15} {'nativo (ms)':>12} "
+          f"{'notas/s nativo':>15} {'ganho nativo':>13}")
+    for name in TEMPLATES:
+        original = _per_row_ms(_html_render(Template(get_html_template(name))), contexts)
+        optimized = _per_row_ms(_html_render(get_compiled_template(name)), contexts)
+        native = _per_row_ms(lambda ctx: generate_pdf_native(name, ctx), contexts)
+        print(f"{name:<28} {original:>14.1f} {optimized:>15.1f} {native:>12.1f} "
+              f"{1000 / native:>15.1f} {original / native:>12.2f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
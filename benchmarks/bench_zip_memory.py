@@ -0,0 +1,49 @@
+"""
+Benchmark de memória da saída do ZIP: pico de RSS por nº de linhas nos modos "memory" e "disk".
+
+Cada medição roda em um processo novo (spawn) para que o pico de RSS não seja contaminado
+pelas medições anteriores. O ZIP é mantido aberto até a medição, como no app antes do download.
+
+Uso: python -m benchmarks.bench_zip_memory [n1 n2 ...]
+"""
+import sys
+import resource
+import multiprocessing
+from benchmarks.bench_context import make_df
+
+TEMPLATE = "Modelo_Padrao_Hube.html"
+
+def _rss_mb() -> float:
+    # ru_maxrss é em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _measure(mode: str, n: int, queue) -> None:
+    from src.services.pdf_engine import get_html_template
+    from src.services.zip_builder import generate_notes_zip, create_zip_output
+
+    df = make_df(n)
+    html = get_html_template(TEMPLATE)
+    # Aquece imports e caches antes da linha de base
+    generate_notes_zip(make_df(1), html, workers=1)
+    base = _rss_mb()
+
+    # Sem limiar de spool: no modo "disk" o ZIP vai direto para o disco
+    out, relatorio, _ = generate_notes_zip(df, html, workers=1, output=create_zip_output(mode, max_memory=0))
+    out.seek(0, 2)
+    queue.put((mode, n, _rss_mb() - base, out.tell() / 1024 / 1024))
+    out.close()
+
+def main(sizes: list[int]) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'modo':<8} {'linhas':>8} {'ΔRSS pico (MB)':>16} {'ZIP (MB)':>10}")
+    for n in sizes:
+        for mode in ("memory", "disk"):
+            queue = ctx.Queue()
+            p = ctx.Process(target=_measure, args=(mode, n, queue))
+            p.start()
+            mode, n, rss, size = queue.get()
+            p.join()
+            print(f"{mode:<8} {n:>8} {rss:>16.1f} {size:>10.1f}")
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [250, 500, 1000, 2000])
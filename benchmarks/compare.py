@@ -0,0 +1,53 @@
+"""
+Compara dois resultados de benchmarks.run_suite e aponta regressões.
+
+Casa as medições por (etapa, linhas, formato) e compara o tempo por linha. Sai com código 1
+se alguma etapa ficou mais lenta que o limite (--threshold), para uso em CI ou scripts.
+
+Uso: python -m benchmarks.compare base.json novo.json [--threshold 0.2] [--min-seconds 0.005]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+def load(path: Path) -> tuple[dict, dict]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    results = {(r["stage"], r["rows"], r["format"]): r for r in data["results"]}
+    return data.get("environment", {}), results
+
+def compare(base: dict, new: dict, threshold: float, min_seconds: float) -> list[tuple]:
+    """Retorna (chave, µs/linha base, µs/linha novo, razão, regressão?) das medições em comum."""
+    rows = []
+    for key in sorted(base.keys() & new.keys(), key=lambda k: (k[2], k[1], k[0])):
+        b, n = base[key], new[key]
+        ratio = n["us_per_row"] / b["us_per_row"] if b["us_per_row"] else 1.0
+        # Etapas muito rápidas oscilam demais para acusar regressão
+        relevant = max(b["seconds"], n["seconds"]) >= min_seconds
+        rows.append((key, b["us_per_row"], n["us_per_row"], ratio, relevant and ratio > 1 + threshold))
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmarks.run_suite.")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.2, help="Aumento tolerado (0.2 = 20%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="Ignora medições abaixo deste tempo")
+    args = parser.parse_args(argv)
+
+    env_base, base = load(args.base)
+    env_new, new = load(args.new)
+    print(f"base: {env_base.get('commit', '?')}  novo: {env_new.get('commit', '?')}")
+    print(f"{'formato':<7} {'linhas':>7} {'etapa':<26} {'base µs/l':>11} {'novo µs/l':>11} {'razão':>7}")
+
+    regressions = 0
+    for (stage, rows, fmt), b, n, ratio, regressed in compare(base, new, args.threshold, args.min_seconds):
+        regressions += regressed
+        flag = "  REGRESSÃO" if regressed else ""
+        print(f"{fmt:<7} {rows:>7} {stage:<26} {b:>11.1f} {n:>11.1f} {ratio:>6.2f}x{flag}")
+
+    print(f"\n{regressions} regressão(ões) acima de {args.threshold:.0%}.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Gerador de planilhas sintéticas no formato da Hube para benchmarks.
+
+As planilhas misturam CPF e CNPJ, valores no formato brasileiro ("R$ 1.234,56"), americano
+("1,234.56") e numérico, vencimentos expirados e válidos, dados bancários em várias linhas e
+nomes de coluna alternativos (aliases aceitos por REQUIRED_FIELDS/CONTEXT_FIELDS).
+
+Uso: python -m benchmarks.datagen N -o base.xlsx [--seed 42] [--aliases 0|1|2]
+"""
+import argparse
+import random
+from datetime import date, timedelta
+from pathlib import Path
+import pandas as pd
+
+# Conjuntos de nomes de coluna equivalentes (cada planilha usa um deles)
+ALIAS_SETS = (
+    {
+        "instalacao": "Instalação", "nome": "Nome", "documento": "CNPJ/CPF", "endereco": "Endereço",
+        "uf": "UF", "conta": "Número da conta", "cobranca": "Nº da cobrança", "vencimento": "Vencimento",
+        "referencia": "Mês de Referência", "total": "Total a pagar", "economia": "Economia R$",
+        "banco": "Dados bancários", "consorcio": "Nome Consórcio", "cnpj_consorcio": "CNPJ Consórcio",
+        "endereco_consorcio": "Endereço Consórcio",
+    },
+    {
+        "instalacao": "Numero Instalacao", "nome": "Razão Social", "documento": "CNPJ", "endereco": "Endereco",
+        "uf": "UF", "conta": "Conta vinculada", "cobranca": "N da cobranca", "vencimento": "Data Vencimento",
+        "referencia": "Referencia", "total": "Total calculado R$", "economia": "Economia mês",
+        "banco": "Pagamento", "consorcio": "Consórcio", "cnpj_consorcio": "CNPJ Consorcio",
+        "endereco_consorcio": "Endereco Consorcio",
+    },
+    {
+        "instalacao": "Num. Instalação", "nome": "Cliente", "documento": "CPF", "endereco": "Endereço",
+        "uf": "UF", "conta": "Numero da conta", "cobranca": "Nº da cobrança", "vencimento": "Vencimento",
+        "referencia": "Mes Referencia", "total": "Valor consolidado", "economia": "ECONOMIA",
+        "banco": "Dados bancarios", "consorcio": "Consorcio", "cnpj_consorcio": "CNPJ Consórcio",
+        "endereco_consorcio": "Endereço Consórcio",
+    },
+)
+
+_FIRST = ("Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Hugo", "Íris", "João", "Lúcia", "Márcio")
+_LAST = ("Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Gonçalves", "Araújo", "Ribeiro", "Conceição")
+_COMPANY = ("Padaria", "Mercado", "Oficina", "Clínica", "Restaurante", "Farmácia", "Escola", "Academia")
+_STREETS = ("Rua das Flores", "Av. Brasil", "Rua XV de Novembro", "Av. Paulista", "Rua São João", "Travessa do Sol")
+_CITIES = (("São Paulo", "SP"), ("Belo Horizonte", "MG"), ("Curitiba", "PR"), ("Goiânia", "GO"), ("Cuiabá", "MT"))
+_BANKS = ("Banco do Brasil", "Itaú Unibanco", "Bradesco", "Caixa Econômica Federal", "Santander")
+
+def _cpf(rnd: random.Random) -> str:
+    d = f"{rnd.randrange(10**11):011d}"
+    return f"{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}"
+
+def _cnpj(rnd: random.Random) -> str:
+    d = f"{rnd.randrange(10**14):014d}"
+    return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+
+def _money(rnd: random.Random, value: float):
+    style = rnd.random()
+    if style < 0.5:
+        return "R$ " + f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    if style < 0.7:
+        return f"{value:,.2f}"
+    if style < 0.95:
+        return round(value, 2)
+    return ""
+
+def make_spreadsheet(n: int, seed: int = 42, aliases: int = 0) -> pd.DataFrame:
+    """Gera `n` linhas com os nomes de coluna de ALIAS_SETS[aliases]."""
+    rnd = random.Random(seed)
+    cols = ALIAS_SETS[aliases]
+    hoje = date.today()
+    rows = []
+    for i in range(n):
+        pessoa_juridica = rnd.random() < 0.4
+        if pessoa_juridica:
+            nome = f"{rnd.choice(_COMPANY)} {rnd.choice(_LAST)} Ltda"
+            documento = _cnpj(rnd)
+        else:
+            nome = f"{rnd.choice(_FIRST)} {rnd.choice(_LAST)} {rnd.choice(_LAST)}"
+            documento = _cpf(rnd)
+        cidade, uf = rnd.choice(_CITIES)
+        total = rnd.uniform(50, 25_000)
+        # ~10% das notas com vencimento expirado
+        vencimento = hoje + timedelta(days=rnd.randint(-60, -1) if rnd.random() < 0.1 else rnd.randint(1, 60))
+        conta = f"{rnd.randrange(10**8):08d}"
+        rows.append({
+            cols["instalacao"]: f"{rnd.randrange(10**9):09d}",
+            cols["nome"]: nome,
+            cols["documento"]: documento,
+            cols["endereco"]: f"{rnd.choice(_STREETS)}, {rnd.randint(1, 9999)} - {cidade}",
+            cols["uf"]: uf,
+            cols["conta"]: conta,
+            cols["cobranca"]: f"COB-{seed:02d}{i:07d}",
+            cols["vencimento"]: vencimento.strftime("%d/%m/%Y"),
+            cols["referencia"]: f"{rnd.randint(1, 12):02d}/{hoje.year}",
+            cols["total"]: _money(rnd, total),
+            cols["economia"]: _money(rnd, total * rnd.uniform(0.05, 0.2)),
+            cols["banco"]: (
+                f"{rnd.choice(_BANKS)}\nAgência {rnd.randint(1000, 9999)}-{rnd.randint(0, 9)} "
+                f"Conta {rnd.randint(10000, 99999)}-{rnd.randint(0, 9)}\nPIX: {_cnpj(rnd)}"
+            ),
+            cols["consorcio"]: "Consórcio Hube Energia Solar",
+            cols["cnpj_consorcio"]: "12.345.678/0001-90",
+            cols["endereco_consorcio"]: "Av. Paulista, 1000 - São Paulo/SP",
+        })
+    return pd.DataFrame(rows)
+
+def write_spreadsheet(df: pd.DataFrame, path: Path) -> Path:
+    """Grava em CSV (separador ";", como os exports da Hube) ou XLSX conforme a extensão."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".csv":
+        df.to_csv(path, index=False, sep=";", encoding="utf-8-sig")
+    else:
+        df.to_excel(path, index=False)
+    return path
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera uma planilha sintética da Hube.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("-o", "--output", type=Path, required=True, help="Arquivo .csv ou .xlsx")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--aliases", type=int, choices=range(len(ALIAS_SETS)), default=0)
+    args = parser.parse_args()
+    write_spreadsheet(make_spreadsheet(args.rows, args.seed, args.aliases), args.output)
+    print(f"{args.rows} linhas gravadas em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Suíte de benchmarks por etapa do pipeline, com resultado em JSON para comparar commits.
+
+Etapas medidas para cada tamanho e formato (CSV/XLSX) de planilha sintética (benchmarks.datagen):
+ingestão (src.services.ingestion e, para comparação, a leitura antiga com pd.read_csv(sep=None,
+engine="python")/pd.read_excel, ambas com a memória do DataFrame), validate_columns, check_expiration_column, prepare_context (prepare_contexts),
+com a taxa de acerto do cache de sanitize_text, mascaramento LGPD colunar (mask_lgpd) e, para comparação, linha a linha (mask_lgpd_rowwise),
+render Jinja, generate_pdf (xhtml2pdf), generate_pdf_native (ReportLab), as mesmas amostras num
+PDF único (generate_merged_pdf/generate_merged_pdf_native, com o total de bytes de cada modo),
+as mesmas amostras com um logo PNG e uma fonte TrueType do template (generate_pdf_logo, com o
+cache de recursos de resolve_asset, e generate_pdf_logo_cold, limpando o cache a cada nota)
+e escrita do ZIP, mais a gravação em cada destino de src.services.output_sinks (ZIP deflated e
+stored, ZIPs divididos, pastas por UF e tar), com o tamanho final de cada um.
+As etapas de PDF são amostradas (--pdf-sample linhas) e projetadas para o total de linhas.
+
+Uso:
+    python -m benchmarks.run_suite [--sizes 100 1000 10000] [--formats csv xlsx] [-o resultados.json]
+    python -m benchmarks.compare base.json novo.json
+
+O JSON é gravado por padrão em benchmarks/results/<data>-<commit>.json.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable
+from benchmarks.datagen import make_spreadsheet, write_spreadsheet
+from config.settings import settings
+import pandas as pd
+import reportlab
+from PIL import Image
+from src.core.utils import (
+    _coalesce_field,
+    clear_text_caches,
+    compile_context_plan,
+    find_column_in_df,
+    get_text_cache_stats,
+    mask_cpf_cnpj,
+    mask_lgpd_series,
+    mask_name,
+    prepare_contexts,
+    validate_columns,
+)
+from src.core.date_handler import check_expiration_column
+from src.services.ingestion import read_spreadsheet
+from src.services.output_sinks import DirectorySink, SplitZipSink, TarSink, ZipSink
+from src.services.pdf_engine import (
+    clear_asset_cache,
+    generate_merged_pdf,
+    generate_merged_pdf_native,
+    generate_pdf,
+    generate_pdf_native,
+    get_compiled_template,
+)
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+TEMPLATE = "Modelo_Padrao_Hube.html"
+PACKAGES = ("pandas", "numpy", "Jinja2", "xhtml2pdf", "reportlab", "openpyxl", "pyarrow")
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def environment_info() -> dict[str, Any]:
+    versions = {}
+    for pkg in PACKAGES:
+        try:
+            versions[pkg] = metadata.version(pkg)
+        except metadata.PackageNotFoundError:
+            versions[pkg] = None
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """Menor tempo entre `repeat` execuções (reduz ruído nas etapas rápidas)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def _record(results: list, stage: str, rows: int, fmt: str, seconds: float, sampled: int, **extra) -> None:
+    per_row = seconds / sampled if sampled else 0.0
+    results.append({
+        **extra,
+        "stage": stage,
+        "rows": rows,
+        "format": fmt,
+        "sampled_rows": sampled,
+        "seconds": round(seconds, 6),
+        "us_per_row": round(per_row * 1e6, 3),
+        "projected_seconds": round(per_row * rows, 6),
+    })
+    print(f"{fmt:<5} {rows:>7} {stage:<26} {seconds:>9.4f}s  {per_row * 1e6:>11.1f} µs/linha"
+          f"  (amostra {sampled}, projeção {per_row * rows:.2f}s)"
+          + "".join(f", {k} {v}" for k, v in extra.items()))
+
+def _memory_mb(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(deep=True).sum() / 1024 / 1024, 2)
+
+def read_spreadsheet_legacy(path: Path) -> pd.DataFrame:
+    """Leitura anterior à camada de ingestão (parser Python do pandas e read_excel completo)."""
+    if path.suffix.lower() == ".csv":
+        return pd.read_csv(path, sep=None, engine="python")
+    return pd.read_excel(path)
+
+def _with_logo(html: str) -> str:
+    """Acrescenta ao HTML da nota um logo e uma fonte resolvidos pela pasta de templates."""
+    font = "<style>@font-face { font-family: Vera; src: url(Vera.ttf); } body { font-family: Vera; }</style>"
+    html = html.replace("</head>", font + "</head>", 1)
+    return html.replace("<body>", '<body><img src="logo.png" width="120" height="40"/>', 1)
+
+def make_logo_templates_dir(directory: Path) -> Path:
+    """Pasta de templates sintética com logo.png (600x200) e a fonte Vera do ReportLab."""
+    Image.effect_mandelbrot((600, 200), (-2.0, -1.0, 1.0, 1.0), 64).convert("RGB").save(directory / "logo.png")
+    font = Path(reportlab.__file__).parent / "fonts" / "Vera.ttf"
+    (directory / "Vera.ttf").write_bytes(font.read_bytes())
+    return directory
+
+def run_size(rows: int, fmt: str, data_dir: Path, args: argparse.Namespace) -> list[dict]:
+    results = []
+    path = data_dir / f"hube_{rows}_s{args.seed}_a{args.aliases}.{fmt}"
+    if not path.exists():
+        write_spreadsheet(make_spreadsheet(rows, seed=args.seed, aliases=args.aliases), path)
+
+    seconds, legacy = _best_of(lambda: read_spreadsheet_legacy(path), 1)
+    _record(results, "ingestion_legacy", rows, fmt, seconds, rows, memory_mb=_memory_mb(legacy))
+    del legacy
+
+    seconds, df = _best_of(lambda: read_spreadsheet(path), args.repeat)
+    _record(results, "ingestion", rows, fmt, seconds, rows, memory_mb=_memory_mb(df))
+
+    seconds, _ = _best_of(lambda: validate_columns(df), args.repeat)
+    _record(results, "validate_columns", rows, fmt, seconds, rows)
+
+    col_vencimento = find_column_in_df(df, ['Vencimento', 'Data Vencimento'])
+    seconds, _ = _best_of(lambda: check_expiration_column(df, col_vencimento), args.repeat)
+    _record(results, "check_expiration_column", rows, fmt, seconds, rows)
+
+    def build_contexts():
+        clear_text_caches()  # cada repetição parte do cache de texto vazio, como um lote novo
+        return prepare_contexts(df, mask_data=True)
+    seconds, contexts = _best_of(build_contexts, args.repeat)
+    hits, misses = get_text_cache_stats()["sanitize_text"]
+    _record(results, "prepare_context", rows, fmt, seconds, rows,
+            sanitize_hit_rate=round(hits / (hits + misses), 3) if hits + misses else 0.0)
+
+    plan = compile_context_plan(df.columns)
+    names = _coalesce_field(df, plan.fields["razao_social"]).fillna("")
+    docs = _coalesce_field(df, plan.fields["cnpj_consorciado"]).fillna("")
+    seconds, _ = _best_of(lambda: [(mask_name(n, doc=d), mask_cpf_cnpj(d)) for n, d in zip(names, docs)], args.repeat)
+    _record(results, "mask_lgpd_rowwise", rows, fmt, seconds, rows)
+    seconds, _ = _best_of(lambda: mask_lgpd_series(names, docs), args.repeat)
+    _record(results, "mask_lgpd", rows, fmt, seconds, rows)
+
+    template = get_compiled_template(TEMPLATE)
+    render_sample = contexts[:args.render_sample]
+    seconds, htmls = _best_of(lambda: [template.render(ctx) for ctx in render_sample], args.repeat)
+    _record(results, "jinja_render", rows, fmt, seconds, len(render_sample))
+
+    pdf_sample = htmls[:args.pdf_sample]
+    generate_pdf(pdf_sample[0])  # aquecimento
+    seconds, pdfs = _best_of(lambda: [generate_pdf(html)[0] for html in pdf_sample], 1)
+    _record(results, "generate_pdf", rows, fmt, seconds, len(pdf_sample), pdf_bytes=sum(map(len, pdfs)))
+
+    merged_sample = [(ctx["numero_cobranca"], html) for ctx, html in zip(contexts, pdf_sample)]
+    seconds, (merged, _, _) = _best_of(lambda: generate_merged_pdf(merged_sample), 1)
+    _record(results, "generate_pdf_merged", rows, fmt, seconds, len(merged_sample), pdf_bytes=len(merged))
+
+    logo_sample = [_with_logo(html) for html in pdf_sample]
+    templates_dir = settings.TEMPLATES_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.TEMPLATES_DIR = make_logo_templates_dir(Path(tmp))
+        try:
+            generate_pdf(logo_sample[0])  # aquecimento
+            seconds, logo_pdfs = _best_of(lambda: [generate_pdf(html)[0] for html in logo_sample], 1)
+            _record(results, "generate_pdf_logo", rows, fmt, seconds, len(logo_sample),
+                    pdf_bytes=sum(map(len, logo_pdfs)))
+
+            def cold():
+                for html in logo_sample:
+                    clear_asset_cache()
+                    generate_pdf(html)
+            seconds, _ = _best_of(cold, 1)
+            _record(results, "generate_pdf_logo_cold", rows, fmt, seconds, len(logo_sample))
+        finally:
+            settings.TEMPLATES_DIR = templates_dir
+            clear_asset_cache()
+
+    native_sample = contexts[:args.pdf_sample]
+    seconds, native_pdfs = _best_of(lambda: [generate_pdf_native(TEMPLATE, ctx)[0] for ctx in native_sample], 1)
+    _record(results, "generate_pdf_native", rows, fmt, seconds, len(native_sample),
+            pdf_bytes=sum(map(len, native_pdfs)))
+
+    native_merged_sample = [(ctx["numero_cobranca"], ctx) for ctx in native_sample]
+    seconds, (merged, _, _) = _best_of(lambda: generate_merged_pdf_native(TEMPLATE, native_merged_sample), 1)
+    _record(results, "generate_pdf_native_merged", rows, fmt, seconds, len(native_merged_sample),
+            pdf_bytes=len(merged))
+
+    def write_zip():
+        with tempfile.TemporaryFile() as out, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(rows):
+                zf.writestr(f"NOTA_{i:07d}.pdf", pdfs[i % len(pdfs)])
+    seconds, _ = _best_of(write_zip, args.repeat)
+    _record(results, "zip_write", rows, fmt, seconds, rows)
+
+    sinks = {
+        "sink_zip_deflated": lambda out, tmp: ZipSink(out, "deflated"),
+        "sink_zip_stored": lambda out, tmp: ZipSink(out, "stored"),
+        "sink_zip_split": lambda out, tmp: SplitZipSink(tmp / "volumes", max_bytes=10 * 1024 * 1024, compression="stored"),
+        "sink_dir": lambda out, tmp: DirectorySink(tmp / "pastas", partition="uf"),
+        "sink_tar": lambda out, tmp: TarSink(out),
+    }
+    for stage, make_sink in sinks.items():
+        def write_sink():
+            with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryFile() as out:
+                with make_sink(out, Path(tmp)) as sink:
+                    for i in range(rows):
+                        sink.add(f"NOTA_{i:07d}.pdf", pdfs[i % len(pdfs)], contexts[i])
+                    sink.write_manifest("linha_planilha;status\n")
+                size = out.seek(0, os.SEEK_END) + sum(p.stat().st_size for p in Path(tmp).rglob("*") if p.is_file())
+            return size
+        seconds, size = _best_of(write_sink, args.repeat)
+        _record(results, stage, rows, fmt, seconds, rows, archive_mb=round(size / 1024 / 1024, 2))
+    return results
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks por etapa do pipeline (JSON).")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--formats", nargs="+", choices=("csv", "xlsx"), default=["csv", "xlsx"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--aliases", type=int, default=0, help="Conjunto de nomes de coluna (datagen.ALIAS_SETS)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições das etapas rápidas (menor tempo)")
+    parser.add_argument("--render-sample", type=int, default=10_000, help="Linhas renderizadas pelo Jinja")
+    parser.add_argument("--pdf-sample", type=int, default=20, help="Linhas convertidas em PDF por motor")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Diretório para reaproveitar as planilhas geradas (padrão: temporário)")
+    parser.add_argument("-o", "--output", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    env = environment_info()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or Path(tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        for fmt in args.formats:
+            for rows in args.sizes:
+                results.extend(run_size(rows, fmt, data_dir, args))
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{env['commit'] or 'sem-git'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"environment": env, "params": {k: str(v) for k, v in vars(args).items()}, "results": results}
+    output.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nResultados gravados em {output}")
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,87 @@ class Settings(BaseSettings):
     BASE_DIR: Path = Path(__file__).resolve().parent.parent
     TEMPLATES_DIR: Path = BASE_DIR / "templates"
     LOGS_DIR: Path = BASE_DIR / "logs"
+    # Bytecode dos templates Jinja compilados (não contém dados da planilha)
+    TEMPLATE_CACHE_DIR: Path = BASE_DIR / ".cache" / "jinja"
     
     # App Info
     APP_NAME: str = "Hube Emissor"
     APP_VERSION: str = "1.0.0"
+
+    # Logs
+    # "text" (linhas legíveis) ou "json" (um objeto por linha, para coletores de log)
+    LOG_FORMAT: str = "text"
+    # Rotação de logs/app.log: tamanho máximo em MB e nº de arquivos antigos mantidos
+    LOG_MAX_MB: int = 10
+    LOG_BACKUP_COUNT: int = 5
     
     # PDF Configuration
     DEFAULT_ENCODING: str = "utf-8"
+    # Motor de PDF: "xhtml2pdf" (padrão), "auto" ou "reportlab" (layout nativo dos modelos embutidos,
+    # opcional: o texto é o mesmo do HTML, mas o layout não é idêntico)
+    PDF_ENGINE: str = "xhtml2pdf"
+    # Motor por template, sobrepondo PDF_ENGINE (ex.: {"Modelo_Simples_Hube.html": "xhtml2pdf"})
+    PDF_ENGINE_TEMPLATES: dict[str, str] = {}
+
+    # Cache de PDFs (reaproveita notas inalteradas entre reenvios da mesma planilha)
+    # Desativado por padrão: os PDFs em cache contêm dados pessoais e ficam no disco sem criptografia
+    PDF_CACHE_ENABLED: bool = False
+    PDF_CACHE_DIR: Path = BASE_DIR / ".cache" / "pdf"
+    # Tamanho máximo do cache em MB; as notas usadas há mais tempo são descartadas primeiro
+    PDF_CACHE_MAX_MB: int = 512
+
+    # Instrumentação
+    # Mede cada etapa por nota (colunas tempo_*_ms no relatório) e registra p50/p95/máx. no log
+    PDF_TIMINGS: bool = False
+    # Grava um perfil cProfile/pstats de cada lote em LOGS_DIR/profiles
+    PDF_PROFILE: bool = False
+
+    # Processamento Paralelo
+    # Nº de processos que renderizam PDFs em paralelo (1 = serial, 0 = todos os núcleos)
+    PDF_WORKERS: int = 1
+    # Quantas linhas cada processo pode ter "em voo" (limita a memória de PDFs pendentes)
+    PDF_WORKER_PREFETCH: int = 4
+
+    # Leitura em blocos (modo streaming): nº de linhas da planilha carregadas por vez
+    INGEST_CHUNK_ROWS: int = 2000
+
+    # Cache de uploads do app (planilha lida, validação, vencimentos, total e preview entre reruns)
+    # Nº máximo de planilhas mantidas e tempo (s) até descartar uma planilha sem uso
+    UPLOAD_CACHE_ENTRIES: int = 4
+    UPLOAD_CACHE_TTL_SECONDS: int = 1800
+
+    # Fila de gerações do app (compartilhada entre sessões)
+    # Gerações executadas ao mesmo tempo (cada uma pode usar PDF_WORKERS processos)
+    JOB_WORKERS: int = 2
+    # Gerações aguardando na fila; acima disso novos pedidos são recusados
+    JOB_MAX_QUEUED: int = 20
+    # Gerações na fila ou em execução por usuário
+    JOB_MAX_PER_USER: int = 2
+    # Tempo (s) que o ZIP de uma geração concluída fica disponível para download
+    JOB_RESULT_TTL_SECONDS: int = 3600
+
+    # Modo PDF único (impressão): notas por arquivo PDF; 0 = todas num único arquivo
+    PDF_MERGE_NOTES_PER_FILE: int = 500
+
+    # Pré-voo (dry run): notas de amostra convertidas em PDF para as estimativas de tempo/tamanho
+    PREFLIGHT_SAMPLE_ROWS: int = 5
+    # Pré-voo: linhas verificadas (contexto + template estrito, sem PDF); 0 = todas
+    PREFLIGHT_VALIDATE_ROWS: int = 5000
+
+    # Geração distribuída (src/shard_cli.py): linhas por shard publicado na fila
+    SHARD_ROWS: int = 5000
+    # Tempo (s) de posse de um shard sem sinal do worker; depois disso outro worker pode assumi-lo
+    SHARD_LEASE_SECONDS: int = 300
+    # Tentativas por shard (workers que caíram ou falharam com ele) antes de marcá-lo como falho
+    SHARD_MAX_ATTEMPTS: int = 3
+
+    # Saída do ZIP
+    # "memory" monta o ZIP em BytesIO; "disk" grava incrementalmente em arquivo temporário
+    ZIP_OUTPUT_MODE: str = "memory"
+    # Compressão dos PDFs no ZIP: "deflated" (~30% menor) ou "stored" (sem compressão, menos CPU)
+    ZIP_COMPRESSION: str = "deflated"
+    # No modo "disk", o ZIP fica em memória até este tamanho (bytes) e depois vai para o disco (0 = direto no disco)
+    ZIP_SPOOL_MAX_MEMORY: int = 8 * 1024 * 1024
     
     # Required Columns for Validation
     # Aliases expandidos para suportar diferentes modelos de planilha (ex: GD Gestão)
@@ -0,0 +1,330 @@
+"""
+Geração em lote pela linha de comando, sem Streamlit (ex.: jobs noturnos).
+
+Uso:
+    python -m src.cli planilha.xlsx -o notas.zip [-t Modelo_Padrao_Hube.html] [--no-lgpd]
+        [--expired keep|replace --new-date DD/MM/AAAA] [--workers N] [--engine auto|reportlab|xhtml2pdf]
+        [--timings] [--profile] [--stream [--chunk-size N]] [--merge [--notes-per-file N]]
+        [--sink zip|zip-split|dir|tar] [--compression deflated|stored] [--split-mb MB] [--split-notes N]
+        [--partition consorcio|uf] [--job-dir PASTA [--resume] [--retry-failed [RELATORIO]]] [--dry-run]
+
+Com --stream, a planilha é lida em blocos e cada bloco segue para a geração assim que é lido:
+a memória fica limitada ao tamanho do bloco e os primeiros PDFs saem antes do fim da leitura.
+Com --merge (impressão), o ZIP traz PDFs de várias páginas (NOTAS_001.pdf, ...) em vez de um
+PDF por nota; ver zip_builder.generate_notes_pdf.
+Com --sink, a saída deixa de ser um ZIP único: "zip-split" grava vários ZIPs (por --split-mb e/ou
+--split-notes) e "dir" uma árvore de pastas (por --partition) na pasta -o; "tar" grava um .tar.
+Todos levam o mesmo relatorio_processamento.csv.
+Com --job-dir, os PDFs e o relatório são gravados na pasta do job durante a geração e o arquivo
+final é montado a partir dela no fim. Se o lote cair, --resume renderiza só as linhas que faltam;
+--retry-failed refaz também as que deram erro, opcionalmente guiado pelo relatório de outra
+execução. Ver src/services/checkpoint.py.
+Com --dry-run, nada é gerado: o template é validado (variáveis desconhecidas, linhas com erro) e
+uma amostra de notas estima o tempo total e o tamanho da saída (ver src/services/preflight.py).
+
+Códigos de saída: 0 = todas as notas geradas; 1 = alguma linha falhou; 2 = entrada inválida.
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from contextlib import ExitStack
+from itertools import chain
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+import pandas as pd
+from config.settings import settings
+from src.core.utils import validate_columns, find_column_in_df
+from src.core.date_handler import check_expiration_column, apply_date_replacement
+from src.services.ingestion import iter_spreadsheet_chunks, read_spreadsheet
+from src.services.pdf_engine import PDF_ENGINES, get_compiled_template, list_templates
+from src.services.output_sinks import PARTITIONS, SINKS, ZIP_COMPRESSIONS, create_sink
+from src.services.preflight import run_preflight
+from src.services.checkpoint import (
+    ORIGIN_COLUMN, ORIGIN_PREVIOUS, CheckpointError, assemble_archive, open_job, rows_to_skip,
+)
+from src.services.zip_builder import generate_notes_pdf, generate_notes_zip, resolve_worker_count
+from src.core.logger import logger
+
+EXIT_OK = 0
+EXIT_ROW_ERRORS = 1
+EXIT_INVALID_INPUT = 2
+
+def _parse_cli_date(value: str) -> date:
+    try:
+        return datetime.strptime(value, '%d/%m/%Y').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida '{value}' (use DD/MM/AAAA)")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description=f"{settings.APP_NAME} | Gera o ZIP de notas de débito a partir de uma planilha."
+    )
+    parser.add_argument("input", type=Path, help="Planilha de entrada (.xlsx ou .csv)")
+    parser.add_argument("-o", "--output", type=Path, required=True,
+                        help="Caminho do ZIP (ou .tar) gerado, ou pasta de saída com --sink zip-split/dir")
+    parser.add_argument("-t", "--template", default="Modelo_Padrao_Hube.html",
+                        help="Template em templates/ (padrão: %(default)s)")
+    parser.add_argument("--lgpd", action=argparse.BooleanOptionalAction, default=True,
+                        help="Mascaramento LGPD de CPF/CNPJ e nomes (padrão: ativado)")
+    parser.add_argument("--expired", choices=("keep", "replace"), default="keep",
+                        help="Notas com vencimento expirado: manter (keep) ou substituir pela --new-date")
+    parser.add_argument("--new-date", type=_parse_cli_date, metavar="DD/MM/AAAA",
+                        help="Nova data de vencimento (com --expired replace ou planilha sem coluna de vencimento)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos de renderização (0 = todos os núcleos; padrão: PDF_WORKERS)")
+    parser.add_argument("--engine", choices=PDF_ENGINES, default=None,
+                        help="Motor de PDF (padrão: PDF_ENGINE, xhtml2pdf; reportlab = layout nativo, opcional)")
+    parser.add_argument("--timings", action="store_true", default=None,
+                        help="Tempos por etapa no relatório e p50/p95/máx. no log (padrão: PDF_TIMINGS)")
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="Grava um perfil cProfile em logs/profiles (padrão: PDF_PROFILE)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Lê e processa a planilha em blocos, com memória limitada")
+    parser.add_argument("--chunk-size", type=int, default=None, metavar="N",
+                        help="Linhas por bloco no modo --stream (padrão: INGEST_CHUNK_ROWS)")
+    parser.add_argument("--merge", action="store_true",
+                        help="Modo impressão: várias notas por PDF, com índice por número de cobrança")
+    parser.add_argument("--notes-per-file", type=int, default=None, metavar="N",
+                        help="Notas por PDF no modo --merge (0 = um único PDF; padrão: PDF_MERGE_NOTES_PER_FILE)")
+    parser.add_argument("--sink", choices=SINKS, default="zip",
+                        help="Destino: ZIP único, ZIPs divididos, pastas ou tar (padrão: %(default)s)")
+    parser.add_argument("--compression", choices=tuple(ZIP_COMPRESSIONS), default=None,
+                        help="Compressão dos ZIPs (padrão: ZIP_COMPRESSION)")
+    parser.add_argument("--split-mb", type=float, default=None, metavar="MB",
+                        help="Tamanho máximo de cada ZIP com --sink zip-split")
+    parser.add_argument("--split-notes", type=int, default=None, metavar="N",
+                        help="Notas por ZIP com --sink zip-split")
+    parser.add_argument("--partition", choices=tuple(PARTITIONS), default=None,
+                        help="Subpastas por consórcio ou UF com --sink dir")
+    parser.add_argument("--job-dir", type=Path, default=None, metavar="PASTA",
+                        help="Grava PDFs e relatório na pasta do job durante a geração (retomável)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retoma a geração da --job-dir, renderizando só as linhas que faltam")
+    parser.add_argument("--retry-failed", nargs="?", const="", default=None, type=str, metavar="RELATORIO",
+                        help="Retoma a --job-dir refazendo também as linhas com erro (as do relatório "
+                             "informado, se houver)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Só valida o template e estima tempo e tamanho, sem gerar (código 1 se houver erro previsto)")
+    parser.add_argument("--quiet", action="store_true", help="Não exibe o progresso")
+    return parser
+
+def _progress_printer(quiet: bool):
+    if quiet:
+        return None
+    state = {"last": -1}
+
+    def update(current: int, total: Optional[int]) -> None:
+        # Uma linha a cada 10% (ou a cada 1000 notas sem total conhecido), em stderr
+        step = current * 10 // total if total else current // 1000
+        if step != state["last"] or current == total:
+            state["last"] = step
+            print(f"Processando {current}/{total or '?'}...", file=sys.stderr)
+    return update
+
+def run(args: argparse.Namespace) -> int:
+    if not args.input.exists():
+        print(f"Erro: arquivo não encontrado: {args.input}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.template not in list_templates():
+        print(f"Erro: template '{args.template}' não encontrado em {settings.TEMPLATES_DIR}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.expired == "replace" and args.new_date is None:
+        print("Erro: --expired replace requer --new-date DD/MM/AAAA", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.sink == "zip-split" and not (args.split_mb or args.split_notes):
+        print("Erro: --sink zip-split requer --split-mb e/ou --split-notes", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.sink in ("zip-split", "dir") and args.output.exists():
+        print(f"Erro: a pasta de saída já existe: {args.output}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if (args.resume or args.retry_failed is not None) and args.job_dir is None:
+        print("Erro: --resume e --retry-failed requerem --job-dir", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.job_dir is not None and args.merge:
+        print("Erro: --job-dir não se aplica ao modo --merge", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.dry_run and args.stream:
+        print("Erro: --dry-run lê a planilha inteira e não se aplica a --stream", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    retry_manifest = Path(args.retry_failed) if args.retry_failed else None
+    if retry_manifest is not None and not retry_manifest.exists():
+        print(f"Erro: relatório não encontrado: {retry_manifest}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    logger.info(f"CLI: arquivo {args.input.name}, template {args.template}, LGPD={args.lgpd}")
+    try:
+        if args.stream:
+            chunks = iter_spreadsheet_chunks(args.input, chunksize=args.chunk_size)
+            df = next(chunks)
+        else:
+            chunks = iter(())
+            df = read_spreadsheet(args.input)
+    except Exception as e:
+        print(f"Erro ao ler a planilha: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    # No modo --stream, `df` é o primeiro bloco: as colunas são validadas antes de gerar
+    missing_cols = validate_columns(df)
+    if missing_cols:
+        print("Erro: a planilha não possui todas as colunas necessárias:", file=sys.stderr)
+        for m in missing_cols:
+            print(f"  - {m}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    col_vencimento = find_column_in_df(df, ['Vencimento', 'Data Vencimento'])
+    if not col_vencimento:
+        if args.new_date:
+            print(f"Vencimento definido para todas as notas: {args.new_date.strftime('%d/%m/%Y')}")
+        else:
+            print("Aviso: a planilha não possui coluna de Vencimento (use --new-date para informar).",
+                  file=sys.stderr)
+
+    linhas_expiradas = []
+    linhas_lidas = 0
+
+    def prepare_dates(chunk: pd.DataFrame) -> pd.DataFrame:
+        """Define ou substitui os vencimentos do bloco, acumulando as linhas expiradas."""
+        nonlocal linhas_lidas
+        offset, linhas_lidas = linhas_lidas, linhas_lidas + len(chunk)
+        if not col_vencimento:
+            if args.new_date:
+                chunk['Vencimento'] = args.new_date.strftime('%d/%m/%Y')
+            return chunk
+        expiradas = check_expiration_column(chunk, col_vencimento, row_offset=offset)
+        linhas_expiradas.extend(expiradas)
+        if expiradas and args.expired == "replace":
+            chunk = apply_date_replacement(chunk, col_vencimento, expiradas, args.new_date, row_offset=offset)
+        return chunk
+
+    if args.stream:
+        # Os vencimentos de cada bloco são tratados quando a geração o consome
+        frames = (prepare_dates(chunk) for chunk in chain([df], chunks))
+    else:
+        frames = prepare_dates(df)
+        _print_expired(linhas_expiradas, args)
+
+    if args.dry_run:
+        report = run_preflight(
+            frames, args.template, mask_data=args.lgpd, engine=args.engine,
+            workers=1 if args.merge else min(resolve_worker_count(args.workers), max(1, len(frames)))
+        )
+        for line in report.summary_lines():
+            print(line)
+        return EXIT_OK if report.ok else EXIT_ROW_ERRORS
+
+    job_sink = None
+    if args.job_dir is not None:
+        params = {
+            "planilha": args.input.name, "template": args.template, "lgpd": args.lgpd, "engine": args.engine,
+            "expired": args.expired, "new_date": args.new_date.isoformat() if args.new_date else None,
+        }
+        try:
+            job_sink = open_job(args.job_dir, params, resume=args.resume or args.retry_failed is not None)
+            skip = rows_to_skip(args.job_dir, retry_failed=args.retry_failed is not None, manifest=retry_manifest)
+        except CheckpointError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return EXIT_INVALID_INPUT
+        if skip:
+            print(f"Retomando {args.job_dir}: {len(skip)} linha(s) já concluída(s) não serão renderizadas.")
+
+    template_jinja = get_compiled_template(args.template)
+    # O modo --merge renderiza cada PDF numa única passagem, no processo principal
+    workers = 1 if args.merge else resolve_worker_count(args.workers)
+
+    # Grava em arquivo (ou pasta) parcial e renomeia no fim: a saída no destino está sempre completa
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = args.output.with_name(args.output.name + ".part")
+    split_bytes = int(args.split_mb * 1024 * 1024) if args.split_mb else None
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            if job_sink is not None:
+                # Gera na pasta do job; o arquivo final é montado depois, com todas as notas concluídas
+                _, gerados, _ = generate_notes_zip(
+                    frames, template_jinja, mask_data=args.lgpd, progress_callback=_progress_printer(args.quiet),
+                    workers=workers, engine=args.engine,
+                    timings=args.timings, profile=args.profile, sink=job_sink, skip_rows=skip
+                )
+            # ZIPs divididos e pastas recebem a pasta parcial; ZIP e tar, o arquivo parcial aberto
+            target = partial_path if args.sink in ("zip-split", "dir") else stack.enter_context(open(partial_path, "w+b"))
+            sink = create_sink(
+                args.sink, target,
+                compression=args.compression, max_bytes=split_bytes, max_notes=args.split_notes,
+                partition=args.partition
+            )
+            if job_sink is not None:
+                _, relatorio = assemble_archive(args.job_dir, sink, manifest=retry_manifest)
+                erros = [
+                    f"Linha {r['linha_planilha']} ({r['razao_social']}): {r['mensagem_erro']}"
+                    for r in relatorio if r["status"] != "SUCESSO"
+                ]
+            elif args.merge:
+                _, relatorio, erros = generate_notes_pdf(
+                    frames, template_jinja, mask_data=args.lgpd, progress_callback=_progress_printer(args.quiet),
+                    engine=args.engine, notes_per_file=args.notes_per_file, sink=sink
+                )
+            else:
+                _, relatorio, erros = generate_notes_zip(
+                    frames, template_jinja, mask_data=args.lgpd, progress_callback=_progress_printer(args.quiet),
+                    workers=workers, engine=args.engine,
+                    timings=args.timings, profile=args.profile, sink=sink
+                )
+        os.replace(partial_path, args.output)
+    except BaseException:
+        if partial_path.is_dir():
+            shutil.rmtree(partial_path, ignore_errors=True)
+        else:
+            partial_path.unlink(missing_ok=True)
+        raise
+    elapsed = time.perf_counter() - start
+
+    if args.stream:
+        _print_expired(linhas_expiradas, args)
+    if job_sink is not None:
+        # Vazão desta execução; o total do arquivo final inclui as linhas retomadas
+        print_summary(gerados, elapsed, workers, args.output)
+        sucesso = sum(1 for r in relatorio if r["status"] == "SUCESSO")
+        print(f"Arquivo final: {sucesso}/{len(relatorio)} nota(s) (pasta do job: {args.job_dir})")
+        anteriores = sum(
+            1 for r in relatorio if r["status"] == "SUCESSO" and r.get(ORIGIN_COLUMN) == ORIGIN_PREVIOUS
+        )
+        if anteriores:
+            print(f"  {anteriores} nota(s) certa(s) de {retry_manifest.name} não estão neste arquivo: "
+                  f"continuam no arquivo daquela execução (coluna {ORIGIN_COLUMN} = {ORIGIN_PREVIOUS})")
+    else:
+        print_summary(relatorio, elapsed, workers, args.output)
+    for e in erros:
+        print(f"  {e}", file=sys.stderr)
+    return EXIT_ROW_ERRORS if erros else EXIT_OK
+
+def _print_expired(linhas_expiradas: list[dict], args: argparse.Namespace) -> None:
+    if not linhas_expiradas:
+        return
+    if args.expired == "replace":
+        print(f"{len(linhas_expiradas)} vencimento(s) expirado(s) substituído(s) por "
+              f"{args.new_date.strftime('%d/%m/%Y')}")
+    else:
+        print(f"Aviso: {len(linhas_expiradas)} nota(s) com vencimento expirado mantidas.", file=sys.stderr)
+
+def print_summary(relatorio: list[dict], elapsed: float, workers: int, output: Path) -> None:
+    """Resumo de vazão do lote."""
+    total = len(relatorio)
+    sucesso = sum(1 for r in relatorio if r['status'] == 'SUCESSO')
+    print(f"Notas geradas: {sucesso}/{total} ({total - sucesso} erro(s))")
+    print(f"Tempo total: {elapsed:.2f} s | {total / elapsed if elapsed else 0:.1f} notas/s | "
+          f"{elapsed * 1000 / total if total else 0:.1f} ms/nota | {workers} processo(s)")
+    if relatorio and "cache_pdf" in relatorio[0]:
+        acertos = sum(1 for r in relatorio if r.get("cache_pdf") == "ACERTO")
+        falhas = sum(1 for r in relatorio if r.get("cache_pdf") == "FALHA")
+        print(f"Cache de PDFs: {acertos} acerto(s), {falhas} falha(s)")
+    print(f"Saída: {output}")
+
+def main(argv: Optional[list[str]] = None) -> int:
+    return run(build_parser().parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,47 @@
+import numpy as np
 import pandas as pd
 from datetime import date
-from typing import Optional
-from src.core.utils import parse_date, find_column_in_df
+from src.core.utils import parse_date_series, find_column_in_df
 
-def check_expiration_column(df: pd.DataFrame, col_vencimento: str) -> list[dict]:
+def check_expiration_column(df: pd.DataFrame, col_vencimento: str, row_offset: int = 0) -> list[dict]:
     """
     Verifica as datas de vencimento na coluna especificada e identifica notas expiradas.
     Retorna uma lista de dicionários com os detalhes das notas expiradas.
+    A "Linha" vem da posição no df, não do índice. Em blocos da planilha, `row_offset` é o nº de
+    linhas dos blocos anteriores.
     """
-    hoje = date.today()
-    linhas_expiradas = []
-    
+    hoje = pd.Timestamp(date.today())
+
     # Identifica coluna de Nome para o relatório de erros
     nome_col = find_column_in_df(df, ['Nome', 'Razão Social', 'Razao Social', 'Cliente'])
-    
-    for idx, row in df.iterrows():
-        val = row.get(col_vencimento)
-        d = parse_date(val)
-        
-        if d and d < hoje:
-            razao = str(row[nome_col]) if nome_col else f"Linha {idx + 2}"
-            linhas_expiradas.append({
-                "Linha": idx + 2,
-                "Razão Social": razao,
-                "Vencimento": d.strftime('%d/%m/%Y')
-            })
-            
+
+    datas = parse_date_series(df[col_vencimento])
+    posicoes = np.flatnonzero((datas < hoje).to_numpy())
+    if len(posicoes) == 0:
+        return []
+
+    nomes = df[nome_col].iloc[posicoes].astype(str).tolist() if nome_col else None
+    vencimentos = datas.iloc[posicoes].dt.strftime('%d/%m/%Y').tolist()
+
+    linhas_expiradas = []
+    for k, pos in enumerate(posicoes):
+        linha = row_offset + int(pos) + 2
+        linhas_expiradas.append({
+            "Linha": linha,
+            "Razão Social": nomes[k] if nomes is not None else f"Linha {linha}",
+            "Vencimento": vencimentos[k]
+        })
+
     return linhas_expiradas
 
-def apply_date_replacement(df: pd.DataFrame, col_vencimento: str, expired_rows: list[dict], new_date: date) -> pd.DataFrame:
+def apply_date_replacement(
+    df: pd.DataFrame, col_vencimento: str, expired_rows: list[dict], new_date: date, row_offset: int = 0
+) -> pd.DataFrame:
     """
     Substitui as datas das linhas expiradas por uma nova data informada.
+    A "Linha" de cada registro é convertida na posição do df e daí no rótulo do índice, então
+    qualquer índice funciona. `row_offset` deve ser o mesmo usado em check_expiration_column.
     """
-    indices_expirados = [r["Linha"] - 2 for r in expired_rows]
+    indices_expirados = df.index[[r["Linha"] - 2 - row_offset for r in expired_rows]]
     df.loc[indices_expirados, col_vencimento] = new_date.strftime('%d/%m/%Y')
     return df
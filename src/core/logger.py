@@ -1,51 +1,202 @@
+"""
+Logger da aplicação.
+
+Os registros passam pelo filtro LGPD e entram numa fila (QueueHandler); uma thread
+(QueueListener) grava no console e em logs/app.log, com rotação por tamanho. Quem renderiza
+PDFs nunca espera pelo disco. Processos de renderização enviam seus registros ao processo
+principal pela fila de get_worker_log_queue() (ver configure_worker_logging); processos criados
+por fork fazem o mesmo automaticamente, então só o processo principal grava e rotaciona o log.
+"""
+import atexit
+import json
 import logging
-import sys
+import logging.handlers
+import multiprocessing
+import os
+import queue
 import re
+import sys
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Optional
 from config.settings import settings
 
-def setup_logger(name: str = "app_logger"):
-    # Garante que o diretório de logs existe
-    settings.LOGS_DIR.mkdir(exist_ok=True)
-    
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+LOG_FORMATS = ("text", "json")
+
+# CPF (000.000.000-00), 11 dígitos seguidos (CPF sem máscara) e CNPJ (00.000.000/0000-00)
+_SENSITIVE_PATTERN = re.compile(
+    r'\b(?:(?P<cpf>\d{3}\.\d{3}\.\d{3}-\d{2})|(?P<digits>\d{11})|(?P<cnpj>\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}))\b'
+)
+_SENSITIVE_MASKS = {
+    "cpf": "***.***.***-**",
+    "digits": "***********",
+    "cnpj": "**.***.***/****-**",
+}
+
+# Listeners ativos por logger: a fila do próprio processo e a fila dos processos filhos
+_listeners: dict[str, logging.handlers.QueueListener] = {}
+_worker_listeners: dict[tuple[str, str], tuple[Any, logging.handlers.QueueListener]] = {}
+
+def mask_sensitive(text: str) -> str:
+    """Mascara CPFs e CNPJs em um texto de log."""
+    return _SENSITIVE_PATTERN.sub(lambda m: _SENSITIVE_MASKS[m.lastgroup], text)
+
+class SensitiveDataFilter(logging.Filter):
+    """Filtro LGPD: mascara a mensagem já formatada (inclusive os argumentos) antes de enfileirar."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = mask_sensitive(record.getMessage())
+        record.args = None
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha, para ferramentas de coleta de logs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+def _build_handlers(log_file: Path, fmt: str) -> list[logging.Handler]:
+    if fmt == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+
+    # File Handler (rotação por tamanho: app.log, app.log.1, ...)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file,
+        maxBytes=settings.LOG_MAX_MB * 1024 * 1024,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        encoding='utf-8'
     )
-    
-    # File Handler
-    file_handler = logging.FileHandler(settings.LOGS_DIR / "app.log", encoding='utf-8')
     file_handler.setFormatter(formatter)
-    
+
     # Console Handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    
-    # Filtro LGPD para mascarar dados sensíveis nos logs
-    class SensitiveDataFilter(logging.Filter):
-        def filter(self, record):
-            msg = str(record.msg)
-            # Regex simples para CPF e CNPJ
-            # CPF: 000.000.000-00 ou 00000000000
-            msg = re.sub(r'\b\d{3}\.\d{3}\.\d{3}-\d{2}\b', '***.***.***-**', msg)
-            msg = re.sub(r'\b\d{11}\b', '***********', msg)
-            # CNPJ: 00.000.000/0000-00
-            msg = re.sub(r'\b\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}\b', '**.***.***/****-**', msg)
-            record.msg = msg
-            return True
-
-    lgpd_filter = SensitiveDataFilter()
+    return [file_handler, console_handler]
+
+def setup_logger(name: str = "app_logger", log_file: Optional[Path] = None, fmt: Optional[str] = None):
+    """
+    Configura o logger `name` com filtro LGPD e gravação em segundo plano.
+    `fmt` é "text" ou "json" (padrão settings.LOG_FORMAT); `log_file` padrão: LOGS_DIR/app.log.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
 
     # Evita duplicidade de handlers se a função for chamada múltiplas vezes
-    if not logger.handlers:
-        logger.addFilter(lgpd_filter)
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        
+    if logger.handlers:
+        return logger
+
+    fmt = fmt or settings.LOG_FORMAT
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"LOG_FORMAT inválido: '{fmt}' (use {', '.join(LOG_FORMATS)})")
+    if log_file is None:
+        # Garante que o diretório de logs existe
+        settings.LOGS_DIR.mkdir(exist_ok=True)
+        log_file = settings.LOGS_DIR / "app.log"
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *_build_handlers(log_file, fmt), respect_handler_level=True
+    )
+    listener.start()
+    _listeners[name] = listener
+
+    logger.addFilter(SensitiveDataFilter())
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
     return logger
 
+def shutdown_logger(name: str = "app_logger") -> None:
+    """Grava os registros pendentes e fecha os arquivos do logger (chamado também na saída)."""
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    for key in [key for key in _worker_listeners if key[0] == name]:
+        worker_queue, worker_listener = _worker_listeners.pop(key)
+        worker_listener.stop()
+        worker_queue.close()
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+def _shutdown_all() -> None:
+    for name in {*_listeners, *(name for name, _ in _worker_listeners)}:
+        shutdown_logger(name)
+
+def get_worker_log_queue(name: str = "app_logger", mp_context=None):
+    """
+    Fila entre processos para os registros dos workers (initargs do ProcessPoolExecutor),
+    criada no mesmo `mp_context` do pool. Uma thread do processo principal repassa os
+    registros aos handlers do logger, então só este processo escreve (e rotaciona) o log.
+    Num processo criado por fork, a thread repassa os registros à fila do pai. Retorna None se
+    o logger já foi encerrado (shutdown_logger): os workers ficam com o logging padrão.
+    """
+    handlers = _listeners[name].handlers if name in _listeners else tuple(logging.getLogger(name).handlers)
+    if not handlers:
+        return None
+    mp_context = mp_context or multiprocessing.get_context()
+    key = (name, mp_context.get_start_method())
+    if key not in _worker_listeners:
+        worker_queue = mp_context.Queue(-1)
+        listener = logging.handlers.QueueListener(worker_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _worker_listeners[key] = (worker_queue, listener)
+    return _worker_listeners[key][0]
+
+def configure_worker_logging(log_queue, name: str = "app_logger") -> None:
+    """No processo filho: descarta os handlers herdados e envia os registros para `log_queue`."""
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        # No spawn, o filho iniciou seu próprio listener ao importar este módulo
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    for key in [key for key in _worker_listeners if key[0] == name]:
+        del _worker_listeners[key]
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+def _prepare_fork_queues() -> None:
+    # Antes do fork: a fila entre processos (contexto fork) de cada logger ativo, herdada pelo filho
+    for name in list(_listeners):
+        get_worker_log_queue(name, multiprocessing.get_context("fork"))
+
+def _route_to_parent_after_fork() -> None:
+    # A thread do listener não sobrevive ao fork, e reiniciá-la faria cada filho gravar e
+    # rotacionar o mesmo arquivo. O filho passa a enviar os registros à fila do pai; os handlers
+    # herdados não são fechados (os arquivos continuam sendo do pai).
+    fork_queues = {
+        name: worker_queue
+        for (name, method), (worker_queue, _) in _worker_listeners.items() if method == "fork"
+    }
+    _worker_listeners.clear()
+    for name in list(_listeners):
+        del _listeners[name]
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        if name in fork_queues:
+            logger.addHandler(logging.handlers.QueueHandler(fork_queues[name]))
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_prepare_fork_queues, after_in_child=_route_to_parent_after_fork)
+atexit.register(_shutdown_all)
+
 logger = setup_logger()
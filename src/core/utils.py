@@ -1,41 +1,74 @@
+import numpy as np
 import pandas as pd
 import unicodedata
 import re
+from dataclasses import dataclass
 from datetime import datetime, date
-from typing import Any, Optional
+from functools import lru_cache
+from typing import Any, Iterator, Optional, Sequence
 from config.settings import settings
 from src.core.logger import logger
 
+# Textos distintos memorizados por função de limpeza (nome do consórcio, UF, mês de referência
+# etc. se repetem na planilha inteira); o limite evita crescer sem fim com valores únicos
+_TEXT_MEMO_SIZE = 65536
+# Caracteres de controle ASCII (categoria "C" do unicode dentro do ASCII)
+_ASCII_CONTROL = dict.fromkeys([*range(32), 127])
+
+@lru_cache(maxsize=_TEXT_MEMO_SIZE)
+def _sanitize_str(text: str) -> str:
+    # ASCII puro: a NFKC não altera nada e os únicos controles possíveis saem pela tabela
+    if text.isascii():
+        return text.translate(_ASCII_CONTROL).strip()
+
+    # Normalização NFKC (compatibilidade) converte caracteres "exóticos" em seus equivalentes padrão
+    normalized = unicodedata.normalize('NFKC', text)
+
+    # Mantém caracteres imprimíveis e remove controles que quebram o PDF
+    clean = "".join(ch for ch in normalized if unicodedata.category(ch)[0] != "C")
+
+    return clean.strip()
+
 def sanitize_text(text: Any) -> str:
     """
     Limpa caracteres especiais e normaliza unicode para evitar erros no xhtml2pdf.
+    Cada texto distinto é processado uma única vez (ver get_text_cache_stats).
     """
     if pd.isna(text) or text == "" or text is None:
         return ""
-    
-    text = str(text)
-    
-    # Normalização NFKC (compatibilidade) converte caracteres "exóticos" em seus equivalentes padrão
-    normalized = unicodedata.normalize('NFKC', text)
-    
-    # Mantém caracteres imprimíveis e remove controles que quebram o PDF
-    clean = "".join(ch for ch in normalized if unicodedata.category(ch)[0] != "C")
-    
-    return clean.strip()
+    return _sanitize_str(str(text))
+
+# Número já normalizado (ponto decimal, sem separador de milhar); aceita notação científica
+_CURRENCY_NUMBER_RE = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+_CURRENCY_NUMBER = re.compile(_CURRENCY_NUMBER_RE)
+_WHITESPACE = re.compile(r'\s+')
+# Troca separadores do formato US (1,234.56) para o BR (1.234,56)
+_BR_SEPARATORS = str.maketrans(',.', '.,')
+
+def _normalize_currency_str(val_str: str) -> str:
+    """
+    Remove prefixo R$ e espaços e converte para ponto decimal.
+    Com vírgula e ponto, o último separador é o decimal (BR: 1.234,56 | US: 1,234.56).
+    """
+    s = _WHITESPACE.sub('', val_str.replace('R$', ''))
+    if ',' in s and '.' in s:
+        if s.rfind(',') > s.rfind('.'):
+            return s.replace('.', '').replace(',', '.')
+        return s.replace(',', '')
+    if ',' in s:
+        return s.replace(',', '.')
+    return s
+
+def _format_brl(value: float) -> str:
+    return f"R$ {value:,.2f}".translate(_BR_SEPARATORS)
 
 def format_currency(val: Any) -> str:
     try:
         if pd.isna(val) or str(val).strip() == "": return "R$ 0,00"
-        val_str = str(val).strip()
-        
-        if ',' in val_str and '.' in val_str: 
-            clean = val_str.replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.')
-        elif ',' in val_str: 
-            clean = val_str.replace('R$', '').replace(' ', '').replace(',', '.')
-        else: 
-            clean = val_str.replace('R$', '').strip()
-            
-        return f"R$ {float(clean):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        clean = _normalize_currency_str(str(val).strip())
+        if not _CURRENCY_NUMBER.fullmatch(clean):
+            raise ValueError(f"valor monetário inválido: '{clean}'")
+        return _format_brl(float(clean))
     except Exception as e:
         logger.warning(f"Erro ao formatar moeda '{val}': {e}")
         return str(val)
@@ -44,16 +77,84 @@ def parse_currency(val: Any) -> float:
     """Converte string de moeda para float para cálculos."""
     try:
         if pd.isna(val): return 0.0
-        s = str(val).strip().replace("R$", "").strip()
-        if "," in s and "." in s:
-            s = s.replace(".", "").replace(",", ".")
-        elif "," in s:
-            s = s.replace(",", ".")
-        return float(s)
+        s = str(val).strip()
+        if s == "": return 0.0
+        clean = _normalize_currency_str(s)
+        if not _CURRENCY_NUMBER.fullmatch(clean):
+            raise ValueError(f"valor monetário inválido: '{clean}'")
+        return float(clean)
     except Exception as e:
         logger.warning(f"Erro ao fazer parse de moeda '{val}': {e}")
         return 0.0
 
+def _currency_uniques(values: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Normaliza cada texto distinto da coluna uma única vez (pd.factorize) com as mesmas regras
+    de parse_currency. Retorna (codes, vazios, uniques, valores por unique, inválidos por unique).
+    """
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        # Colunas numéricas (ex: xlsx) dispensam a normalização de texto
+        codes, uniques = pd.factorize(values)
+        parsed_u = np.asarray(uniques, dtype=float)
+        return codes, codes < 0, np.asarray(uniques, dtype=object), parsed_u, np.zeros(len(uniques), dtype=bool)
+
+    codes, uniques = pd.factorize(values.astype(str))
+    parsed_u = np.zeros(len(uniques))
+    invalid_u = np.zeros(len(uniques), dtype=bool)
+    blank_u = np.zeros(len(uniques), dtype=bool)
+    for k, u in enumerate(uniques):
+        s = u.strip()
+        if s == "":
+            blank_u[k] = True
+            continue
+        clean = _normalize_currency_str(s)
+        if _CURRENCY_NUMBER.fullmatch(clean):
+            parsed_u[k] = float(clean)
+        else:
+            invalid_u[k] = True
+    blank = values.isna().to_numpy() | blank_u[codes]
+    return codes, blank, np.asarray(uniques, dtype=object), parsed_u, invalid_u
+
+def _parse_currency_values(values: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Versão colunar de parse_currency sem log; retorna (valores, máscara de inválidos)."""
+    codes, blank, _, parsed_u, invalid_u = _currency_uniques(values)
+    if len(parsed_u) == 0:
+        # Coluna só com vazios (ex: numérica toda NaN): não há uniques para indexar
+        return pd.Series(0.0, index=values.index), pd.Series(False, index=values.index)
+    # Vazios têm code -1; o índice 0 só preenche a posição descartada pelo np.where
+    safe_codes = np.maximum(codes, 0)
+    parsed = np.where(blank, 0.0, parsed_u[safe_codes])
+    invalid = invalid_u[safe_codes] & ~blank
+    return pd.Series(parsed, index=values.index), pd.Series(invalid, index=values.index)
+
+def parse_currency_series(values: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Converte uma coluna inteira de moeda para float (mesmas regras de parse_currency).
+    Retorna (valores, inválidos): células inválidas viram 0.0 e são indicadas na máscara,
+    com um único aviso no log em vez de um por célula.
+    """
+    parsed, invalid = _parse_currency_values(values)
+    if invalid.any():
+        logger.warning(f"{int(invalid.sum())} valor(es) de moeda inválido(s) na coluna '{values.name}' considerados 0,00.")
+    return parsed, invalid
+
+def format_currency_series(values: pd.Series) -> pd.Series:
+    """
+    Formata uma coluna inteira no padrão R$ 1.234,56 (mesmas regras de format_currency).
+    Células inválidas são mantidas como texto original.
+    """
+    codes, blank, uniques, parsed_u, invalid_u = _currency_uniques(values)
+    if len(parsed_u) == 0:
+        return pd.Series("R$ 0,00", index=values.index, dtype=object)
+    formatted_u = np.array([_format_brl(v) for v in parsed_u], dtype=object)
+    formatted_u[invalid_u] = uniques[invalid_u]
+    safe_codes = np.maximum(codes, 0)
+    formatted = pd.Series(np.where(blank, "R$ 0,00", formatted_u[safe_codes]), index=values.index)
+    invalid = invalid_u[safe_codes] & ~blank
+    if invalid.any():
+        logger.warning(f"{int(invalid.sum())} valor(es) de moeda inválido(s) na coluna '{values.name}' mantidos sem formatação.")
+    return formatted
+
 def mask_cpf_cnpj(val: Any) -> str:
     """
     Mascaramento de CPF/CNPJ seguindo melhores práticas:
@@ -98,20 +199,88 @@ def mask_name(name: Any, doc: Any = None) -> str:
     masked_rest = " ".join(["*" * len(p) for p in parts[1:]])
     return f"{first_name} {masked_rest}"
 
+_NON_DIGITS = re.compile(r'\D')
+
+def mask_lgpd_series(names: pd.Series, docs: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Versão colunar de mask_name + mask_cpf_cnpj (mesmas regras e mesma saída), em uma única
+    passada: os dígitos de cada documento são extraídos uma vez e classificam a linha como CPF
+    (11), CNPJ (14) ou outro, decidindo as duas máscaras. Recebe textos já sanitizados (vazio
+    ou NA quando ausente) e retorna (nomes, documentos) com o índice de `docs`.
+    """
+    masked_names, masked_docs = [], []
+    for name, doc in zip(names.fillna("").astype(str), docs.fillna("").astype(str)):
+        digits = _NON_DIGITS.sub('', doc)
+        if len(digits) == 11:
+            masked_docs.append(f"***.***.{digits[6:9]}-{digits[9:]}")
+        elif len(digits) == 14:
+            masked_docs.append(f"**.***.{digits[5:8]}/{digits[8:12]}-**")
+        else:
+            masked_docs.append(doc)
+
+        # Razão social de PJ (CNPJ) é dado público e não é mascarada
+        parts = name.split() if len(digits) != 14 else ()
+        if len(parts) <= 1:
+            masked_names.append(name)
+        else:
+            masked_names.append(parts[0] + " " + " ".join("*" * len(p) for p in parts[1:]))
+    return (
+        pd.Series(masked_names, index=docs.index, dtype=object),
+        pd.Series(masked_docs, index=docs.index, dtype=object),
+    )
+
+_FILENAME_UNSAFE = re.compile(r'[^\w\s-]')
+_COL_NAME_UNSAFE = re.compile(r'[^a-z0-9]')
+
+def _to_ascii(text: str) -> str:
+    if text.isascii():
+        return text
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
+
+@lru_cache(maxsize=_TEXT_MEMO_SIZE)
+def _clean_filename_str(text: str) -> str:
+    return _FILENAME_UNSAFE.sub('', _to_ascii(text)).strip().replace(' ', '_').upper()
+
 def clean_filename_text(text: Any) -> str:
     if not isinstance(text, str): return ""
     try:
-        norm = unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
-        return re.sub(r'[^\w\s-]', '', norm).strip().replace(' ', '_').upper()
+        return _clean_filename_str(text)
     except Exception as e:
         logger.error(f"Erro ao limpar texto para nome de arquivo '{text}': {e}")
         return ""
 
+@lru_cache(maxsize=_TEXT_MEMO_SIZE)
+def _normalize_col_str(text: str) -> str:
+    return _COL_NAME_UNSAFE.sub('', _to_ascii(text).lower())
+
 def normalize_col_name(text: Any) -> str:
     """Remove espaços, acentos, caracteres especiais e transforma em minúsculas."""
     if not isinstance(text, str): return ""
-    norm = unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
-    return re.sub(r'[^a-z0-9]', '', norm.lower())
+    return _normalize_col_str(text)
+
+_TEXT_CACHES = {
+    "sanitize_text": _sanitize_str,
+    "clean_filename_text": _clean_filename_str,
+    "normalize_col_name": _normalize_col_str,
+}
+
+def get_text_cache_stats() -> dict[str, tuple[int, int]]:
+    """(acertos, falhas) acumulados no processo do cache de cada função de limpeza de texto."""
+    return {name: (fn.cache_info().hits, fn.cache_info().misses) for name, fn in _TEXT_CACHES.items()}
+
+def format_text_cache_hit_rates(since: Optional[dict[str, tuple[int, int]]] = None) -> str:
+    """Taxa de acerto de cada cache desde o instantâneo `since` (get_text_cache_stats), para o log."""
+    partes = []
+    for name, (hits, misses) in get_text_cache_stats().items():
+        if since is not None:
+            hits, misses = hits - since[name][0], misses - since[name][1]
+        if hits + misses:
+            partes.append(f"{name}: {hits / (hits + misses):.0%} de {hits + misses}")
+    return ", ".join(partes)
+
+def clear_text_caches() -> None:
+    for fn in _TEXT_CACHES.values():
+        fn.cache_clear()
 
 def find_column_in_df(df: pd.DataFrame, options: list[str]) -> Optional[str]:
     """Encontra o nome real da coluna no DataFrame com base em uma lista de opções permitidas (ignora formatação)."""
@@ -136,6 +305,9 @@ def validate_columns(df: pd.DataFrame) -> list[str]:
             
     return missing
 
+# Formatos aceitos para datas, em ordem de prioridade
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y/%m/%d')
+
 def parse_date(val: Any) -> Optional[date]:
     """Tenta converter string ou objeto para date; retorna None se falhar."""
     if pd.isna(val) or str(val).strip() == '':
@@ -144,39 +316,197 @@ def parse_date(val: Any) -> Optional[date]:
     if isinstance(val, (date, datetime)):
         return val.date() if isinstance(val, datetime) else val
 
-    for fmt in ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y/%m/%d'):
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(str(val).strip(), fmt).date()
         except (ValueError, TypeError):
             pass
     return None
 
-def prepare_context(row: pd.Series, mask_data: bool = False) -> dict[str, Any]:
+def parse_date_series(values: pd.Series) -> pd.Series:
     """
-    Prepara o dicionário de contexto para o Jinja2 e Preview.
+    Versão colunar de parse_date. Cada valor distinto é convertido uma única vez e cada formato
+    de DATE_FORMATS é aplicado com pd.to_datetime sobre os textos ainda não reconhecidos
+    (mesma prioridade do parse_date). Retorna datetime64[s] (meia-noite), com NaT quando inválido.
     """
-    normalized_index = {normalize_col_name(c): c for c in row.index}
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if getattr(values.dt, "tz", None) is not None:
+            values = values.dt.tz_localize(None)
+        return values.dt.normalize().astype('datetime64[s]')
+
+    codes, uniques = pd.factorize(values)
+    u = pd.Series(uniques, dtype=object)
+    parsed = pd.Series(pd.NaT, index=u.index, dtype='datetime64[s]')
+
+    is_date = u.map(lambda v: isinstance(v, (date, datetime))).astype(bool)
+    for k in u.index[is_date]:
+        parsed[k] = np.datetime64(parse_date(u[k]), 's')
 
-    def get(keys: list[str], default: str = "") -> str:
-        for key in keys:
-            norm_key = normalize_col_name(key)
-            if norm_key in normalized_index:
-                actual_key = normalized_index[norm_key]
-                val = row[actual_key]
-                if pd.notna(val) and str(val).strip() != "":
-                    raw_val = str(val).replace('\n', ' ')
-                    return sanitize_text(raw_val)
-        return default
+    text = u.astype(str).str.strip()
+    pending = ~is_date & (text != "")
+    for fmt in DATE_FORMATS:
+        if not pending.any():
+            break
+        converted = pd.to_datetime(text[pending], format=fmt, errors='coerce')
+        ok = converted.notna()
+        parsed[ok[ok].index] = converted[ok].astype('datetime64[s]')
+        pending &= parsed.isna()
+
+    # Datas fora do intervalo do pandas (ex: ano digitado errado) seguem pelo caminho escalar
+    for k in u.index[pending]:
+        d = parse_date(u[k])
+        if d:
+            parsed[k] = np.datetime64(d, 's')
+
+    result = parsed.to_numpy()[codes]
+    result[codes < 0] = np.datetime64('NaT')
+    return pd.Series(result, index=values.index, name=values.name)
+
+# Aliases aceitos para cada campo do contexto (a ordem define a prioridade)
+CONTEXT_FIELDS: dict[str, list[str]] = {
+    "endereco": ['Endereço', 'Endereco'],
+    "endereco_consorcio": ['Endereço Consórcio', 'Endereco Consorcio'],
+    "cidade": ['Cidade'],
+    "uf": ['UF'],
+    "data_emissao": ['Data de Emissão', 'Data Emissao'],
+    "nome_consorcio": ['Nome Consórcio', 'Nome Consorcio', 'Consórcio', 'Consorcio'],
+    "cnpj_consorcio": ['CNPJ Consórcio', 'CNPJ Consorcio'],
+    "razao_social": ['Nome', 'Razão Social', 'Razao Social', 'Cliente'],
+    "cnpj_consorciado": ['CNPJ/CPF', 'CNPJ', 'CPF'],
+    "numero_conta": ['Número da conta', 'Numero da conta', 'Conta vinculada'],
+    "numero_cobranca": ['Nº da cobrança', 'N da cobranca'],
+    "numero_instalacao": ['Instalação', 'Instalacao', 'Numero Instalacao', 'Num. Instalação'],
+    "data_vencimento": ['Vencimento', 'Data Vencimento'],
+    "mes_referencia": ['Mês de Referência', 'Mes Referencia', 'Referencia'],
+    "total_pagar": ['Total a pagar', 'Total calculado R$', 'Valor consolidado', 'Valor emitido', 'Total'],
+    "economia_mes": ['Economia R$', 'Economia mês', 'ECONOMIA'],
+    # Aceita também Número da conta como alias
+    "dados_bancarios": ['Dados bancários', 'Dados bancarios', 'Pagamento', 'Número da conta', 'Numero da conta'],
+}
+
+# Campos da linha repassados ao destino das notas (ver note_metadata)
+NOTE_METADATA_FIELDS = ("nome_consorcio", "uf")
+
+# Colunas posicionais usadas como fallback quando o alias não existe
+DADOS_BANCARIOS_FALLBACK_POS = 29  # Coluna AD
+INSTALACAO_FALLBACK_POS = 0        # Coluna A
+
+@dataclass(frozen=True)
+class ContextPlan:
+    """
+    Mapeamento pré-compilado de cada campo do contexto para as posições das colunas candidatas.
+    Compilado uma única vez por conjunto de colunas (ver compile_context_plan).
+    """
+    fields: dict[str, tuple[int, ...]]
+    n_columns: int
+
+@lru_cache(maxsize=64)
+def _compile_context_plan(columns: tuple) -> ContextPlan:
+    # Mesma semântica do índice normalizado: em colisões, a última coluna prevalece
+    normalized_pos = {normalize_col_name(c): pos for pos, c in enumerate(columns)}
+    fields = {}
+    for key, aliases in CONTEXT_FIELDS.items():
+        positions = []
+        for alias in aliases:
+            pos = normalized_pos.get(normalize_col_name(alias))
+            if pos is not None and pos not in positions:
+                positions.append(pos)
+        fields[key] = tuple(positions)
+    return ContextPlan(fields=fields, n_columns=len(columns))
+
+def compile_context_plan(columns: Sequence) -> ContextPlan:
+    """Resolve os aliases de CONTEXT_FIELDS contra as colunas informadas (resultado em cache)."""
+    return _compile_context_plan(tuple(columns))
+
+def _coalesce_field(df: pd.DataFrame, positions: tuple[int, ...]) -> pd.Series:
+    """
+    Versão colunar do get() de build_context: primeiro valor não vazio entre as colunas
+    candidatas, já sanitizado. Linhas sem valor ficam como NA.
+    """
+    result = pd.Series(pd.NA, index=df.index, dtype="object")
+    for pos in positions:
+        col = df.iloc[:, pos]
+        txt = col.astype(str)
+        found = col.notna() & (txt.str.strip() != "") & result.isna()
+        result[found] = txt[found].str.replace('\n', ' ', regex=False)
+    # Sanitiza cada valor distinto uma única vez
+    uniques = result.dropna().unique()
+    return result.map({u: sanitize_text(u) for u in uniques}, na_action='ignore')
+
+def precompute_context_fields(df: pd.DataFrame, plan: ContextPlan, mask_data: bool = False) -> pd.DataFrame:
+    """
+    Calcula de forma colunar os campos do contexto que não dependem de outras colunas da linha
+    (moedas e, com `mask_data`, nome e documento mascarados). O resultado é indexado como o df
+    e consumido por build_context(precomputed=...).
+    """
+    total_raw = _coalesce_field(df, plan.fields["total_pagar"]).fillna('0')
+    economia_raw = _coalesce_field(df, plan.fields["economia_mes"]).fillna('0')
+    total_raw.name, economia_raw.name = "total_pagar", "economia_mes"
+
+    raw_total, _ = parse_currency_series(total_raw)
+    fields = {
+        "total_pagar": format_currency_series(total_raw),
+        "economia_mes": format_currency_series(economia_raw),
+        "_raw_total": raw_total,
+    }
+    if mask_data:
+        fields["razao_social"], fields["cnpj_consorciado"] = mask_lgpd_series(
+            _coalesce_field(df, plan.fields["razao_social"]),
+            _coalesce_field(df, plan.fields["cnpj_consorciado"]),
+        )
+    return pd.DataFrame(fields, index=df.index)
+
+def iter_context_rows(
+    df: pd.DataFrame, plan: ContextPlan, mask_data: bool = False
+) -> Iterator[tuple[Any, list, dict[str, Any]]]:
+    """Percorre o df como (rótulo do índice, valores posicionais, campos pré-calculados)."""
+    precomputed = precompute_context_fields(df, plan, mask_data).to_dict('records')
+    for (i, *values), pre in zip(df.itertuples(index=True, name=None), precomputed):
+        yield i, values, pre
+
+def _first_text(values: Sequence, positions: tuple[int, ...], default: str = "") -> str:
+    """Primeiro valor não vazio entre as colunas `positions` da linha, já sanitizado."""
+    for pos in positions:
+        val = values[pos]
+        if pd.notna(val) and str(val).strip() != "":
+            raw_val = str(val).replace('\n', ' ')
+            return sanitize_text(raw_val)
+    return default
+
+def note_metadata(values: Sequence, plan: ContextPlan) -> dict[str, str]:
+    """
+    Dados da linha usados pelo destino das notas (partições do DirectorySink), lidos fora do
+    contexto do template para não alterar o que o build_context devolve.
+    """
+    return {key: _first_text(values, plan.fields[key]) for key in NOTE_METADATA_FIELDS}
+
+def build_context(
+    values: Sequence,
+    plan: ContextPlan,
+    mask_data: bool = False,
+    precomputed: Optional[dict[str, Any]] = None
+) -> dict[str, Any]:
+    """
+    Monta o contexto a partir dos valores posicionais de uma linha (ex: tupla do itertuples)
+    usando um ContextPlan já compilado. Campos presentes em `precomputed`
+    (ver precompute_context_fields) são usados diretamente.
+    """
+    precomputed = precomputed or {}
+
+    def get(key: str, default: str = "") -> str:
+        return _first_text(values, plan.fields[key], default)
+
+    # Nome e documento já mascarados de forma colunar (precompute_context_fields com mask_data)
+    masked = mask_data and "cnpj_consorciado" in precomputed
 
     # Mapeamento
     # Endereço: tenta Endereço avulso, se não existir usa Endereço Consórcio (modelo GD Gestão)
-    endereco_raw = get(['Endereço', 'Endereco'])
-    if not endereco_raw:
-        endereco_raw = get(['Endereço Consórcio', 'Endereco Consorcio'])
-    
+    endereco_consorcio = get("endereco_consorcio")
+    endereco_raw = get("endereco") or endereco_consorcio
+
     # Cidade + UF: monta sufixo só se existirem
-    cidade = get(['Cidade'])
-    uf = get(['UF'])
+    cidade = get("cidade")
+    uf = get("uf")
     if cidade and uf:
         endereco_completo = f"{endereco_raw}, {cidade} - {uf}"
     elif uf:
@@ -184,60 +514,87 @@ def prepare_context(row: pd.Series, mask_data: bool = False) -> dict[str, Any]:
     else:
         endereco_completo = endereco_raw
 
-    data_em_raw = get(['Data de Emissão', 'Data Emissao'])
+    data_em_raw = get("data_emissao")
     if not data_em_raw:
         data_em_raw = datetime.now().strftime("%d/%m/%Y")
 
+    # O total é resolvido uma única vez e reaproveitado para exibição e cálculo
+    if "total_pagar" in precomputed:
+        total_pagar = precomputed["total_pagar"]
+        raw_total = precomputed["_raw_total"]
+    else:
+        total_raw = get("total_pagar", '0')
+        total_pagar = format_currency(total_raw)
+        raw_total = parse_currency(total_raw)
+
+    if "economia_mes" in precomputed:
+        economia_mes = precomputed["economia_mes"]
+    else:
+        economia_mes = format_currency(get("economia_mes", '0'))
+
     ctx = {
-        "nome_consorcio": get(['Nome Consórcio', 'Nome Consorcio', 'Consórcio', 'Consorcio']),
-        "endereco_consorcio": get(['Endereço Consórcio', 'Endereco Consorcio']),
-        "cnpj_consorcio": get(['CNPJ Consórcio', 'CNPJ Consorcio']),
-        "razao_social": get(['Nome', 'Razão Social', 'Razao Social', 'Cliente']),
+        "nome_consorcio": get("nome_consorcio"),
+        "endereco_consorcio": endereco_consorcio,
+        "cnpj_consorcio": get("cnpj_consorcio"),
+        "razao_social": precomputed["razao_social"] if masked else get("razao_social"),
         "endereco_consorciado": endereco_completo,
-        "cnpj_consorciado": get(['CNPJ/CPF', 'CNPJ', 'CPF']),
-        "numero_conta": get(['Número da conta', 'Numero da conta', 'Conta vinculada']),
-        "numero_cobranca": get(['Nº da cobrança', 'N da cobranca']),
-        "numero_instalacao": get(['Instalação', 'Instalacao', 'Numero Instalacao', 'Num. Instalação']),
+        "cnpj_consorciado": precomputed["cnpj_consorciado"] if masked else get("cnpj_consorciado"),
+        "numero_conta": get("numero_conta"),
+        "numero_cobranca": get("numero_cobranca"),
+        "numero_instalacao": get("numero_instalacao"),
         "data_emissao": data_em_raw,
-        "data_vencimento": get(['Vencimento', 'Data Vencimento']),
-        "mes_referencia": get(['Mês de Referência', 'Mes Referencia', 'Referencia']),
-        "total_pagar": format_currency(get(['Total a pagar', 'Total calculado R$', 'Valor consolidado', 'Valor emitido', 'Total'], '0')),
-        "economia_mes": format_currency(get(['Economia R$', 'Economia mês', 'ECONOMIA'], '0')),
-        
-        # Tenta buscar por nome de coluna primeiro; aceita também Número da conta como alias
-        "dados_bancarios": get(['Dados bancários', 'Dados bancarios', 'Pagamento', 'Número da conta', 'Numero da conta'], '')
+        "data_vencimento": get("data_vencimento"),
+        "mes_referencia": get("mes_referencia"),
+        "total_pagar": total_pagar,
+        "economia_mes": economia_mes,
+        "dados_bancarios": get("dados_bancarios", '')
     }
 
     # Aplica mascaramento se solicitado (Melhores Práticas LGPD)
-    if mask_data:
+    if mask_data and not masked:
         # Armazena doc original para validação
         raw_doc = ctx["cnpj_consorciado"]
-        
+
         # Passa o documento para decidir se mascara o nome (PJ vs PF)
         ctx["razao_social"] = mask_name(ctx["razao_social"], doc=raw_doc)
-        
+
         # O documento em si continua sendo mascarado parcialmente para segurança visual
         ctx["cnpj_consorciado"] = mask_cpf_cnpj(raw_doc)
-    
+
     # FALLBACK INTELIGENTE: Se não achou por nome, tenta pelo índice 29 (Coluna AD)
     if not ctx["dados_bancarios"] or ctx["dados_bancarios"] == "Não Informado":
-        if len(row) > 29:
-            # Pega o valor da 30ª coluna (índice 29)
-            valor_ad = row.iloc[29]
+        if plan.n_columns > DADOS_BANCARIOS_FALLBACK_POS:
+            valor_ad = values[DADOS_BANCARIOS_FALLBACK_POS]
             if pd.notna(valor_ad):
                 ctx["dados_bancarios"] = sanitize_text(str(valor_ad))
-    
+
     # FALLBACK INSTALAÇÃO: Coluna A (Índice 0) se não achou por nome
     if not ctx["numero_instalacao"]:
-        if len(row) > 0:
-            val_0 = row.iloc[0]
+        if plan.n_columns > INSTALACAO_FALLBACK_POS:
+            val_0 = values[INSTALACAO_FALLBACK_POS]
             if pd.notna(val_0):
                 ctx["numero_instalacao"] = sanitize_text(str(val_0))
-                
+
     # Se ainda assim estiver vazio, coloca o padrão
     if not ctx["dados_bancarios"]:
         ctx["dados_bancarios"] = "Não Informado"
-    
-    ctx["_raw_total"] = parse_currency(get(['Total a pagar', 'Total calculado R$', 'Valor consolidado', 'Valor emitido', 'Total'], '0'))
-    
+
+    ctx["_raw_total"] = raw_total
+
     return ctx
+
+def prepare_context(row: pd.Series, mask_data: bool = False) -> dict[str, Any]:
+    """
+    Prepara o dicionário de contexto para o Jinja2 e Preview.
+    Para DataFrames inteiros prefira prepare_contexts, que compila o plano uma única vez.
+    """
+    plan = compile_context_plan(row.index)
+    return build_context(row.tolist(), plan, mask_data=mask_data)
+
+def prepare_contexts(df: pd.DataFrame, mask_data: bool = False) -> list[dict[str, Any]]:
+    """Prepara os contextos de todas as linhas do DataFrame com acesso colunar (itertuples)."""
+    plan = compile_context_plan(df.columns)
+    return [
+        build_context(values, plan, mask_data=mask_data, precomputed=pre)
+        for _, values, pre in iter_context_rows(df, plan, mask_data)
+    ]
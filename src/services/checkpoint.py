@@ -0,0 +1,220 @@
+"""
+Gerações retomáveis: o lote é gravado numa pasta de job à medida que roda, para que uma queda
+(timeout da sessão, reinício do container) não perca o que já foi gerado.
+
+Pasta do job:
+    job.json                      parâmetros da geração (template, LGPD, motor), conferidos ao retomar
+    notas/                        PDFs gravados assim que ficam prontos
+    relatorio_processamento.csv   relatório gravado linha a linha (mesmo esquema do relatório do ZIP)
+
+Ao retomar (resume), só as linhas ausentes do relatório são renderizadas; com retry_failed, também
+as que terminaram em ERRO. Um relatorio_processamento.csv de outra execução pode guiar a nova
+tentativa (ex: refazer só as notas com erro de um ZIP já entregue). No fim, assemble_archive monta
+o arquivo final (qualquer destino de output_sinks) a partir da pasta do job e do relatório
+consolidado, em que vale a última tentativa de cada linha.
+"""
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional, Union
+import pandas as pd
+from src.core.logger import logger
+from src.services.output_sinks import MANIFEST_NAME, DirectorySink, OutputSink
+
+JOB_FILE = "job.json"
+JOB_PDF_DIR = "notas"
+STATUS_OK = "SUCESSO"
+STATUS_ERROR = "ERRO"
+# Coluna do relatório montado com o relatório de outra execução: onde está o PDF de cada linha
+ORIGIN_COLUMN = "origem_pdf"
+ORIGIN_CURRENT = "ESTE_ARQUIVO"
+ORIGIN_PREVIOUS = "ARQUIVO_ANTERIOR"
+
+class CheckpointError(ValueError):
+    """Pasta de job inválida ou incompatível com a geração pedida."""
+
+class CheckpointSink(DirectorySink):
+    """
+    DirectorySink em <job_dir>/notas que grava cada linha do relatório em
+    <job_dir>/relatorio_processamento.csv assim que ela fica pronta (record). Execuções
+    seguintes (resume/retry) acrescentam linhas ao mesmo arquivo.
+    """
+
+    def __init__(self, job_dir: Union[str, Path]):
+        self.job_dir = Path(job_dir)
+        super().__init__(self.job_dir / JOB_PDF_DIR)
+        self.manifest_path = self.job_dir / MANIFEST_NAME
+        self._file = None
+        self._writer: Optional[csv.DictWriter] = None
+
+    def _open_writer(self, first_row: dict[str, Any]) -> None:
+        header = None
+        if self.manifest_path.exists():
+            # Mantém o cabeçalho da primeira execução; colunas novas (ex: --timings) ficam de fora
+            with open(self.manifest_path, encoding="utf-8-sig", newline="") as f:
+                header = next(csv.reader(f, delimiter=";"), None)
+        if header:
+            if not self._ends_with_newline():
+                self._rewrite_complete_rows()
+            self._file = open(self.manifest_path, "a", encoding="utf-8", newline="")
+            self._writer = csv.DictWriter(self._file, header, delimiter=";", restval="", extrasaction="ignore")
+        else:
+            self._file = open(self.manifest_path, "w", encoding="utf-8-sig", newline="")
+            self._writer = csv.DictWriter(self._file, list(first_row), delimiter=";", restval="")
+            self._writer.writeheader()
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.manifest_path, "rb") as f:
+            f.seek(0, 2)
+            if f.tell() == 0:
+                return True
+            f.seek(-1, 2)
+            return f.read(1) == b"\n"
+
+    def _rewrite_complete_rows(self) -> None:
+        """
+        Queda no meio de uma linha: regrava o relatório só com as linhas que read_manifest aceita,
+        para que o próximo registro não seja colado na linha truncada (e descartado com ela).
+        """
+        partial = self.manifest_path.with_name(self.manifest_path.name + ".part")
+        read_manifest(self.manifest_path).to_csv(partial, index=False, sep=";", encoding="utf-8-sig")
+        os.replace(partial, self.manifest_path)
+
+    def record(self, linha: dict[str, Any]) -> None:
+        if self._writer is None:
+            self._open_writer(linha)
+        self._writer.writerow(linha)
+        # Uma linha por nota no disco: após uma queda, o relatório termina na última nota concluída
+        self._file.flush()
+
+    def write_manifest(self, data: Union[str, bytes]) -> None:
+        # O relatório já foi gravado linha a linha (e inclui as execuções anteriores)
+        pass
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def result(self) -> Path:
+        return self.job_dir
+
+def read_manifest(path: Union[str, Path]) -> pd.DataFrame:
+    """
+    Lê um relatorio_processamento.csv (do ZIP ou de uma pasta de job) como texto, com
+    linha_planilha inteira. Linhas truncadas por uma queda são descartadas: com menos campos que
+    o cabeçalho, status diferente de SUCESSO/ERRO ou sem o arquivo (SUCESSO) ou a mensagem
+    (ERRO). Com várias tentativas da mesma linha, vale a última.
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))
+    header = rows[0] if rows else []
+    if "linha_planilha" not in header or "status" not in header:
+        raise CheckpointError(f"Arquivo não é um relatório de processamento: {path}")
+    df = pd.DataFrame([row for row in rows[1:] if len(row) == len(header)], columns=header, dtype=str)
+    df["linha_planilha"] = pd.to_numeric(df["linha_planilha"], errors="coerce")
+    complete = df["linha_planilha"].notna() & df["status"].isin((STATUS_OK, STATUS_ERROR))
+    if "nome_arquivo_pdf" in df.columns:
+        complete &= (df["status"] != STATUS_OK) | (df["nome_arquivo_pdf"] != "")
+    if "mensagem_erro" in df.columns:
+        complete &= (df["status"] != STATUS_ERROR) | (df["mensagem_erro"] != "")
+    dropped = len(rows) - 1 - int(complete.sum())
+    if dropped:
+        logger.warning(f"{path}: {dropped} linha(s) incompleta(s) descartada(s) do relatório.")
+    df = df[complete].copy()
+    df["linha_planilha"] = df["linha_planilha"].astype(int)
+    return df.drop_duplicates("linha_planilha", keep="last").sort_values("linha_planilha").reset_index(drop=True)
+
+def _job_params(job_dir: Path) -> Optional[dict[str, Any]]:
+    path = job_dir / JOB_FILE
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+def open_job(job_dir: Union[str, Path], params: dict[str, Any], resume: bool = False) -> CheckpointSink:
+    """
+    Prepara a pasta do job e devolve o CheckpointSink. Uma pasta com geração anterior só é aceita
+    com `resume` e com os mesmos parâmetros (ex: template e LGPD), para não misturar notas
+    geradas de formas diferentes no mesmo arquivo final.
+    """
+    job_dir = Path(job_dir)
+    previous = _job_params(job_dir)
+    if previous is not None or (job_dir / MANIFEST_NAME).exists():
+        if not resume:
+            raise CheckpointError(f"A pasta de job já tem uma geração: {job_dir} (use a retomada).")
+        if previous is not None and previous != params:
+            diff = ", ".join(f"{k}={previous.get(k)!r}" for k in params if previous.get(k) != params[k])
+            raise CheckpointError(f"A geração anterior em {job_dir} usou outros parâmetros ({diff}).")
+    elif job_dir.exists() and any(job_dir.iterdir()):
+        raise CheckpointError(f"A pasta de job não está vazia: {job_dir}")
+    job_dir.mkdir(parents=True, exist_ok=True)
+    (job_dir / JOB_FILE).write_text(json.dumps(params, ensure_ascii=False, indent=2), encoding="utf-8")
+    return CheckpointSink(job_dir)
+
+def rows_to_skip(
+    job_dir: Union[str, Path], retry_failed: bool = False, manifest: Union[str, Path, None] = None
+) -> set[int]:
+    """
+    Linhas da planilha (linha_planilha) que não precisam ser renderizadas de novo: as que já
+    constam do relatório do job com o PDF gravado e, sem `retry_failed`, também as que
+    falharam. `manifest` (outro relatorio_processamento.csv) acrescenta as linhas que deram
+    certo naquela execução.
+    """
+    job_dir = Path(job_dir)
+    skip: set[int] = set()
+    if manifest is not None:
+        previous = read_manifest(manifest)
+        skip.update(previous.loc[previous["status"] == STATUS_OK, "linha_planilha"])
+
+    job_manifest = job_dir / MANIFEST_NAME
+    if job_manifest.exists() and job_manifest.stat().st_size:
+        for linha in read_manifest(job_manifest).to_dict("records"):
+            if linha["status"] == STATUS_OK:
+                # Sem o PDF no disco (ex: nome truncado pela queda), a linha é refeita
+                if (job_dir / JOB_PDF_DIR / linha["nome_arquivo_pdf"]).is_file():
+                    skip.add(linha["linha_planilha"])
+                else:
+                    skip.discard(linha["linha_planilha"])
+            elif not retry_failed:
+                skip.add(linha["linha_planilha"])
+            else:
+                skip.discard(linha["linha_planilha"])
+    return skip
+
+def assemble_archive(
+    job_dir: Union[str, Path], sink: OutputSink, manifest: Union[str, Path, None] = None
+) -> tuple[Union[Path, Any], list[dict]]:
+    """
+    Monta o arquivo final no `sink` com os PDFs do job e o relatório consolidado. Com `manifest`
+    (relatório de outra execução), as linhas dele entram no relatório e são substituídas pelas
+    tentativas feitas no job. Os PDFs das notas que já estavam certas não são copiados: o
+    relatório ganha a coluna origem_pdf, com ARQUIVO_ANTERIOR nessas linhas (o nome_arquivo_pdf
+    se refere ao arquivo da outra execução) e ESTE_ARQUIVO nas linhas tentadas no job.
+    Retorna (sink.result(), relatorio).
+    """
+    job_dir = Path(job_dir)
+    frames = [read_manifest(manifest).assign(_job=False)] if manifest is not None else []
+    job_manifest = job_dir / MANIFEST_NAME
+    if job_manifest.exists() and job_manifest.stat().st_size:
+        frames.append(read_manifest(job_manifest).assign(_job=True))
+    if not frames:
+        raise CheckpointError(f"Nenhum relatório encontrado em {job_dir}")
+    consolidated = pd.concat(frames, ignore_index=True).fillna("")
+    consolidated = consolidated.drop_duplicates("linha_planilha", keep="last").sort_values("linha_planilha")
+
+    relatorio = []
+    with sink:
+        for linha in consolidated.to_dict("records"):
+            from_job = bool(linha.pop("_job"))
+            if manifest is not None:
+                linha[ORIGIN_COLUMN] = ORIGIN_CURRENT if from_job else ORIGIN_PREVIOUS
+            if from_job and linha["status"] == STATUS_OK:
+                path = job_dir / JOB_PDF_DIR / linha["nome_arquivo_pdf"]
+                if path.is_file():
+                    linha["nome_arquivo_pdf"] = sink.add(path.name, path.read_bytes())
+                else:
+                    linha.update(status=STATUS_ERROR, mensagem_erro="PDF ausente na pasta do job", nome_arquivo_pdf="")
+            relatorio.append(linha)
+        sink.write_manifest(pd.DataFrame(relatorio).to_csv(index=False, sep=";", encoding="utf-8-sig"))
+    logger.info(f"Arquivo final montado a partir de {job_dir}: {len(relatorio)} linha(s) no relatório.")
+    return sink.result(), relatorio
@@ -0,0 +1,200 @@
+"""
+Leitura das planilhas de entrada (.csv e .xlsx) com projeção de colunas.
+
+CSV: o delimitador é detectado no cabeçalho e a leitura usa o parser C do pandas, com as
+colunas como texto (preserva zeros à esquerda de CPF, conta e instalação). XLSX: as linhas são
+lidas em streaming pelo openpyxl (read_only), sem montar a planilha inteira em memória.
+Só as colunas usadas na geração são carregadas: aliases de settings.REQUIRED_FIELDS e de
+CONTEXT_FIELDS, mais as colunas posicionais de fallback (A e AD). As demais colunas até a AD
+viram colunas vazias, para que as posições usadas por build_context não mudem.
+"""
+import csv
+import os
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from config.settings import settings
+from src.core.utils import (
+    CONTEXT_FIELDS,
+    DADOS_BANCARIOS_FALLBACK_POS,
+    INSTALACAO_FALLBACK_POS,
+    compile_context_plan,
+    normalize_col_name,
+)
+from src.core.logger import logger
+
+FALLBACK_POSITIONS = (INSTALACAO_FALLBACK_POS, DADOS_BANCARIOS_FALLBACK_POS)
+# Delimitadores aceitos na detecção (exports da Hube usam ";")
+CSV_DELIMITERS = ";,\t|"
+SNIFF_SAMPLE_BYTES = 64 * 1024
+# Campos que se repetem em todas as linhas (dados do consórcio): carregados como category
+CATEGORICAL_FIELDS = ("nome_consorcio", "cnpj_consorcio", "endereco_consorcio", "cidade", "uf", "mes_referencia")
+
+SpreadsheetSource = Union[str, os.PathLike, BinaryIO]
+
+def select_columns(columns: Sequence) -> list[int]:
+    """Posições das colunas usadas na geração: aliases conhecidos e fallbacks posicionais."""
+    aliases = {normalize_col_name(a) for _, options in settings.REQUIRED_FIELDS for a in options}
+    aliases.update(normalize_col_name(a) for options in CONTEXT_FIELDS.values() for a in options)
+    return [
+        pos for pos, col in enumerate(columns)
+        if pos in FALLBACK_POSITIONS or normalize_col_name(col) in aliases
+    ]
+
+def _read_sample(source: SpreadsheetSource) -> bytes:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read(SNIFF_SAMPLE_BYTES)
+    start = source.tell()
+    sample = source.read(SNIFF_SAMPLE_BYTES)
+    source.seek(start)
+    return sample
+
+def sniff_delimiter(sample: bytes) -> str:
+    """Detecta o delimitador pela linha de cabeçalho (como o sep=None do pandas); padrão ","."""
+    text = sample.decode("utf-8-sig", errors="replace")
+    header = text.splitlines()[0] if text else ""
+    try:
+        return csv.Sniffer().sniff(header, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+def _rewind(source: SpreadsheetSource, position: Optional[int]) -> None:
+    if position is not None:
+        source.seek(position)
+
+def _csv_frames(
+    source: SpreadsheetSource, project: bool, chunksize: Optional[int]
+) -> Iterator[tuple[pd.DataFrame, list]]:
+    sep = sniff_delimiter(_read_sample(source))
+    position = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    columns = list(pd.read_csv(source, sep=sep, nrows=0).columns)
+    _rewind(source, position)
+    usecols = select_columns(columns) if project else None
+    if chunksize is None:
+        yield pd.read_csv(source, sep=sep, usecols=usecols, dtype=str, engine="c"), columns
+        return
+    with pd.read_csv(source, sep=sep, usecols=usecols, dtype=str, engine="c", chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk, columns
+
+def _header_names(header: Sequence) -> list:
+    """Nomes do cabeçalho como o pd.read_excel: células vazias viram "Unnamed: N" e repetidos ganham ".1"."""
+    names, seen = [], {}
+    for pos, name in enumerate(header):
+        if name is None:
+            name = f"Unnamed: {pos}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _xlsx_frames(
+    source: SpreadsheetSource, project: bool, chunksize: Optional[int]
+) -> Iterator[tuple[pd.DataFrame, list]]:
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            yield pd.DataFrame(), []
+            return
+        columns = _header_names(header)
+        positions = select_columns(columns) if project else list(range(len(columns)))
+        names = [columns[p] for p in positions]
+        data, offset = [], 0
+        for row in rows:
+            # Linhas totalmente vazias são ignoradas, como no pd.read_excel
+            if any(v is not None for v in row):
+                data.append([row[p] if p < len(row) else None for p in positions])
+                if chunksize and len(data) == chunksize:
+                    yield pd.DataFrame(data, columns=names, index=pd.RangeIndex(offset, offset + len(data))), columns
+                    offset += len(data)
+                    data = []
+        if data or not offset:
+            yield pd.DataFrame(data, columns=names, index=pd.RangeIndex(offset, offset + len(data))), columns
+    finally:
+        wb.close()
+
+def _restore_positions(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """Reinsere como colunas vazias as posições não lidas até a última coluna posicional de fallback."""
+    kept = set(df.columns)
+    last = min(max(FALLBACK_POSITIONS), len(columns) - 1)
+    for pos in range(last + 1):
+        if columns[pos] not in kept:
+            empty = pd.Categorical.from_codes(np.full(len(df), -1, dtype=np.int8), categories=[])
+            df.insert(pos, columns[pos], empty)
+    return df
+
+def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+    plan = compile_context_plan(df.columns)
+    for field in CATEGORICAL_FIELDS:
+        for pos in plan.fields[field]:
+            col = df.columns[pos]
+            if df[col].dtype == object:
+                df[col] = df[col].astype("category")
+    return df
+
+def _iter_frames(
+    source: SpreadsheetSource, name: str, project: bool, chunksize: Optional[int]
+) -> Iterator[tuple[pd.DataFrame, int, int]]:
+    """
+    Blocos já tratados, como (DataFrame, colunas lidas, colunas da planilha). Os leitores
+    sempre produzem ao menos um bloco (o pandas devolve um bloco vazio para CSV só com cabeçalho).
+    """
+    reader = _csv_frames if Path(name).suffix.lower() == ".csv" else _xlsx_frames
+    for df, columns in reader(source, project, chunksize):
+        read_columns = df.shape[1]
+        if project and columns:
+            df = _categorize(_restore_positions(df, columns))
+        yield df, read_columns, len(columns)
+
+def read_spreadsheet(
+    source: SpreadsheetSource, filename: Optional[str] = None, project: bool = True
+) -> pd.DataFrame:
+    """
+    Lê a planilha (.csv ou .xlsx, pela extensão de `filename` ou do próprio `source`).
+    `source` pode ser um caminho ou um arquivo binário (ex: upload do Streamlit).
+    Com `project`, carrega só as colunas usadas na geração (ver select_columns).
+    """
+    name = filename or getattr(source, "name", None) or str(source)
+    start = time.perf_counter()
+    df, read_columns, total_columns = next(_iter_frames(source, name, project, None))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    memory_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+    logger.info(
+        f"Planilha {Path(name).name}: {len(df)} linhas, {read_columns}/{total_columns} colunas "
+        f"lidas em {elapsed_ms:.0f} ms ({memory_mb:.1f} MB)"
+    )
+    return df
+
+def iter_spreadsheet_chunks(
+    source: SpreadsheetSource,
+    filename: Optional[str] = None,
+    chunksize: Optional[int] = None,
+    project: bool = True
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê a planilha em blocos de `chunksize` linhas (padrão settings.INGEST_CHUNK_ROWS), com o
+    mesmo tratamento de read_spreadsheet e memória limitada ao tamanho do bloco.
+    O índice continua entre os blocos (linha da planilha = índice + 2), e ao menos um bloco
+    (vazio se não houver linhas) é produzido, para validar as colunas antes de processar.
+    """
+    name = filename or getattr(source, "name", None) or str(source)
+    chunksize = chunksize or settings.INGEST_CHUNK_ROWS
+    start = time.perf_counter()
+    rows = chunks = 0
+    for df, read_columns, total_columns in _iter_frames(source, name, project, chunksize):
+        rows += len(df)
+        chunks += 1
+        yield df
+    logger.info(
+        f"Planilha {Path(name).name}: {rows} linhas em {chunks} bloco(s) de até {chunksize}, "
+        f"{read_columns}/{total_columns} colunas, {time.perf_counter() - start:.2f} s"
+    )
@@ -0,0 +1,300 @@
+"""
+Fila de gerações em segundo plano, compartilhada por todas as sessões do app.
+
+O Streamlit executa o script na thread da sessão: um lote longo travava a sessão e se perdia
+num rerun ou desconexão, e usuários simultâneos disputavam os mesmos núcleos. Aqui cada geração
+vira um job executado por um pool limitado de threads (settings.JOB_WORKERS; cada job ainda
+pode usar PDF_WORKERS processos). A fila é justa por usuário: o próximo job é do usuário com
+menos jobs em execução e, no empate, do atendido há mais tempo. Jobs acima dos limites de fila
+(JOB_MAX_QUEUED) ou por usuário (JOB_MAX_PER_USER) são recusados com SchedulerFullError.
+Resultados ficam disponíveis por JOB_RESULT_TTL_SECONDS após o término, sobrevivendo a reruns,
+até serem entregues a uma sessão (take_result), que passa a ser a única dona do ZIP.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+from config.settings import settings
+from src.core.logger import logger
+
+JOB_PENDING = "NA_FILA"
+JOB_RUNNING = "EM_EXECUCAO"
+JOB_DONE = "CONCLUIDO"
+JOB_FAILED = "ERRO"
+JOB_CANCELLED = "CANCELADO"
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Função do job: recebe o callback de progresso (atual, total) e devolve o resultado
+JobTarget = Callable[[Callable[[int, Optional[int]], None]], Any]
+
+class SchedulerFullError(Exception):
+    """Servidor saturado ou limite do usuário atingido: o job não foi aceito."""
+
+class JobCancelledError(Exception):
+    """Levantada pelo callback de progresso quando o job foi cancelado."""
+
+@dataclass
+class Job:
+    id: str
+    user: str
+    label: str
+    target: JobTarget = field(repr=False)
+    on_discard: Optional[Callable[[Any], None]] = field(default=None, repr=False)
+    status: str = JOB_PENDING
+    current: int = 0
+    total: Optional[int] = None
+    result: Any = field(default=None, repr=False)
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # O resultado já foi entregue a uma sessão (take_result) e não fica mais no agendador
+    result_taken: bool = False
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def progress(self) -> Optional[float]:
+        """Fração concluída (0 a 1), ou None se o total não for conhecido."""
+        return min(1.0, self.current / self.total) if self.total else None
+
+class JobScheduler:
+    def __init__(self, workers: int, max_queued: int, max_per_user: int, result_ttl: float):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self.result_ttl = result_ttl
+        self._cond = threading.Condition()
+        self._queues: dict[str, deque[Job]] = {}
+        self._jobs: dict[str, Job] = {}
+        self._running: dict[str, int] = {}
+        self._last_served: dict[str, int] = {}
+        self._served = 0
+        self._threads: list[threading.Thread] = []
+        self._closed = False
+
+    def submit(
+        self, user: str, target: JobTarget, label: str = "",
+        on_discard: Optional[Callable[[Any], None]] = None
+    ) -> Job:
+        """
+        Enfileira `target` em nome de `user`. `on_discard` recebe o resultado quando o job é
+        descartado (ex: fechar o arquivo do ZIP). Levanta SchedulerFullError se não houver vaga.
+        """
+        with self._cond:
+            if self._closed:
+                raise SchedulerFullError("O agendador de gerações foi encerrado.")
+            self._purge_finished()
+            queued = sum(len(q) for q in self._queues.values())
+            if queued >= self.max_queued:
+                raise SchedulerFullError(
+                    f"Servidor ocupado: {queued} geração(ões) na fila. Tente novamente em instantes."
+                )
+            active = len(self._queues.get(user, ())) + self._running.get(user, 0)
+            if active >= self.max_per_user:
+                raise SchedulerFullError(
+                    f"Limite de {self.max_per_user} geração(ões) simultânea(s) por usuário atingido."
+                )
+            job = Job(id=uuid.uuid4().hex, user=user, label=label, target=target, on_discard=on_discard)
+            self._queues.setdefault(user, deque()).append(job)
+            self._jobs[job.id] = job
+            self._start_workers()
+            self._cond.notify()
+        logger.info(f"Job {job.id[:8]} enfileirado para {user}: {label}")
+        return job
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._worker_loop, name=f"job-worker-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self) -> Optional[Job]:
+        """Fair share: usuário com menos jobs em execução; no empate, o atendido há mais tempo."""
+        candidates = [user for user, queue in self._queues.items() if queue]
+        if not candidates:
+            return None
+        user = min(candidates, key=lambda u: (self._running.get(u, 0), self._last_served.get(u, -1)))
+        job = self._queues[user].popleft()
+        if not self._queues[user]:
+            del self._queues[user]
+        self._served += 1
+        self._last_served[user] = self._served
+        return job
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None and not self._closed:
+                    self._cond.wait()
+                    job = self._next_job()
+                if job is None:
+                    return
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                self._running[job.user] = self._running.get(job.user, 0) + 1
+
+            status, result, error = JOB_DONE, None, None
+            try:
+                result = job.target(lambda current, total: self._report_progress(job, current, total))
+            except JobCancelledError:
+                status = JOB_CANCELLED
+            except Exception as e:
+                logger.exception(f"Job {job.id[:8]} falhou: {e}")
+                status, error = JOB_FAILED, str(e)
+
+            with self._cond:
+                self._running[job.user] -= 1
+                if not self._running[job.user]:
+                    del self._running[job.user]
+                job.result, job.error, job.status = result, error, status
+                job.finished_at = time.time()
+                self._cond.notify_all()
+            logger.info(
+                f"Job {job.id[:8]} de {job.user}: {status} em {job.finished_at - job.started_at:.1f} s"
+            )
+
+    @staticmethod
+    def _report_progress(job: Job, current: int, total: Optional[int]) -> None:
+        if job.cancel_event.is_set():
+            raise JobCancelledError()
+        job.current, job.total = current, total
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancela um job na fila (na hora) ou em execução (na próxima nota). False se já terminou."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            if job.status == JOB_PENDING:
+                queue = self._queues[job.user]
+                queue.remove(job)
+                if not queue:
+                    del self._queues[job.user]
+                job.status = JOB_CANCELLED
+                job.finished_at = time.time()
+                self._cond.notify_all()
+            else:
+                job.cancel_event.set()
+        logger.info(f"Cancelamento solicitado para o job {job_id[:8]}")
+        return True
+
+    def take_result(self, job_id: str) -> Any:
+        """
+        Entrega o resultado de um job concluído uma única vez e o remove do agendador (o job
+        continua listado até ser descartado ou expirar). Quem recebe passa a ser responsável por
+        liberá-lo; on_discard não é mais chamado. None se o job não terminou ou já foi entregue.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished or job.result is None:
+                return None
+            result, job.result = job.result, None
+            job.result_taken = True
+        return result
+
+    def discard(self, job_id: str) -> None:
+        """Remove um job terminado e libera seu resultado."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return
+            del self._jobs[job_id]
+        self._release(job)
+
+    @staticmethod
+    def _release(job: Job) -> None:
+        if job.on_discard is not None and job.result is not None:
+            try:
+                job.on_discard(job.result)
+            except Exception as e:
+                logger.warning(f"Erro ao liberar o resultado do job {job.id[:8]}: {e}")
+        job.result = None
+
+    def _purge_finished(self) -> None:
+        now = time.time()
+        expired = [
+            job for job in self._jobs.values()
+            if job.finished and now - job.finished_at > self.result_ttl
+        ]
+        for job in expired:
+            del self._jobs[job.id]
+            self._release(job)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Posição aproximada (1 = próximo) de um job na fila, ou None se não estiver na fila."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != JOB_PENDING:
+                return None
+            ahead = sum(1 for other in self._jobs.values()
+                        if other.status == JOB_PENDING and other.submitted_at < job.submitted_at)
+            return ahead + 1
+
+    def jobs_for_user(self, user: str) -> list[Job]:
+        """Jobs do usuário (na fila, em execução e terminados ainda não descartados), mais antigos primeiro."""
+        with self._cond:
+            self._purge_finished()
+            return sorted((j for j in self._jobs.values() if j.user == user), key=lambda j: j.submitted_at)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """Aguarda o término do job (ou o timeout) e o retorna."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id].finished, timeout=timeout
+            )
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "na_fila": sum(len(q) for q in self._queues.values()),
+                "em_execucao": sum(self._running.values()),
+                "terminados": sum(1 for j in self._jobs.values() if j.finished),
+                "workers": self.workers,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancela os jobs pendentes e em execução e encerra as threads."""
+        with self._cond:
+            self._closed = True
+            for job in list(self._jobs.values()):
+                if job.status == JOB_RUNNING:
+                    job.cancel_event.set()
+            pending = [job for queue in self._queues.values() for job in queue]
+            self._queues.clear()
+            for job in pending:
+                job.status = JOB_CANCELLED
+                job.finished_at = time.time()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+_scheduler_lock = threading.Lock()
+_scheduler: Optional[JobScheduler] = None
+
+def get_scheduler() -> JobScheduler:
+    """Agendador do processo (criado na primeira chamada com os limites de settings)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler(
+                workers=settings.JOB_WORKERS,
+                max_queued=settings.JOB_MAX_QUEUED,
+                max_per_user=settings.JOB_MAX_PER_USER,
+                result_ttl=settings.JOB_RESULT_TTL_SECONDS,
+            )
+        return _scheduler
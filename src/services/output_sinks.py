@@ -0,0 +1,255 @@
+"""
+Destinos de saída do lote: para onde vão os PDFs gerados e o relatorio_processamento.csv.
+
+- ZipSink: um ZIP (compressão "deflated" ou "stored", padrão settings.ZIP_COMPRESSION);
+- SplitZipSink: vários ZIPs (notas_001.zip, notas_002.zip, ...) limitados por tamanho e/ou
+  nº de notas, mais fáceis de baixar em conexões lentas;
+- DirectorySink: árvore de pastas, opcionalmente separada por consórcio ou UF;
+- TarSink: um .tar sem compressão.
+
+Todos recebem as notas por add() e gravam o mesmo relatório (write_manifest). O nome devolvido
+por add() é o que vai para a coluna nome_arquivo_pdf do relatório (para ZIPs divididos e pastas,
+inclui o volume ou a subpasta).
+"""
+import tarfile
+import tempfile
+from abc import ABC, abstractmethod
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Union
+from config.settings import settings
+from src.core.utils import clean_filename_text
+
+MANIFEST_NAME = "relatorio_processamento.csv"
+SINKS = ("zip", "zip-split", "dir", "tar")
+ZIP_COMPRESSIONS = {"deflated": zipfile.ZIP_DEFLATED, "stored": zipfile.ZIP_STORED}
+# Campo dos metadados da nota (ver utils.note_metadata) usado em cada partição do DirectorySink e pasta das notas sem o campo
+PARTITIONS = {"consorcio": ("nome_consorcio", "SEM_CONSORCIO"), "uf": ("uf", "SEM_UF")}
+
+def create_zip_output(mode: Optional[str] = None, max_memory: Optional[int] = None) -> BinaryIO:
+    """
+    Cria o arquivo de destino do ZIP conforme settings.ZIP_OUTPUT_MODE:
+    - "memory": BytesIO (comportamento original);
+    - "disk": SpooledTemporaryFile, que passa para o disco ao exceder `max_memory` bytes
+      (padrão settings.ZIP_SPOOL_MAX_MEMORY; 0 grava direto no disco) e é apagado
+      automaticamente ao ser fechado.
+    """
+    mode = mode or settings.ZIP_OUTPUT_MODE
+    if mode == "memory":
+        return BytesIO()
+    if mode == "disk":
+        if max_memory is None:
+            max_memory = settings.ZIP_SPOOL_MAX_MEMORY
+        if max_memory <= 0:
+            # SpooledTemporaryFile trata max_size=0 como "sem limite" (nunca vai para o disco)
+            return tempfile.TemporaryFile(mode="w+b", prefix="notas_", suffix=".zip")
+        return tempfile.SpooledTemporaryFile(
+            max_size=max_memory, mode="w+b", prefix="notas_", suffix=".zip"
+        )
+    raise ValueError(f"Modo de saída do ZIP inválido: '{mode}' (use 'memory' ou 'disk').")
+
+def _zip_compression(compression: Optional[str]) -> int:
+    compression = compression or settings.ZIP_COMPRESSION
+    if compression not in ZIP_COMPRESSIONS:
+        raise ValueError(f"Compressão de ZIP inválida: '{compression}' (use {', '.join(ZIP_COMPRESSIONS)}).")
+    return ZIP_COMPRESSIONS[compression]
+
+def _as_bytes(data: Union[str, bytes]) -> bytes:
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+class OutputSink(ABC):
+    """
+    Destino das notas. Uso: `with sink: sink.add(...); sink.write_manifest(csv)` e, depois do
+    bloco, sink.result(). Ao sair do bloco (com ou sem erro) os arquivos são fechados.
+    """
+
+    @abstractmethod
+    def add(self, name: str, data: bytes, meta: Optional[dict[str, Any]] = None) -> str:
+        """
+        Grava a nota `name` e devolve o caminho dela no destino (coluna nome_arquivo_pdf).
+        `meta` traz os dados da linha usados nas partições (ver utils.note_metadata).
+        """
+
+    @abstractmethod
+    def write_manifest(self, data: Union[str, bytes]) -> None:
+        """Grava o relatorio_processamento.csv."""
+
+    def record(self, linha: dict[str, Any]) -> None:
+        """Recebe cada linha do relatório assim que ela fica pronta (ver checkpoint.CheckpointSink)."""
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def result(self) -> Union[BinaryIO, Path]:
+        """O arquivo ou a pasta de saída, depois de fechado o destino."""
+
+    def __enter__(self) -> "OutputSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class ZipSink(OutputSink):
+    """Um único ZIP em `output` (arquivo binário gravável; padrão create_zip_output())."""
+
+    def __init__(self, output: Optional[BinaryIO] = None, compression: Optional[str] = None):
+        self.output = output if output is not None else create_zip_output()
+        self._zf = zipfile.ZipFile(self.output, "w", _zip_compression(compression), False)
+
+    def add(self, name: str, data: bytes, meta: Optional[dict[str, Any]] = None) -> str:
+        self._zf.writestr(name, data)
+        return name
+
+    def write_manifest(self, data: Union[str, bytes]) -> None:
+        self._zf.writestr(MANIFEST_NAME, _as_bytes(data))
+
+    def close(self) -> None:
+        self._zf.close()
+
+    def result(self) -> BinaryIO:
+        """O arquivo do ZIP, na posição 0."""
+        self.output.seek(0)
+        return self.output
+
+class SplitZipSink(OutputSink):
+    """
+    ZIPs numerados em `directory`, cada um com até `max_bytes` de PDFs e/ou `max_notes` notas
+    (uma nota maior que o limite fica sozinha num volume). O relatório fica em `directory`.
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], max_bytes: Optional[int] = None, max_notes: Optional[int] = None,
+        compression: Optional[str] = None, prefix: str = "notas"
+    ):
+        if not max_bytes and not max_notes:
+            raise ValueError("Informe o tamanho máximo (bytes) e/ou o nº máximo de notas por volume.")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_notes = max_notes
+        self.prefix = prefix
+        self.volumes: list[Path] = []
+        self._compression = _zip_compression(compression)
+        self._zf: Optional[zipfile.ZipFile] = None
+        self._bytes = self._notes = 0
+
+    def _next_volume(self) -> None:
+        if self._zf is not None:
+            self._zf.close()
+        path = self.directory / f"{self.prefix}_{len(self.volumes) + 1:03d}.zip"
+        self.volumes.append(path)
+        self._zf = zipfile.ZipFile(path, "w", self._compression, False)
+        self._bytes = self._notes = 0
+
+    def add(self, name: str, data: bytes, meta: Optional[dict[str, Any]] = None) -> str:
+        full = self._zf is None or (
+            self._notes and (
+                (self.max_notes and self._notes >= self.max_notes)
+                or (self.max_bytes and self._bytes + len(data) > self.max_bytes)
+            )
+        )
+        if full:
+            self._next_volume()
+        self._zf.writestr(name, data)
+        self._bytes += len(data)
+        self._notes += 1
+        return f"{self.volumes[-1].name}/{name}"
+
+    def write_manifest(self, data: Union[str, bytes]) -> None:
+        (self.directory / MANIFEST_NAME).write_bytes(_as_bytes(data))
+
+    def close(self) -> None:
+        if self._zf is not None:
+            self._zf.close()
+            self._zf = None
+
+    def result(self) -> Path:
+        return self.directory
+
+class DirectorySink(OutputSink):
+    """
+    PDFs gravados em `root`, em subpastas por consórcio ou UF com `partition` ("consorcio" ou
+    "uf"); arquivos sem metadados (ex: PDFs com várias notas) ficam na raiz. Nomes repetidos
+    ganham um sufixo (_2, _3, ...) em vez de sobrescrever.
+    """
+
+    def __init__(self, root: Union[str, Path], partition: Optional[str] = None):
+        if partition is not None and partition not in PARTITIONS:
+            raise ValueError(f"Partição inválida: '{partition}' (use {', '.join(PARTITIONS)}).")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.partition = partition
+
+    def _folder(self, meta: Optional[dict[str, Any]]) -> str:
+        if self.partition is None or meta is None:
+            return ""
+        field, missing = PARTITIONS[self.partition]
+        return clean_filename_text(meta.get(field)) or missing
+
+    def add(self, name: str, data: bytes, meta: Optional[dict[str, Any]] = None) -> str:
+        folder = self.root / self._folder(meta)
+        folder.mkdir(exist_ok=True)
+        path = folder / name
+        suffix = 1
+        while path.exists():
+            suffix += 1
+            path = folder / f"{Path(name).stem}_{suffix}{Path(name).suffix}"
+        path.write_bytes(data)
+        return path.relative_to(self.root).as_posix()
+
+    def write_manifest(self, data: Union[str, bytes]) -> None:
+        (self.root / MANIFEST_NAME).write_bytes(_as_bytes(data))
+
+    def result(self) -> Path:
+        return self.root
+
+class TarSink(OutputSink):
+    """Um .tar sem compressão em `output` (arquivo binário gravável; padrão create_zip_output())."""
+
+    def __init__(self, output: Optional[BinaryIO] = None):
+        self.output = output if output is not None else create_zip_output()
+        self._tar = tarfile.open(fileobj=self.output, mode="w", format=tarfile.PAX_FORMAT)
+
+    def _write(self, name: str, data: bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, BytesIO(data))
+
+    def add(self, name: str, data: bytes, meta: Optional[dict[str, Any]] = None) -> str:
+        self._write(name, data)
+        return name
+
+    def write_manifest(self, data: Union[str, bytes]) -> None:
+        self._write(MANIFEST_NAME, _as_bytes(data))
+
+    def close(self) -> None:
+        self._tar.close()
+
+    def result(self) -> BinaryIO:
+        """O arquivo do .tar, na posição 0."""
+        self.output.seek(0)
+        return self.output
+
+def create_sink(
+    kind: str, target: Union[str, Path, BinaryIO, None] = None, compression: Optional[str] = None,
+    max_bytes: Optional[int] = None, max_notes: Optional[int] = None, partition: Optional[str] = None
+) -> OutputSink:
+    """
+    Monta o destino `kind` (ver SINKS). `target` é o arquivo de saída para "zip" e "tar" e a
+    pasta para "zip-split" e "dir".
+    """
+    if kind == "zip":
+        return ZipSink(target, compression)
+    if kind == "tar":
+        return TarSink(target)
+    if target is None or not isinstance(target, (str, Path)):
+        raise ValueError(f"O destino '{kind}' precisa de uma pasta de saída.")
+    if kind == "zip-split":
+        return SplitZipSink(target, max_bytes=max_bytes, max_notes=max_notes, compression=compression)
+    if kind == "dir":
+        return DirectorySink(target, partition)
+    raise ValueError(f"Destino de saída inválido: '{kind}' (use {', '.join(SINKS)}).")
@@ -0,0 +1,146 @@
+"""
+Cache de PDFs em disco endereçado por conteúdo.
+
+A chave de cada nota é o hash de (motor + versão, fonte do template, contexto renderizado,
+mask_data): reenvios da mesma planilha só renderizam as linhas que mudaram. O tamanho
+total é limitado por settings.PDF_CACHE_MAX_MB, descartando primeiro as notas usadas há
+mais tempo (LRU). Os arquivos contêm dados pessoais (nomes e, sem o mascaramento LGPD, CPF/CNPJ)
+e ficam no disco sem criptografia: o cache só é usado com PDF_CACHE_ENABLED=true (desativado por
+padrão) e é limpo com PdfCache.clear() ou apagando settings.PDF_CACHE_DIR.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+from config.settings import settings
+from src.core.logger import logger
+
+class PdfCache:
+    """Diretório de PDFs (<dir>/<2 primeiros caracteres>/<chave>.pdf) com índice LRU em memória."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index: Optional[OrderedDict[str, int]] = None
+        self._total_bytes = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pdf"
+
+    def _load_index(self) -> OrderedDict:
+        """Monta o índice a partir do disco, do acesso mais antigo (mtime) para o mais recente."""
+        if self._index is None:
+            entries = []
+            if self.cache_dir.exists():
+                for sub in os.scandir(self.cache_dir):
+                    if not sub.is_dir():
+                        continue
+                    for entry in os.scandir(sub.path):
+                        if entry.name.endswith(".pdf"):
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime_ns, entry.name[:-4], stat.st_size))
+            entries.sort()
+            self._index = OrderedDict((key, size) for _, key, size in entries)
+            self._total_bytes = sum(self._index.values())
+        return self._index
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                # O mtime marca o último acesso: preserva a ordem LRU entre reinícios do app
+                os.utime(path)
+            except OSError:
+                self._total_bytes -= index.pop(key)
+                self.misses += 1
+                return None
+            index.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            index = self._load_index()
+            if key in index or len(data) > self.max_bytes:
+                return
+            path = self._path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+                # Grava em arquivo temporário e renomeia: leitores nunca veem um PDF pela metade
+                fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Não foi possível gravar no cache de PDFs: {e}")
+                return
+            index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Apaga todos os PDFs do cache."""
+        with self._lock:
+            for key in list(self._load_index()):
+                try:
+                    self._path(key).unlink()
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            index = self._load_index()
+            return {
+                "acertos": self.hits,
+                "falhas": self.misses,
+                "descartes": self.evictions,
+                "arquivos": len(index),
+                "tamanho_mb": round(self._total_bytes / 1024 / 1024, 2),
+            }
+
+_cache_lock = threading.Lock()
+_cache: Optional[PdfCache] = None
+
+def get_pdf_cache() -> Optional[PdfCache]:
+    """
+    Retorna o cache compartilhado pelo processo, ou None se settings.PDF_CACHE_ENABLED for falso.
+    Recria a instância se o diretório ou o limite mudarem nas configurações.
+    """
+    global _cache
+    if not settings.PDF_CACHE_ENABLED:
+        return None
+    max_bytes = settings.PDF_CACHE_MAX_MB * 1024 * 1024
+    with _cache_lock:
+        if _cache is None or _cache.cache_dir != Path(settings.PDF_CACHE_DIR) or _cache.max_bytes != max_bytes:
+            _cache = PdfCache(settings.PDF_CACHE_DIR, max_bytes)
+        return _cache
+
+def make_cache_key(namespace: str, ctx: dict[str, Any], mask_data: bool) -> str:
+    """Chave da nota: hash do namespace (motor + template), de mask_data e do contexto renderizado."""
+    payload = json.dumps(ctx, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{namespace}\0{int(mask_data)}\0{payload}".encode("utf-8")).hexdigest()
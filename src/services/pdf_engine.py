@@ -1,14 +1,316 @@
+import hashlib
+import html as html_lib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import reportlab
+import xhtml2pdf
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+from reportlab.pdfbase.ttfonts import TTFont
 from xhtml2pdf import pisa
+from xhtml2pdf import context as pisa_context
+from pypdf import PdfReader
 from io import BytesIO
-from typing import List
+from typing import Any, List, Optional, Union
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template, TemplateNotFound
+from jinja2.ext import Extension
 from config.settings import settings
+from src.services import pdf_native
+from src.services.pdf_native import NATIVE_LAYOUTS, draw_merged, template_fingerprint
 from src.core.logger import logger
 
+# ==========================================
+# PRÉ-PROCESSAMENTO DE TEMPLATES
+# ==========================================
+_HTML_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.S)
+_STYLE_BLOCK = re.compile(r'(<style[^>]*>)(.*?)(</style>)', re.S | re.I)
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_WHITESPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,])\s*')
+_CSS_QUOTED_BRACE = re.compile(r'["\'][^"\']*[{}]')
+_INTER_TAG_WHITESPACE = re.compile(r'>\s+<')
+
+def _optimize_style_block(match: re.Match) -> str:
+    open_tag, css, close_tag = match.groups()
+    # Blocos com expressões Jinja ou chaves dentro de strings ficam intactos
+    if '{{' in css or '{%' in css or '{#' in css or _CSS_QUOTED_BRACE.search(css):
+        return match.group(0)
+
+    css = _CSS_COMMENT.sub('', css)
+    css = _CSS_PUNCTUATION.sub(r'\1', _CSS_WHITESPACE.sub(' ', css)).strip()
+    return f"{open_tag}{css}{close_tag}"
+
+def optimize_template_html(source: str) -> str:
+    """
+    Minifica o HTML do template: remove comentários HTML/CSS, compacta o CSS dos blocos
+    <style> e os espaços entre tags.
+    """
+    source = _HTML_COMMENT.sub('', source)
+    source = _STYLE_BLOCK.sub(_optimize_style_block, source)
+    if '<pre' not in source.lower() and '<textarea' not in source.lower():
+        source = _INTER_TAG_WHITESPACE.sub('> <', source)
+    return source
+
+class PdfTemplateOptimizer(Extension):
+    """Aplica optimize_template_html uma única vez, antes da compilação (o resultado vai para o bytecode)."""
+
+    def preprocess(self, source: str, name: Optional[str], filename: Optional[str] = None) -> str:
+        return optimize_template_html(source)
+
+# ==========================================
+# RECURSOS DOS TEMPLATES (logos, imagens e fontes)
+# ==========================================
+# Sem link_callback, o xhtml2pdf resolve caminhos relativos pelo diretório de trabalho e busca
+# URLs na rede a cada nota. resolve_asset resolve tudo a partir de settings.TEMPLATES_DIR,
+# recusa recursos remotos e mantém os bytes das imagens em memória; as fontes TrueType são
+# interpretadas uma vez por processo (ver _cached_ttfont). Os dois caches descartam primeiro o
+# item usado há mais tempo (LRU).
+_IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff"}
+_REMOTE_SCHEMES = {"http", "https", "ftp"}
+_ASSET_CACHE_MAX = 64
+_FONT_CACHE_MAX = 32
+_asset_lock = threading.Lock()
+_asset_cache: OrderedDict[Path, tuple[int, bytes]] = OrderedDict()
+_font_cache: OrderedDict[tuple[str, str, int], TTFont] = OrderedDict()
+_asset_stats = {"acertos": 0, "leituras": 0, "fontes_carregadas": 0, "bloqueados": 0}
+
+class AssetError(ValueError):
+    """Recurso do template remoto, fora de TEMPLATES_DIR ou inexistente."""
+
+def _read_image(path: Path) -> bytes:
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        raise AssetError(f"Recurso do template não encontrado: {path.name}")
+    with _asset_lock:
+        cached = _asset_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            _asset_cache.move_to_end(path)
+            _asset_stats["acertos"] += 1
+            return cached[1]
+    data = path.read_bytes()
+    with _asset_lock:
+        _asset_cache[path] = (mtime, data)
+        _asset_cache.move_to_end(path)
+        while len(_asset_cache) > _ASSET_CACHE_MAX:
+            _asset_cache.popitem(last=False)
+        _asset_stats["leituras"] += 1
+    return data
+
+def resolve_asset(uri: str, rel: Optional[str] = None) -> Union[str, bytes, None]:
+    """
+    link_callback do xhtml2pdf para <img src>, url() e @font-face dos templates.
+    Caminhos (relativos ou file://) são resolvidos a partir de settings.TEMPLATES_DIR e não podem
+    sair dele; imagens voltam como bytes do cache em memória e os demais recursos (fontes, CSS)
+    como caminho absoluto. data: URIs passam direto. URLs remotas levantam AssetError, que
+    vira erro da nota.
+    """
+    if not uri or uri.startswith("data:"):
+        return None
+    parsed = urlparse(uri)
+    if parsed.scheme in _REMOTE_SCHEMES or uri.startswith("//"):
+        with _asset_lock:
+            _asset_stats["bloqueados"] += 1
+        raise AssetError(f"Recurso remoto bloqueado no template (use um arquivo em templates/): {uri}")
+
+    relative = unquote(parsed.path) if parsed.scheme == "file" else uri
+    base = settings.TEMPLATES_DIR.resolve()
+    path = (base / relative).resolve()
+    if not path.is_relative_to(base):
+        raise AssetError(f"Recurso fora da pasta de templates: {uri}")
+    if path.suffix.lower() in _IMAGE_SUFFIXES:
+        return _read_image(path)
+    if not path.exists():
+        raise AssetError(f"Recurso do template não encontrado: {uri}")
+    return str(path)
+
+def _document_path() -> str:
+    # Caminho "do documento" para o xhtml2pdf: recursos relativos e a política de leitura de
+    # arquivos das versões recentes tomam como base o diretório dele, TEMPLATES_DIR
+    return str(settings.TEMPLATES_DIR.resolve() / "documento.html")
+
+def _cached_ttfont(name: str, filename: str, *args, **kwargs) -> TTFont:
+    """
+    TTFont usado pelo xhtml2pdf no @font-face durante generate_pdf (ver _font_cache_scope): a
+    fonte de cada arquivo é interpretada uma vez por processo (o registro do ReportLab é global),
+    em vez de a cada PDF.
+    """
+    if args or kwargs or not isinstance(filename, str):
+        return _XHTML2PDF_TTFONT(name, filename, *args, **kwargs)
+    try:
+        key = (name, filename, os.stat(filename).st_mtime_ns)
+    except OSError:
+        return _XHTML2PDF_TTFONT(name, filename)
+    with _asset_lock:
+        font = _font_cache.get(key)
+        if font is not None:
+            _font_cache.move_to_end(key)
+    if font is None:
+        font = _XHTML2PDF_TTFONT(name, filename)
+        with _asset_lock:
+            _font_cache[key] = font
+            while len(_font_cache) > _FONT_CACHE_MAX:
+                _font_cache.popitem(last=False)
+            _asset_stats["fontes_carregadas"] += 1
+    return font
+
+_XHTML2PDF_TTFONT = pisa_context.TTFont
+_font_scope_lock = threading.Lock()
+_font_scope_depth = 0
+
+@contextmanager
+def _font_cache_scope():
+    """
+    Usa _cached_ttfont no xhtml2pdf só enquanto houver conversões de generate_pdf em andamento
+    (contadas, para as threads da fila de gerações); ao sair a última, o TTFont original volta.
+    Fora dessas chamadas, o xhtml2pdf do processo funciona sem alteração.
+    """
+    global _font_scope_depth
+    with _font_scope_lock:
+        if _font_scope_depth == 0:
+            pisa_context.TTFont = _cached_ttfont
+        _font_scope_depth += 1
+    try:
+        yield
+    finally:
+        with _font_scope_lock:
+            _font_scope_depth -= 1
+            if _font_scope_depth == 0:
+                pisa_context.TTFont = _XHTML2PDF_TTFONT
+
+def clear_asset_cache() -> None:
+    """Descarta as imagens e fontes em memória e zera as estatísticas."""
+    with _asset_lock:
+        _asset_cache.clear()
+        _font_cache.clear()
+        for key in _asset_stats:
+            _asset_stats[key] = 0
+
+def get_asset_stats() -> dict:
+    """Acertos e leituras de imagens, fontes interpretadas e recursos remotos bloqueados."""
+    with _asset_lock:
+        return {**_asset_stats, "imagens": len(_asset_cache), "fontes": len(_font_cache)}
+
+# ==========================================
+# REGISTRO DE TEMPLATES (Jinja Environment compartilhado)
+# ==========================================
+_registry_lock = threading.Lock()
+_template_env: Optional[Environment] = None
+_last_loaded: dict[str, Template] = {}
+_templates_listing: Optional[tuple[int, list[str]]] = None
+_template_stats = {
+    "acertos_memoria": 0,
+    "acertos_bytecode": 0,
+    "compilacoes": 0,
+    "tempo_memoria_ms": 0.0,
+    "tempo_bytecode_ms": 0.0,
+    "tempo_compilacao_ms": 0.0,
+}
+
+class _CountingBytecodeCache(FileSystemBytecodeCache):
+    """Bytecode cache em disco que contabiliza os templates carregados sem recompilar."""
+
+    # O checksum do Jinja considera o fonte original; a versão do pré-processamento entra na chave
+    OPTIMIZER_VERSION = "1"
+
+    def get_cache_key(self, name, filename=None):
+        return super().get_cache_key(f"{name}|opt{self.OPTIMIZER_VERSION}", filename)
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is not None:
+            _template_stats["acertos_bytecode"] += 1
+
+def get_template_environment() -> Environment:
+    """
+    Environment Jinja compartilhado pelo processo: FileSystemLoader sobre settings.TEMPLATES_DIR,
+    recarga automática quando o mtime do arquivo muda e bytecode cache em disco
+    (settings.TEMPLATE_CACHE_DIR), reaproveitado entre reruns, sessões e processos worker.
+    Os templates passam por PdfTemplateOptimizer antes de compilar.
+    """
+    global _template_env
+    with _registry_lock:
+        if _template_env is None:
+            cache_dir = settings.TEMPLATE_CACHE_DIR
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            _template_env = Environment(
+                loader=FileSystemLoader(str(settings.TEMPLATES_DIR), encoding=settings.DEFAULT_ENCODING),
+                auto_reload=True,
+                bytecode_cache=_CountingBytecodeCache(str(cache_dir)),
+                extensions=[PdfTemplateOptimizer],
+            )
+        return _template_env
+
+def clear_template_cache() -> None:
+    """Descarta o Environment, a listagem e as estatísticas (o bytecode em disco é mantido)."""
+    global _template_env, _templates_listing
+    with _registry_lock:
+        _template_env = None
+        _templates_listing = None
+        _last_loaded.clear()
+        for key in _template_stats:
+            _template_stats[key] = 0 if isinstance(_template_stats[key], int) else 0.0
+
+def get_template_stats() -> dict:
+    """Contadores e tempos acumulados (ms) de acertos em memória, em bytecode e de compilações."""
+    return dict(_template_stats)
+
+def _missing_template_html(template_name: str) -> str:
+    return f"""
+        <html>
+            <body>
+                <h2 style="color: red;">Erro: Template não encontrado</h2>
+                <p>O arquivo de template <b>templates/{template_name}</b> não foi localizado.</p>
+                <p>Verifique se o arquivo existe na pasta 'templates' e se o nome está correto.</p>
+            </body>
+        </html>
+        """
+
+def get_compiled_template(template_name: str) -> Template:
+    """
+    Retorna o template compilado a partir do registro. Recompila apenas se o arquivo mudou;
+    registra em get_template_stats() se foi acerto em memória, em bytecode ou compilação.
+    """
+    env = get_template_environment()
+    bytecode_hits = _template_stats["acertos_bytecode"]
+    start = time.perf_counter()
+    try:
+        template = env.get_template(template_name)
+    except TemplateNotFound:
+        logger.error(f"Template não encontrado: {settings.TEMPLATES_DIR / template_name}")
+        return env.from_string(_missing_template_html(template_name))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if _last_loaded.get(template_name) is template:
+        _template_stats["acertos_memoria"] += 1
+        _template_stats["tempo_memoria_ms"] += elapsed_ms
+    elif _template_stats["acertos_bytecode"] > bytecode_hits:
+        _template_stats["tempo_bytecode_ms"] += elapsed_ms
+        logger.info(f"Template {template_name} carregado do bytecode cache em {elapsed_ms:.1f} ms")
+    else:
+        _template_stats["compilacoes"] += 1
+        _template_stats["tempo_compilacao_ms"] += elapsed_ms
+        logger.info(f"Template {template_name} compilado em {elapsed_ms:.1f} ms")
+
+    _last_loaded[template_name] = template
+    return template
+
+def is_registry_template(template: Template) -> bool:
+    """Indica se o template veio do registro (e pode ser recarregado pelo nome em outro processo)."""
+    return template.environment is _template_env and template.name is not None
+
 def list_templates():
     """
     Lista arquivos .html dentro da pasta templates/.
-    Retorna lista ordenada alfabeticamente.
+    Retorna lista ordenada alfabeticamente. A listagem é reaproveitada enquanto
+    o mtime da pasta não mudar (arquivos adicionados, removidos ou renomeados).
     """
+    global _templates_listing
     templates_dir = settings.TEMPLATES_DIR
 
     if not templates_dir.exists():
@@ -20,13 +322,18 @@ def list_templates():
             logger.error(f"Erro ao criar diretório de templates: {e}")
         return []
 
-    templates = [
+    mtime = templates_dir.stat().st_mtime_ns
+    if _templates_listing and _templates_listing[0] == mtime:
+        return list(_templates_listing[1])
+
+    templates = sorted(
         f.name for f in templates_dir.glob("*.html")
         if not f.name.startswith(".")
-    ]
-    
+    )
+    _templates_listing = (mtime, templates)
+
     logger.debug(f"Templates encontrados: {templates}")
-    return sorted(templates)
+    return list(templates)
 
 def get_html_template(template_name: str):
     # Melhoria na resolução do caminho para garantir compatibilidade com diferentes OS
@@ -37,15 +344,7 @@ def get_html_template(template_name: str):
         return template_path.read_text(encoding=settings.DEFAULT_ENCODING)
     except FileNotFoundError:
         logger.error(f"Template não encontrado: {template_path}")
-        return f"""
-        <html>
-            <body>
-                <h2 style="color: red;">Erro: Template não encontrado</h2>
-                <p>O arquivo de template <b>templates/{template_name}</b> não foi localizado.</p>
-                <p>Verifique se o arquivo existe na pasta 'templates' e se o nome está correto.</p>
-            </body>
-        </html>
-        """
+        return _missing_template_html(template_name)
     except Exception as e:
         logger.exception(f"Erro ao ler template {template_name}: {e}")
         return str(e)
@@ -58,7 +357,11 @@ def generate_pdf(html):
     buffer = BytesIO()
     # xhtml2pdf é sensível a encodings; o Jinja já entrega a string processada
     try:
-        pisa_status = pisa.CreatePDF(html, dest=buffer, encoding=settings.DEFAULT_ENCODING)
+        with _font_cache_scope():
+            pisa_status = pisa.CreatePDF(
+                html, dest=buffer, encoding=settings.DEFAULT_ENCODING,
+                link_callback=resolve_asset, path=_document_path()
+            )
         
         if pisa_status.err: 
             logger.error(f"Erro na geração do PDF: {pisa_status.err}")
@@ -68,3 +371,132 @@ def generate_pdf(html):
     except Exception as e:
         logger.exception(f"Exceção durante geração do PDF: {e}")
         return None, str(e)
+
+# ==========================================
+# PDF ÚNICO (várias notas por arquivo)
+# ==========================================
+_BODY = re.compile(r'<body[^>]*>(.*)</body>', re.S | re.I)
+# Título invisível no topo de cada nota: o xhtml2pdf cria um item do índice (outline) por heading
+_HTML_BOOKMARK = (
+    '<h6 style="-pdf-outline: true; -pdf-outline-level: 0; font-size: 1px; line-height: 0; '
+    'margin: 0; padding: 0; color: #ffffff;">{}</h6>'
+)
+
+def merge_note_html(notes: list[tuple[str, str]]) -> str:
+    """
+    Junta os HTMLs de várias notas (pares título do marcador, HTML) num documento só: o <head>
+    (CSS e @page) da primeira nota e o <body> de cada uma, separados por <pdf:nextpage />.
+    """
+    first = notes[0][1]
+    match = _BODY.search(first)
+    head = first[:match.start()] if match else ""
+    parts = []
+    for k, (title, html) in enumerate(notes):
+        body = _BODY.search(html)
+        parts.append(
+            ("<pdf:nextpage />" if k else "")
+            + _HTML_BOOKMARK.format(html_lib.escape(title))
+            + (body.group(1) if body else html)
+        )
+    return f"{head}<body>{''.join(parts)}</body></html>"
+
+def _outline_pages(pdf: bytes) -> Optional[list[int]]:
+    """Página (1 = primeira) de cada item do índice do PDF, na ordem do documento."""
+    try:
+        reader = PdfReader(BytesIO(pdf))
+        return [reader.get_destination_page_number(item) + 1 for item in reader.outline if not isinstance(item, list)]
+    except Exception as e:
+        logger.warning(f"Não foi possível ler o índice do PDF único: {e}")
+        return None
+
+def generate_merged_pdf(notes: list[tuple[str, str]]) -> tuple[Optional[bytes], Optional[str], Optional[list[int]]]:
+    """
+    Converte várias notas (pares título, HTML) num único PDF com o xhtml2pdf, numa só passagem.
+    Retorna (pdf, erro, página inicial de cada nota); as páginas vêm do índice do PDF gerado.
+    """
+    pdf, err = generate_pdf(merge_note_html(notes))
+    if not pdf:
+        return None, err, None
+    pages = _outline_pages(pdf)
+    if pages is not None and len(pages) != len(notes):
+        logger.warning(f"Índice do PDF único com {len(pages)} itens para {len(notes)} notas; páginas omitidas.")
+        pages = None
+    return pdf, None, pages
+
+def generate_merged_pdf_native(
+    template_name: str, notes: list[tuple[str, dict[str, Any]]]
+) -> tuple[Optional[bytes], Optional[str], Optional[list[int]]]:
+    """generate_merged_pdf com o layout nativo do template (pares título, contexto)."""
+    try:
+        pdf, pages = draw_merged(template_name, notes)
+        return pdf, None, pages
+    except Exception as e:
+        logger.exception(f"Exceção durante geração do PDF único nativo: {e}")
+        return None, str(e), None
+
+# ==========================================
+# MOTOR NATIVO (ReportLab)
+# ==========================================
+PDF_ENGINES = ("auto", "reportlab", "xhtml2pdf")
+# Impressão digital de cada template em disco (caminho → mtime, hash), evita reler o arquivo a cada lote
+_fingerprints: dict[str, tuple[int, str]] = {}
+
+def has_native_layout(template_name: Optional[str]) -> bool:
+    """Indica se o template tem layout nativo e se o arquivo em disco ainda é o que ele reproduz."""
+    if template_name not in NATIVE_LAYOUTS:
+        return False
+    template_path = settings.TEMPLATES_DIR / template_name
+    try:
+        mtime = template_path.stat().st_mtime_ns
+    except OSError:
+        return False
+    cached = _fingerprints.get(str(template_path))
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, template_fingerprint(template_path.read_text(encoding=settings.DEFAULT_ENCODING)))
+        _fingerprints[str(template_path)] = cached
+    return cached[1] == NATIVE_LAYOUTS[template_name][0]
+
+def resolve_pdf_engine(template_name: Optional[str], engine: Optional[str] = None) -> str:
+    """
+    Define o motor de um template: "reportlab" (layout nativo) ou "xhtml2pdf".
+    `engine` (ou, se omitido, settings.PDF_ENGINE_TEMPLATES[template] / settings.PDF_ENGINE):
+    - "auto" ou "reportlab": usa o layout nativo quando existe, senão cai para o xhtml2pdf;
+    - "xhtml2pdf": sempre renderiza o HTML.
+    Templates personalizados ou editados (impressão digital diferente) usam o xhtml2pdf.
+    """
+    if engine is None:
+        engine = settings.PDF_ENGINE_TEMPLATES.get(template_name or "", settings.PDF_ENGINE)
+    if engine not in PDF_ENGINES:
+        raise ValueError(f"Motor de PDF inválido: '{engine}' (use {', '.join(PDF_ENGINES)}).")
+    if engine == "xhtml2pdf":
+        return "xhtml2pdf"
+
+    if has_native_layout(template_name):
+        return "reportlab"
+    if engine == "reportlab":
+        logger.info(f"Template {template_name} sem layout nativo (ou alterado); usando xhtml2pdf.")
+    elif template_name in NATIVE_LAYOUTS:
+        logger.warning(f"Template {template_name} foi alterado em disco; layout nativo ignorado, usando xhtml2pdf.")
+    return "xhtml2pdf"
+
+def generate_pdf_native(template_name: str, ctx: dict[str, Any]) -> tuple[Optional[bytes], Optional[str]]:
+    """
+    Gera o PDF com o layout nativo do template (mesmo retorno de generate_pdf).
+    O template precisa ter sido resolvido antes com resolve_pdf_engine.
+    """
+    try:
+        _, draw = NATIVE_LAYOUTS[template_name]
+        return draw(ctx), None
+    except Exception as e:
+        logger.exception(f"Exceção durante geração do PDF nativo: {e}")
+        return None, str(e)
+
+@lru_cache(maxsize=None)
+def engine_fingerprint(engine: str) -> str:
+    """
+    Versão de um motor ("reportlab" ou "xhtml2pdf") para chaves de cache: versões das bibliotecas
+    e código-fonte do módulo que desenha/converte (qualquer alteração invalida os PDFs antigos).
+    """
+    module_file = pdf_native.__file__ if engine == "reportlab" else __file__
+    digest = hashlib.sha1(Path(module_file).read_bytes()).hexdigest()[:16]
+    return f"{engine}-{xhtml2pdf.__version__}-{reportlab.Version}-{digest}"
@@ -0,0 +1,416 @@
+"""
+Layouts nativos em ReportLab (platypus) dos modelos embutidos.
+
+Cada layout reproduz o template HTML correspondente de templates/ desenhando direto com
+ReportLab, sem o parse de HTML/CSS do xhtml2pdf. Recebem o dicionário de prepare_context.
+Ao alterar um destes templates HTML, o layout nativo precisa ser atualizado junto
+(ver NATIVE_LAYOUTS e pdf_engine.resolve_pdf_engine).
+"""
+import hashlib
+from io import BytesIO
+from typing import Any, Callable, Optional
+from xml.sax.saxutils import escape
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# 1px do CSS ≈ 0.75pt, como no xhtml2pdf
+PX = 0.75
+
+def _style(name: str, size: float, leading: float = 1.2, bold: bool = False, **kwargs) -> ParagraphStyle:
+    return ParagraphStyle(
+        name,
+        fontName=kwargs.pop("fontName", "Helvetica-Bold" if bold else "Helvetica"),
+        fontSize=size,
+        leading=size * leading,
+        **kwargs
+    )
+
+def _text(value: Any) -> str:
+    """Escapa o valor para o markup do Paragraph, preservando quebras de linha."""
+    return escape(str(value if value is not None else "")).replace("\n", "<br/>")
+
+def _build(story: list, left: float, right: float, top: float, bottom: float) -> bytes:
+    buffer = BytesIO()
+    # invariant: sem data de criação/ID aleatório — o mesmo contexto gera os mesmos bytes
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=left, rightMargin=right, topMargin=top, bottomMargin=bottom,
+        invariant=True
+    )
+    doc.build(story)
+    return buffer.getvalue()
+
+class _Bookmark(Flowable):
+    """Marcador sem tamanho: cria o item do índice (outline) e guarda a página em que foi desenhado."""
+
+    def __init__(self, key: str, title: str):
+        super().__init__()
+        self.key = key
+        self.title = title
+        self.page: Optional[int] = None
+
+    def wrap(self, available_width: float, available_height: float) -> tuple[float, float]:
+        return 0, 0
+
+    def draw(self) -> None:
+        self.canv.bookmarkPage(self.key)
+        self.canv.addOutlineEntry(self.title, self.key, level=0)
+        self.page = self.canv.getPageNumber()
+
+# ==========================================
+# Modelo_Padrao_Hube.html
+# ==========================================
+_P_BASE = _style("padrao", 9)
+_P_CONSORCIO = _style("padrao_consorcio", 11, bold=True)
+_P_TITLE = _style("padrao_titulo", 14, bold=True, alignment=TA_RIGHT, spaceAfter=10 * PX)
+_P_LABEL = _style("padrao_label", 7, bold=True, textColor=colors.HexColor("#444444"))
+_P_LABEL_RIGHT = _style("padrao_label_dir", 7, bold=True, textColor=colors.HexColor("#444444"), alignment=TA_RIGHT)
+_P_VALUE = _style("padrao_valor", 9, bold=True, spaceAfter=5 * PX)
+_P_VALUE_RIGHT = _style("padrao_valor_dir", 9, bold=True, spaceAfter=5 * PX, alignment=TA_RIGHT)
+_P_RAZAO = _style("padrao_razao", 10, bold=True, spaceAfter=4 * PX)
+_P_VENCIMENTO = _style("padrao_vencimento", 11, bold=True, textColor=colors.HexColor("#cc0000"), spaceAfter=5 * PX)
+_P_INSTALACAO_LABEL = _style("padrao_instalacao_label", 8, bold=True)
+_P_INSTALACAO = _style("padrao_instalacao", 12, bold=True, spaceAfter=5 * PX)
+_P_ITEMS_HEADER = _style("padrao_itens", 8, bold=True)
+_P_ITEM = _style("padrao_item", 9, bold=True)
+_P_ITEM_NOTE = _style("padrao_item_obs", 8, textColor=colors.HexColor("#666666"))
+_P_TOTAL = _style("padrao_total", 10, bold=True, alignment=TA_RIGHT)
+_P_BANK_LABEL = _style("padrao_banco_label", 8, bold=True)
+_P_BANK = _style("padrao_banco", 10, fontName="Courier-Bold")
+_P_BANK_NOTE = _style("padrao_banco_obs", 7, fontName="Helvetica-Oblique", textColor=colors.HexColor("#444444"))
+_P_NOTICE = _style("padrao_aviso", 7, textColor=colors.HexColor("#666666"), alignment=TA_CENTER)
+_P_LGPD = _style("padrao_lgpd", 6, textColor=colors.HexColor("#888888"), alignment=TA_JUSTIFY)
+
+_PADRAO_LGPD = (
+    "<b>Proteção de Dados (LGPD):</b> Os dados pessoais contidos neste documento são processados pela "
+    "HUBE ENERGY exclusivamente para fins de faturamento, cobrança e cumprimento de obrigações contratuais "
+    "e legais, em conformidade com a Lei Geral de Proteção de Dados (Lei nº 13.709/2018). Para sua "
+    "segurança, alguns dados podem aparecer parcialmente mascarados."
+)
+
+_PADRAO_CELL = TableStyle([
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ("LEFTPADDING", (0, 0), (-1, -1), 4 * PX),
+    ("RIGHTPADDING", (0, 0), (-1, -1), 4 * PX),
+    ("TOPPADDING", (0, 0), (-1, -1), 4 * PX),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 4 * PX),
+])
+
+def story_padrao(ctx: dict[str, Any]) -> list:
+    """Flowables do Modelo_Padrao_Hube (A4, margem 1cm)."""
+    width = A4[0] - 2 * cm
+    story = []
+
+    header = Table([[
+        [
+            Paragraph(_text(ctx.get("nome_consorcio", "")).upper(), _P_CONSORCIO),
+            Spacer(0, 4 * PX),
+            Paragraph(_text(ctx.get("endereco_consorcio", "")), _P_BASE),
+            Paragraph(f"CNPJ: {_text(ctx.get('cnpj_consorcio', ''))}", _P_BASE),
+        ],
+        [
+            Paragraph("AVISO DE DÉBITO", _P_TITLE),
+            Paragraph("NÚMERO DA CONTA", _P_LABEL_RIGHT),
+            Paragraph(_text(ctx.get("numero_conta", "")), _P_VALUE_RIGHT),
+            Paragraph("Nº DA COBRANÇA", _P_LABEL_RIGHT),
+            Paragraph(_text(ctx.get("numero_cobranca", "")), _P_VALUE_RIGHT),
+        ],
+    ]], colWidths=[width * 0.55, width * 0.45], style=_PADRAO_CELL)
+    story.append(header)
+    story.append(Spacer(0, 5 * PX))
+
+    natureza = Table([[[
+        Paragraph("NATUREZA DA OPERAÇÃO:", _P_LABEL),
+        Paragraph("Locação de Equipamentos", _P_BASE),
+        Paragraph("CÓDIGO:", _P_LABEL),
+        Paragraph("98569", _P_BASE),
+    ]]], colWidths=[width * 0.6 - 16 * PX], style=TableStyle([
+        ("LINEBELOW", (0, 0), (-1, -1), 1 * PX, colors.HexColor("#cccccc"), None, (2, 2)),
+        ("LEFTPADDING", (0, 0), (-1, -1), 0),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+        ("TOPPADDING", (0, 0), (-1, -1), 0),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 6 * PX),
+    ]))
+    destinatario = [
+        natureza,
+        Spacer(0, 6 * PX),
+        Paragraph("DESTINATÁRIO (CONSORCIADO)", _P_LABEL),
+        Paragraph(_text(ctx.get("razao_social", "")), _P_RAZAO),
+        Paragraph(_text(ctx.get("endereco_consorciado", "")), _P_BASE),
+        Paragraph(f"CNPJ/CPF: {_text(ctx.get('cnpj_consorciado', ''))}", _P_BASE),
+    ]
+    datas = Table([
+        [[Paragraph("DATA EMISSÃO", _P_LABEL), Paragraph(_text(ctx.get("data_emissao", "")), _P_VALUE)]],
+        [[Paragraph("VENCIMENTO", _P_LABEL), Paragraph(_text(ctx.get("data_vencimento", "")), _P_VENCIMENTO)]],
+        [[Paragraph("REFERÊNCIA", _P_LABEL), Paragraph(_text(ctx.get("mes_referencia", "")), _P_VALUE)]],
+        [[
+            Paragraph("NÚMERO DA INSTALAÇÃO", _P_INSTALACAO_LABEL),
+            Paragraph(_text(ctx.get("numero_instalacao", "")), _P_INSTALACAO),
+        ]],
+    ], colWidths=[width * 0.4], style=TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 5 * PX),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 5 * PX),
+        ("TOPPADDING", (0, 0), (-1, -1), 3 * PX),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 0),
+        ("TOPPADDING", (0, 3), (-1, 3), 8 * PX),
+        ("LINEABOVE", (0, 3), (-1, 3), 1 * PX, colors.HexColor("#dddddd")),
+    ]))
+    main_box = Table([[destinatario, datas]], colWidths=[width * 0.6, width * 0.4], style=TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("BOX", (0, 0), (-1, -1), 1 * PX, colors.black),
+        ("LINEAFTER", (0, 0), (0, 0), 1 * PX, colors.black),
+        ("LEFTPADDING", (0, 0), (0, 0), 8 * PX),
+        ("RIGHTPADDING", (0, 0), (0, 0), 8 * PX),
+        ("TOPPADDING", (0, 0), (0, 0), 8 * PX),
+        ("BOTTOMPADDING", (0, 0), (0, 0), 8 * PX),
+        ("LEFTPADDING", (1, 0), (1, 0), 0),
+        ("RIGHTPADDING", (1, 0), (1, 0), 0),
+        ("TOPPADDING", (1, 0), (1, 0), 0),
+        ("BOTTOMPADDING", (1, 0), (1, 0), 0),
+    ]))
+    story.append(main_box)
+    story.append(Spacer(0, 15 * PX))
+
+    total_pagar = _text(ctx.get("total_pagar", ""))
+    items = Table([
+        [Paragraph("DISCRIMINAÇÃO DOS SERVIÇOS", _P_ITEMS_HEADER), Paragraph("TOTAL", _P_ITEMS_HEADER)],
+        [
+            [
+                Paragraph("SERVIÇO LOC. OUTR. MÁQ. EQUIP. PLAC. FOTOVOLT.", _P_ITEM),
+                Paragraph(f"Economia Gerada: {_text(ctx.get('economia_mes', ''))}", _P_ITEM_NOTE),
+            ],
+            Paragraph(total_pagar, _P_VALUE_RIGHT),
+        ],
+        ["", ""],
+    ], colWidths=[width * 0.75, width * 0.25], rowHeights=[None, None, 20 * PX], style=TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 4 * PX),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 4 * PX),
+        ("TOPPADDING", (0, 0), (-1, 0), 4 * PX),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 4 * PX),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
+        ("LINEABOVE", (0, 0), (-1, 0), 1 * PX, colors.black),
+        ("LINEBELOW", (0, 0), (-1, 0), 1 * PX, colors.black),
+        ("TOPPADDING", (0, 1), (-1, 1), 8 * PX),
+        ("BOTTOMPADDING", (0, 1), (-1, 1), 8 * PX),
+        ("LINEBELOW", (0, 1), (-1, 1), 1 * PX, colors.HexColor("#eeeeee")),
+    ]))
+    story.append(items)
+
+    total = Table([[Paragraph("TOTAL A PAGAR", _P_TOTAL), Paragraph(total_pagar, _P_TOTAL)]],
+                  colWidths=[width * 0.75, width * 0.25], style=TableStyle([
+        ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#f2f2f2")),
+        ("LINEABOVE", (0, 0), (-1, -1), 2 * PX, colors.black),
+        ("LINEBELOW", (0, 0), (-1, -1), 1 * PX, colors.black),
+        ("LEFTPADDING", (0, 0), (-1, -1), 6 * PX),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 6 * PX),
+        ("TOPPADDING", (0, 0), (-1, -1), 6 * PX),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 6 * PX),
+    ]))
+    story.append(total)
+    story.append(Spacer(0, 40 * PX))
+
+    bank_label = Table([[Paragraph("DADOS PARA PAGAMENTO (IMPORTANTE)", _P_BANK_LABEL)]],
+                       colWidths=[width - 24 * PX], style=TableStyle([
+        ("LINEBELOW", (0, 0), (-1, -1), 1 * PX, colors.black),
+        ("LEFTPADDING", (0, 0), (-1, -1), 0),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+        ("TOPPADDING", (0, 0), (-1, -1), 0),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 2 * PX),
+    ]))
+    bank_box = Table([[[
+        bank_label,
+        Spacer(0, 8 * PX),
+        Paragraph(_text(ctx.get("dados_bancarios", "")), _P_BANK),
+        Spacer(0, 12 * PX),
+        Paragraph(
+            "* Por favor, confira os dados acima antes de realizar a transferência ou agendamento.", _P_BANK_NOTE
+        ),
+    ]]], colWidths=[width], style=TableStyle([
+        ("BOX", (0, 0), (-1, -1), 2 * PX, colors.black),
+        ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#f9f9f9")),
+        ("LEFTPADDING", (0, 0), (-1, -1), 10 * PX),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 10 * PX),
+        ("TOPPADDING", (0, 0), (-1, -1), 10 * PX),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 10 * PX),
+    ]))
+    story.append(bank_box)
+    story.append(Spacer(0, 15 * PX))
+    story.append(Paragraph(
+        "Caso o pagamento não seja efetuado até o vencimento, incidirá multa e juros conforme contrato.", _P_NOTICE
+    ))
+    story.append(Spacer(0, 20 * PX))
+    story.append(Table([[Paragraph(_PADRAO_LGPD, _P_LGPD)]], colWidths=[width], style=TableStyle([
+        ("LINEABOVE", (0, 0), (-1, -1), 0.5, colors.HexColor("#eeeeee")),
+        ("LEFTPADDING", (0, 0), (-1, -1), 0),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+        ("TOPPADDING", (0, 0), (-1, -1), 10 * PX),
+    ])))
+
+    return story
+
+_PADRAO_MARGINS = (1 * cm, 1 * cm, 1 * cm, 1 * cm)
+
+def draw_padrao(ctx: dict[str, Any]) -> bytes:
+    """Desenha o Modelo_Padrao_Hube."""
+    return _build(story_padrao(ctx), *_PADRAO_MARGINS)
+
+# ==========================================
+# Modelo_Simples_Hube.html
+# ==========================================
+_S_BASE = _style("simples", 11, 1.3, spaceAfter=5 * PX)
+_S_BOLD = _style("simples_negrito", 11, 1.3, bold=True, spaceAfter=5 * PX)
+_S_TITLE = _style("simples_titulo", 14, 1.3, bold=True, spaceAfter=5 * PX)
+_S_RIGHT = _style("simples_dir", 11, 1.3, alignment=TA_RIGHT, spaceAfter=5 * PX)
+_S_BOLD_RIGHT = _style("simples_negrito_dir", 11, 1.3, bold=True, alignment=TA_RIGHT, spaceAfter=5 * PX)
+_S_INDENT = _style("simples_recuo", 11, 1.3, bold=True, leftIndent=20 * PX, spaceAfter=5 * PX)
+_S_INDENT2 = _style("simples_recuo2", 11, 1.3, leftIndent=40 * PX, spaceAfter=5 * PX)
+_S_LINE = 11 * 1.3
+
+def story_simples(ctx: dict[str, Any]) -> list:
+    """Flowables do Modelo_Simples_Hube (A4, margens 1cm × 1.5cm, tabela de 3 colunas)."""
+    width = A4[0] - 2 * 1.5 * cm
+    br = Spacer(0, _S_LINE)
+    total_pagar = _text(ctx.get("total_pagar", ""))
+
+    discriminacao = Table(
+        [[Paragraph("Discriminação", _S_BOLD), Paragraph("Total", _S_BOLD_RIGHT)]],
+        colWidths=[(width - 20 * PX) * 0.7, (width - 20 * PX) * 0.3],
+        style=TableStyle([("LEFTPADDING", (0, 0), (-1, -1), 0), ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+                          ("TOPPADDING", (0, 0), (-1, -1), 0), ("BOTTOMPADDING", (0, 0), (-1, -1), 0)])
+    )
+    rows = [
+        [
+            [
+                Paragraph(_text(ctx.get("nome_consorcio", "")), _S_BOLD),
+                Paragraph(_text(ctx.get("endereco_consorcio", "")), _S_BASE),
+                Paragraph(_text(ctx.get("cnpj_consorcio", "")), _S_BASE),
+            ],
+            "",
+            [
+                br,
+                Paragraph("Aviso de Débito", _S_TITLE),
+                br,
+                Paragraph(_text(ctx.get("numero_conta", "")), _S_BASE),
+                br,
+            ],
+        ],
+        [Paragraph("Natureza da Operação:", _S_BASE), "", ""],
+        [
+            [
+                br,
+                Paragraph("Código: 98569", _S_INDENT),
+                br,
+                Paragraph(f"Destinatário: {_text(ctx.get('razao_social', ''))}", _S_INDENT),
+                Paragraph(_text(ctx.get("endereco_consorciado", "")), _S_INDENT2),
+                Paragraph(_text(ctx.get("cnpj_consorciado", "")), _S_INDENT2),
+                br,
+            ],
+            "",
+            [
+                Paragraph("Data <b>Emissão</b>", _S_BASE),
+                br,
+                Paragraph(_text(ctx.get("data_emissao", "")), _S_BOLD),
+                br,
+            ],
+        ],
+        [
+            "",
+            "",
+            [
+                br,
+                Paragraph("Vencimento", _S_BOLD),
+                br,
+                Paragraph(_text(ctx.get("data_vencimento", "")), _S_BOLD),
+                br,
+            ],
+        ],
+        [discriminacao, "", ""],
+        [Paragraph("SERVICO LOC OUTR MAQ EQUIP PLAC FOTOVOLT", _S_BASE), "", Paragraph(f"R$ {total_pagar}", _S_RIGHT)],
+        [
+            [
+                Paragraph("Instruções Bancárias:", _S_BOLD),
+                br,
+                Paragraph(_text(ctx.get("dados_bancarios", "")), _S_BASE),
+            ],
+            [
+                br,
+                Paragraph(f'Total a Pagar <font name="Helvetica-Bold" size="13">R$ {total_pagar}</font>', _S_BASE),
+                br,
+            ],
+            "",
+        ],
+        ["", Paragraph(f"Nº {_text(ctx.get('numero_cobranca', ''))}", _S_BASE), ""],
+    ]
+
+    table = Table(
+        rows,
+        colWidths=[width * 0.45, width * 0.10, width * 0.45],
+        rowHeights=[None, None, None, None, None, 250 * PX, None, None],
+        style=TableStyle([
+            ("GRID", (0, 0), (-1, -1), 1 * PX, colors.black),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("LEFTPADDING", (0, 0), (-1, -1), 10 * PX),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 10 * PX),
+            ("TOPPADDING", (0, 0), (-1, -1), 10 * PX),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 10 * PX),
+            ("SPAN", (0, 0), (1, 0)),
+            ("SPAN", (0, 1), (2, 1)),
+            ("SPAN", (0, 2), (1, 3)),
+            ("SPAN", (0, 4), (2, 4)),
+            ("SPAN", (0, 5), (1, 5)),
+            ("SPAN", (0, 6), (0, 7)),
+            ("SPAN", (1, 6), (2, 6)),
+            ("SPAN", (1, 7), (2, 7)),
+            # Separação pontilhada entre Emissão e Vencimento (apaga a linha da grade antes)
+            ("LINEBELOW", (2, 2), (2, 2), 1 * PX, colors.white),
+            ("LINEBELOW", (2, 2), (2, 2), 1 * PX, colors.HexColor("#cccccc"), None, (1, 2)),
+        ])
+    )
+    return [table]
+
+_SIMPLES_MARGINS = (1.5 * cm, 1.5 * cm, 1 * cm, 1 * cm)
+
+def draw_simples(ctx: dict[str, Any]) -> bytes:
+    """Desenha o Modelo_Simples_Hube."""
+    return _build(story_simples(ctx), *_SIMPLES_MARGINS)
+
+# Template HTML → (impressão digital do HTML reproduzido, layout nativo equivalente).
+# A impressão digital é o sha1 do fonte sem espaços em branco (ver template_fingerprint):
+# se o arquivo em templates/ for editado, o layout nativo deixa de ser usado.
+NATIVE_LAYOUTS: dict[str, tuple[str, Callable[[dict[str, Any]], bytes]]] = {
+    "Modelo_Padrao_Hube.html": ("7ae0d3a3e7e7d3fa", draw_padrao),
+    "Modelo_Simples_Hube.html": ("d14494206637f9fc", draw_simples),
+}
+
+# Template HTML → (flowables de uma nota, margens esquerda/direita/topo/base), para o PDF único
+NATIVE_STORIES: dict[str, tuple[Callable[[dict[str, Any]], list], tuple[float, float, float, float]]] = {
+    "Modelo_Padrao_Hube.html": (story_padrao, _PADRAO_MARGINS),
+    "Modelo_Simples_Hube.html": (story_simples, _SIMPLES_MARGINS),
+}
+
+def draw_merged(template_name: str, notes: list[tuple[str, dict[str, Any]]]) -> tuple[bytes, list[int]]:
+    """
+    Desenha várias notas num único PDF, uma construção do documento para todas, com quebra de
+    página entre as notas e um item no índice (outline) por nota. `notes` são pares
+    (título do marcador, contexto). Retorna o PDF e a página inicial (1 = primeira) de cada nota.
+    """
+    story_fn, margins = NATIVE_STORIES[template_name]
+    story, bookmarks = [], []
+    for k, (title, ctx) in enumerate(notes):
+        if k:
+            story.append(PageBreak())
+        bookmark = _Bookmark(f"nota_{k}", title)
+        bookmarks.append(bookmark)
+        story.append(bookmark)
+        story.extend(story_fn(ctx))
+    pdf = _build(story, *margins)
+    return pdf, [bookmark.page for bookmark in bookmarks]
+
+def template_fingerprint(source: str) -> str:
+    """Impressão digital do HTML, insensível a indentação e quebras de linha (CRLF/LF)."""
+    return hashlib.sha1("".join(source.split()).encode("utf-8")).hexdigest()[:16]
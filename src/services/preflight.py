@@ -0,0 +1,229 @@
+"""
+Pré-voo (dry run) de uma geração: valida o template e estima tempo e tamanho antes do lote.
+
+1. Variáveis do template: o HTML é compilado com StrictUndefined e as variáveis usadas são
+   comparadas com as chaves do contexto (build_context), pegando erros de digitação como
+   {{ razao_socail }}, que no lote sairiam em branco.
+2. Linhas com erro previsto: o contexto de cada linha (até settings.PREFLIGHT_VALIDATE_ROWS) é
+   montado e renderizado com o template estrito, sem gerar PDF.
+3. Amostra: settings.PREFLIGHT_SAMPLE_ROWS linhas espalhadas pela planilha passam pelo mesmo
+   motor de PDF do lote, com tempo e tamanho medidos; daí saem as estimativas de tempo total
+   (para o nº de processos do lote) e de tamanho dos PDFs e do ZIP.
+
+As estimativas não contam o cache de PDFs (reenvios da mesma planilha saem mais rápido).
+"""
+import statistics
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Optional
+import numpy as np
+import pandas as pd
+from jinja2 import StrictUndefined, meta
+from config.settings import settings
+from src.core.utils import build_context, compile_context_plan, iter_context_rows
+from src.services.pdf_engine import (
+    generate_pdf,
+    generate_pdf_native,
+    get_html_template,
+    get_template_environment,
+    resolve_pdf_engine,
+)
+from src.core.logger import logger
+
+# Bytes por nota no ZIP além do PDF (cabeçalho local e entrada no diretório central com o nome)
+_ZIP_ENTRY_OVERHEAD = 150
+
+@dataclass
+class PreflightReport:
+    template: str
+    engine: str
+    total_rows: int
+    workers: int
+    undefined_vars: list[str] = field(default_factory=list)
+    failed_rows: list[dict[str, Any]] = field(default_factory=list)
+    validated_rows: int = 0
+    sample_ms: list[float] = field(default_factory=list)
+    sample_bytes: list[int] = field(default_factory=list)
+    sample_zip_bytes: list[int] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """Sem variáveis desconhecidas no template nem linhas com erro previsto."""
+        return not self.undefined_vars and not self.failed_rows
+
+    @property
+    def ms_per_note(self) -> Optional[float]:
+        return statistics.median(self.sample_ms) if self.sample_ms else None
+
+    @property
+    def estimated_seconds(self) -> Optional[float]:
+        """Tempo total estimado do lote com `workers` processos."""
+        if self.ms_per_note is None:
+            return None
+        return self.ms_per_note / 1000 * self.total_rows / max(1, self.workers)
+
+    @property
+    def estimated_pdf_bytes(self) -> Optional[int]:
+        if not self.sample_bytes:
+            return None
+        return int(statistics.mean(self.sample_bytes) * self.total_rows)
+
+    @property
+    def estimated_zip_bytes(self) -> Optional[int]:
+        """Tamanho estimado do ZIP com a compressão de settings.ZIP_COMPRESSION."""
+        if not self.sample_zip_bytes:
+            return None
+        return int((statistics.mean(self.sample_zip_bytes) + _ZIP_ENTRY_OVERHEAD) * self.total_rows)
+
+    @property
+    def estimated_failures(self) -> int:
+        """Linhas com erro previsto, projetadas para a planilha inteira."""
+        if not self.validated_rows:
+            return 0
+        return round(len(self.failed_rows) * self.total_rows / self.validated_rows)
+
+    def summary_lines(self) -> list[str]:
+        """Resumo em texto (CLI e log)."""
+        lines = [f"Template {self.template} (motor {self.engine}), {self.total_rows} linha(s), {self.workers} processo(s)"]
+        if self.undefined_vars:
+            lines.append(f"Variáveis desconhecidas no template: {', '.join(self.undefined_vars)}")
+        if self.estimated_seconds is not None:
+            lines.append(
+                f"Tempo estimado: {_format_duration(self.estimated_seconds)} "
+                f"({self.ms_per_note:.1f} ms/nota em {len(self.sample_ms)} nota(s) de amostra)"
+            )
+            lines.append(
+                f"Tamanho estimado: PDFs {_format_bytes(self.estimated_pdf_bytes)}, "
+                f"ZIP {_format_bytes(self.estimated_zip_bytes)}"
+            )
+        parcial = "" if self.validated_rows >= self.total_rows else f" (verificadas {self.validated_rows})"
+        lines.append(f"Linhas com erro previsto: {self.estimated_failures}{parcial}")
+        for linha in self.failed_rows[:20]:
+            lines.append(f"  Linha {linha['linha_planilha']} ({linha['razao_social']}): {linha['mensagem_erro']}")
+        if len(self.failed_rows) > 20:
+            lines.append(f"  ... e mais {len(self.failed_rows) - 20}")
+        return lines
+
+def _format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    minutes, seconds = divmod(round(seconds), 60)
+    if minutes < 60:
+        return f"{minutes} min {seconds:02d} s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} h {minutes:02d} min"
+
+def _format_bytes(size: Optional[int]) -> str:
+    if size is None:
+        return "?"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.0f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+def find_undefined_variables(template_name: str, context_keys: set[str]) -> list[str]:
+    """Variáveis usadas no template que não existem no contexto (nem são globais do Jinja)."""
+    env = get_template_environment()
+    used = meta.find_undeclared_variables(env.parse(get_html_template(template_name)))
+    return sorted(used - context_keys - set(env.globals))
+
+def _sample_positions(n_rows: int, sample: int) -> list[int]:
+    """Posições espalhadas pela planilha (início, meio e fim), sem repetição."""
+    if n_rows <= sample:
+        return list(range(n_rows))
+    return sorted(set(np.linspace(0, n_rows - 1, sample).round().astype(int).tolist()))
+
+def run_preflight(
+    df: pd.DataFrame,
+    template_name: str,
+    mask_data: bool = True,
+    engine: Optional[str] = None,
+    workers: int = 1,
+    sample_rows: Optional[int] = None,
+    validate_rows: Optional[int] = None,
+) -> PreflightReport:
+    """
+    Executa o pré-voo da planilha `df` com o template do registro `template_name`, sem gerar o lote.
+    `workers` é o nº de processos que o lote vai usar (para a estimativa de tempo). Linhas com
+    erro são as que falham ao montar o contexto, ao renderizar com StrictUndefined ou na amostra
+    de PDFs.
+    """
+    sample_rows = settings.PREFLIGHT_SAMPLE_ROWS if sample_rows is None else sample_rows
+    validate_rows = settings.PREFLIGHT_VALIDATE_ROWS if validate_rows is None else validate_rows
+    engine = resolve_pdf_engine(template_name, engine)
+    report = PreflightReport(template=template_name, engine=engine, total_rows=len(df), workers=workers)
+    if not len(df):
+        return report
+
+    plan = compile_context_plan(df.columns)
+    native = engine == "reportlab"
+    # O layout nativo não usa o HTML: só o contexto é verificado
+    strict = None if native else get_template_environment().overlay(
+        undefined=StrictUndefined, bytecode_cache=None
+    ).get_template(template_name)
+
+    def failure(linha_planilha: int, ctx: Any, message: str) -> None:
+        report.failed_rows.append({
+            "linha_planilha": linha_planilha,
+            "razao_social": ctx.get("razao_social", "Desconhecido") if isinstance(ctx, dict) else "Desconhecido",
+            "mensagem_erro": message,
+        })
+
+    # Contextos e render estrito das linhas verificadas (sem PDF)
+    checked = df.iloc[:validate_rows] if validate_rows and validate_rows < len(df) else df
+    context_keys: set[str] = set()
+    # A linha da planilha vem da posição no df (posição + 2), não do índice
+    for pos, (_, values, pre) in enumerate(iter_context_rows(checked, plan, mask_data)):
+        try:
+            ctx = build_context(values, plan, mask_data=mask_data, precomputed=pre)
+        except Exception as e:
+            failure(pos + 2, None, f"Erro no contexto: {e}")
+            continue
+        context_keys.update(ctx)
+        if strict is not None:
+            try:
+                strict.render(ctx)
+            except Exception as e:
+                failure(pos + 2, ctx, f"Erro no template: {e}")
+    report.validated_rows = len(checked)
+    if context_keys and not native:
+        report.undefined_vars = find_undefined_variables(template_name, context_keys)
+
+    # Amostra de PDFs com o motor do lote
+    template = None if native else get_template_environment().get_template(template_name)
+
+    def render_pdf(values: list, pre: dict[str, Any]) -> tuple[dict[str, Any], Optional[bytes], Optional[str]]:
+        ctx = build_context(values, plan, mask_data=mask_data, precomputed=pre)
+        pdf, err = generate_pdf_native(template_name, ctx) if native else generate_pdf(template.render(ctx))
+        return ctx, pdf, err
+
+    positions = _sample_positions(len(df), sample_rows)
+    sample = [
+        (pos + 2, values, pre)
+        for pos, (_, values, pre) in zip(positions, iter_context_rows(df.iloc[positions], plan, mask_data))
+    ]
+    if sample:
+        # A primeira nota aquece os caches (template, CSS, fontes) e não entra na medição
+        try:
+            render_pdf(*sample[0][1:])
+        except Exception:
+            pass
+    known_failures = {f["linha_planilha"] for f in report.failed_rows}
+    compress = settings.ZIP_COMPRESSION == "deflated"
+    for linha_planilha, values, pre in sample:
+        start = time.perf_counter()
+        try:
+            ctx, pdf, err = render_pdf(values, pre)
+        except Exception as e:
+            ctx, pdf, err = None, None, str(e)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if not pdf:
+            if linha_planilha not in known_failures:
+                failure(linha_planilha, ctx, f"Erro layout: {err}")
+            continue
+        report.sample_ms.append(elapsed_ms)
+        report.sample_bytes.append(len(pdf))
+        report.sample_zip_bytes.append(len(zlib.compress(pdf)) if compress else len(pdf))
+
+    logger.info("Pré-voo: " + " | ".join(report.summary_lines()[:4]))
+    return report
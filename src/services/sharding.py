@@ -0,0 +1,445 @@
+"""
+Geração distribuída: uma planilha dividida em shards e processada por workers em várias máquinas.
+
+O coordenador publica os shards numa pasta compartilhada (spool, ex: volume de rede montado em
+todas as máquinas); cada worker assume um shard por vez, gera as notas numa pasta de job
+(checkpoint.CheckpointSink) e marca o shard como concluído. No fim, merge_shards monta o arquivo
+final (qualquer destino de output_sinks) e o relatório consolidado a partir das pastas dos shards.
+
+Spool:
+    fila.db              fila em SQLite: parâmetros da geração e estado de cada shard
+    entrada/shard_NNNN.csv  linhas do shard, com todos os valores como texto
+    shards/shard_NNNN/   pasta de job do shard (PDFs e relatório gravados linha a linha)
+
+Posse (lease): o worker que assume um shard o mantém por settings.SHARD_LEASE_SECONDS e uma
+thread renova a posse a cada terço desse tempo enquanto ele gera, mesmo durante uma nota lenta.
+Um worker que cai deixa a posse expirar e outro assume o shard, retomando a
+pasta de job do ponto em que parou (só as linhas ausentes do relatório são renderizadas). Após
+settings.SHARD_MAX_ATTEMPTS tentativas o shard fica com ERRO e o merge só o aceita com
+allow_incomplete. A fila usa o journal padrão do SQLite (sem WAL), que funciona em volumes de rede
+com locks de arquivo (NFSv4, SMB). As linhas ficam em CSV (e não em pickle) para que quem grava no
+spool não consiga executar código nos workers.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+import pandas as pd
+from config.settings import settings
+from src.core.logger import logger
+from src.services.checkpoint import (
+    JOB_PDF_DIR, STATUS_OK, open_job, read_manifest, rows_to_skip,
+)
+from src.services.output_sinks import MANIFEST_NAME, OutputSink
+from src.services.pdf_engine import get_compiled_template
+from src.services.zip_builder import generate_notes_zip
+
+SPOOL_DB = "fila.db"
+SHARD_INPUT_DIR = "entrada"
+SHARD_JOBS_DIR = "shards"
+
+SHARD_PENDING = "NA_FILA"
+SHARD_LEASED = "EM_EXECUCAO"
+SHARD_DONE = "CONCLUIDO"
+SHARD_FAILED = "ERRO"
+SHARD_STATUSES = (SHARD_PENDING, SHARD_LEASED, SHARD_DONE, SHARD_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    rows INTEGER NOT NULL,
+    row_offset INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+"""
+
+class ShardQueueError(ValueError):
+    """Spool inexistente, já publicado ou incompleto para o merge."""
+
+class ShardLeaseLostError(Exception):
+    """Levantada pelo callback de progresso quando a posse do shard passou para outro worker."""
+
+@dataclass
+class Shard:
+    id: int
+    name: str
+    rows: int
+    attempts: int
+    # Linhas da planilha antes do shard (a linha_planilha vem da posição, não do índice)
+    row_offset: int = 0
+    status: str = SHARD_PENDING
+    worker: Optional[str] = None
+    lease_until: Optional[float] = None
+    error: Optional[str] = None
+
+def _shard_from_row(row: sqlite3.Row) -> Shard:
+    return Shard(**{key: row[key] for key in row.keys()})
+
+def _connect(spool_dir: Union[str, Path]) -> sqlite3.Connection:
+    # isolation_level=None: as transações são abertas explicitamente com BEGIN IMMEDIATE
+    conn = sqlite3.connect(Path(spool_dir) / SPOOL_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@contextmanager
+def _transaction(spool_dir: Union[str, Path]) -> Iterator[sqlite3.Connection]:
+    """Transação com lock de escrita desde o início: dois workers nunca assumem o mesmo shard."""
+    if not (Path(spool_dir) / SPOOL_DB).exists():
+        raise ShardQueueError(f"Spool sem fila publicada: {spool_dir}")
+    conn = _connect(spool_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+def default_worker_id() -> str:
+    """Identificação do worker na fila: máquina e PID."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _cell_text(value: Any) -> str:
+    """Valor como o contexto da nota o lê (str), vazio para células em branco."""
+    return "" if pd.isna(value) else str(value)
+
+def _write_shard_rows(path: Path, shard: pd.DataFrame) -> None:
+    """
+    Grava as linhas do shard em CSV. Os valores já vão como texto (str, como build_context os lê),
+    então datas e números chegam ao worker com a mesma representação da planilha lida.
+    """
+    # Grava e renomeia: um worker nunca lê um shard pela metade
+    partial = path.with_name(path.name + ".part")
+    shard.map(_cell_text).to_csv(partial, index=False, encoding="utf-8")
+    os.replace(partial, path)
+
+def _read_shard_rows(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_filter=False, encoding="utf-8")
+
+def _split_rows(frames: Iterable[pd.DataFrame], shard_rows: int) -> Iterator[pd.DataFrame]:
+    """Reagrupa a planilha (ou seus blocos) em pedaços de `shard_rows` linhas."""
+    buffer: list[pd.DataFrame] = []
+    buffered = 0
+    for frame in frames:
+        start = 0
+        while start < len(frame):
+            piece = frame.iloc[start:start + shard_rows - buffered]
+            buffer.append(piece)
+            buffered += len(piece)
+            start += len(piece)
+            if buffered == shard_rows:
+                yield pd.concat(buffer) if len(buffer) > 1 else buffer[0]
+                buffer, buffered = [], 0
+    if buffered:
+        yield pd.concat(buffer) if len(buffer) > 1 else buffer[0]
+
+def publish_shards(
+    spool_dir: Union[str, Path],
+    df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    params: dict[str, Any],
+    shard_rows: Optional[int] = None,
+) -> int:
+    """
+    Publica a planilha `df` (ou um iterável de blocos) em shards de `shard_rows` linhas (padrão
+    settings.SHARD_ROWS) no spool, com os parâmetros da geração (`params`: template, lgpd, engine
+    e o que mais identificar o lote). Cada shard fica disponível assim que é gravado, então os
+    workers podem começar antes do fim da publicação. Retorna o nº de shards.
+    """
+    spool_dir = Path(spool_dir)
+    shard_rows = shard_rows or settings.SHARD_ROWS
+    if shard_rows < 1:
+        raise ValueError("O shard precisa ter pelo menos uma linha.")
+    if (spool_dir / SPOOL_DB).exists():
+        raise ShardQueueError(f"O spool já tem uma fila publicada: {spool_dir}")
+    (spool_dir / SHARD_INPUT_DIR).mkdir(parents=True, exist_ok=True)
+    (spool_dir / SHARD_JOBS_DIR).mkdir(exist_ok=True)
+    conn = _connect(spool_dir)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.execute("INSERT INTO meta VALUES ('params', ?)", (json.dumps(params, ensure_ascii=False),))
+    finally:
+        conn.close()
+
+    frames = (df,) if isinstance(df, pd.DataFrame) else df
+    total = row_offset = 0
+    for n, shard in enumerate(_split_rows(frames, shard_rows), start=1):
+        name = f"shard_{n:04d}"
+        _write_shard_rows(spool_dir / SHARD_INPUT_DIR / f"{name}.csv", shard)
+        with _transaction(spool_dir) as conn:
+            conn.execute(
+                "INSERT INTO shards (name, rows, row_offset, status) VALUES (?, ?, ?, ?)",
+                (name, len(shard), row_offset, SHARD_PENDING)
+            )
+        total = n
+        row_offset += len(shard)
+    with _transaction(spool_dir) as conn:
+        conn.execute("INSERT INTO meta VALUES ('publicacao_concluida', '1')")
+    logger.info(f"Spool {spool_dir}: {total} shard(s) publicado(s).")
+    return total
+
+def read_params(spool_dir: Union[str, Path]) -> dict[str, Any]:
+    """Parâmetros da geração publicados no spool."""
+    with _transaction(spool_dir) as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()
+    return json.loads(row["value"])
+
+def claim_shard(
+    spool_dir: Union[str, Path],
+    worker_id: str,
+    lease_seconds: Optional[float] = None,
+    max_attempts: Optional[int] = None,
+) -> Optional[Shard]:
+    """
+    Assume o próximo shard na fila ou abandonado (posse expirada), por `lease_seconds` (padrão
+    settings.SHARD_LEASE_SECONDS). Shards abandonados que já esgotaram `max_attempts` (padrão
+    settings.SHARD_MAX_ATTEMPTS) passam a ERRO. Retorna None se não houver shard disponível.
+    """
+    lease_seconds = settings.SHARD_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    max_attempts = max_attempts or settings.SHARD_MAX_ATTEMPTS
+    now = time.time()
+    with _transaction(spool_dir) as conn:
+        conn.execute(
+            "UPDATE shards SET status = ?, error = ? WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (SHARD_FAILED, f"Posse expirada após {max_attempts} tentativa(s)", SHARD_LEASED, now, max_attempts),
+        )
+        row = conn.execute(
+            "SELECT * FROM shards WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY id LIMIT 1",
+            (SHARD_PENDING, SHARD_LEASED, now),
+        ).fetchone()
+        if row is None:
+            return None
+        if row["status"] == SHARD_LEASED:
+            logger.warning(f"Shard {row['name']} abandonado por {row['worker']}; assumido por {worker_id}.")
+        conn.execute(
+            "UPDATE shards SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+            (SHARD_LEASED, worker_id, now + lease_seconds, row["id"]),
+        )
+        row = conn.execute("SELECT * FROM shards WHERE id = ?", (row["id"],)).fetchone()
+    return _shard_from_row(row)
+
+def renew_lease(
+    spool_dir: Union[str, Path], shard: Shard, worker_id: str, lease_seconds: Optional[float] = None
+) -> bool:
+    """Renova a posse do shard. False se ele já foi assumido por outro worker."""
+    lease_seconds = settings.SHARD_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    with _transaction(spool_dir) as conn:
+        cursor = conn.execute(
+            "UPDATE shards SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + lease_seconds, shard.id, worker_id, SHARD_LEASED),
+        )
+        return cursor.rowcount == 1
+
+def finish_shard(
+    spool_dir: Union[str, Path], shard: Shard, worker_id: str,
+    error: Optional[str] = None, max_attempts: Optional[int] = None
+) -> bool:
+    """
+    Encerra a posse do shard: CONCLUIDO sem `error`; com `error`, volta para a fila ou, após
+    `max_attempts` tentativas, fica com ERRO. False se o shard já era de outro worker.
+    """
+    max_attempts = max_attempts or settings.SHARD_MAX_ATTEMPTS
+    if error is None:
+        status = SHARD_DONE
+    else:
+        status = SHARD_FAILED if shard.attempts >= max_attempts else SHARD_PENDING
+    with _transaction(spool_dir) as conn:
+        cursor = conn.execute(
+            "UPDATE shards SET status = ?, lease_until = NULL, error = ? WHERE id = ? AND worker = ? AND status = ?",
+            (status, error, shard.id, worker_id, SHARD_LEASED),
+        )
+        return cursor.rowcount == 1
+
+def list_shards(spool_dir: Union[str, Path]) -> list[Shard]:
+    with _transaction(spool_dir) as conn:
+        rows = conn.execute("SELECT * FROM shards ORDER BY id").fetchall()
+    return [_shard_from_row(row) for row in rows]
+
+def queue_status(spool_dir: Union[str, Path]) -> dict[str, Any]:
+    """Shards por status, linhas publicadas e se a publicação terminou."""
+    with _transaction(spool_dir) as conn:
+        published = conn.execute("SELECT 1 FROM meta WHERE key = 'publicacao_concluida'").fetchone() is not None
+        rows = conn.execute("SELECT status, COUNT(*) AS n, SUM(rows) AS linhas FROM shards GROUP BY status").fetchall()
+    counts = {status: 0 for status in SHARD_STATUSES}
+    counts.update({row["status"]: row["n"] for row in rows})
+    return {
+        "publicacao_concluida": published,
+        "shards": counts,
+        "linhas": sum(row["linhas"] for row in rows),
+        "finalizada": published and not counts[SHARD_PENDING] and not counts[SHARD_LEASED],
+    }
+
+def process_shard(
+    spool_dir: Union[str, Path],
+    shard: Shard,
+    worker_id: str,
+    params: dict[str, Any],
+    workers: Optional[int] = None,
+    lease_seconds: Optional[float] = None,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+) -> list[dict]:
+    """
+    Gera as notas do shard na pasta de job dele, retomando o que uma tentativa anterior já
+    gravou. Uma thread renova a posse a cada terço do lease durante a geração; se ela foi
+    perdida, a geração para na nota seguinte com ShardLeaseLostError. Retorna o relatório das
+    linhas geradas nesta tentativa.
+    """
+    spool_dir = Path(spool_dir)
+    lease_seconds = settings.SHARD_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    job_dir = spool_dir / SHARD_JOBS_DIR / shard.name
+    sink = open_job(job_dir, params, resume=True)
+    skip = rows_to_skip(job_dir)
+    if skip:
+        logger.info(f"Shard {shard.name}: retomando, {len(skip)} linha(s) já concluída(s).")
+    frame = _read_shard_rows(spool_dir / SHARD_INPUT_DIR / f"{shard.name}.csv")
+    stopped = threading.Event()
+    lost = threading.Event()
+
+    def renew_periodically() -> None:
+        while not stopped.wait(lease_seconds / 3):
+            try:
+                if not renew_lease(spool_dir, shard, worker_id, lease_seconds):
+                    lost.set()
+                    return
+            except sqlite3.Error as e:
+                # Falha passageira (ex: volume de rede): tenta de novo no próximo ciclo
+                logger.warning(f"Shard {shard.name}: falha ao renovar a posse: {e}")
+
+    def check_lease(current: int, total: Optional[int]) -> None:
+        if lost.is_set():
+            raise ShardLeaseLostError(f"Shard {shard.name} assumido por outro worker.")
+        if progress_callback:
+            progress_callback(current, total)
+
+    heartbeat = threading.Thread(target=renew_periodically, name=f"lease-{shard.name}", daemon=True)
+    heartbeat.start()
+    try:
+        _, relatorio, _ = generate_notes_zip(
+            frame, get_compiled_template(params["template"]), mask_data=params["lgpd"],
+            progress_callback=check_lease, workers=workers, engine=params.get("engine"), sink=sink,
+            row_offset=shard.row_offset, skip_rows=skip
+        )
+    finally:
+        stopped.set()
+        heartbeat.join()
+    return relatorio
+
+def run_worker(
+    spool_dir: Union[str, Path],
+    worker_id: Optional[str] = None,
+    workers: Optional[int] = None,
+    lease_seconds: Optional[float] = None,
+    wait: bool = False,
+    poll_seconds: float = 5.0,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+) -> dict[str, int]:
+    """
+    Processa shards até a fila esvaziar. Com `wait`, continua aguardando enquanto a publicação
+    não terminou ou há shards com outros workers (para assumi-los se a posse expirar). Erros de
+    um shard o devolvem à fila (até SHARD_MAX_ATTEMPTS) e o worker segue para o próximo.
+    Retorna {"shards": concluídos, "notas": geradas com sucesso, "erros": linhas com erro}.
+    """
+    worker_id = worker_id or default_worker_id()
+    params = read_params(spool_dir)
+    summary = {"shards": 0, "notas": 0, "erros": 0}
+    while True:
+        shard = claim_shard(spool_dir, worker_id, lease_seconds)
+        if shard is None:
+            if wait and not queue_status(spool_dir)["finalizada"]:
+                time.sleep(poll_seconds)
+                continue
+            break
+        logger.info(f"Worker {worker_id}: shard {shard.name} ({shard.rows} linha(s), tentativa {shard.attempts}).")
+        try:
+            relatorio = process_shard(
+                spool_dir, shard, worker_id, params, workers, lease_seconds, progress_callback
+            )
+        except ShardLeaseLostError as e:
+            logger.warning(f"Worker {worker_id}: {e}")
+            continue
+        except Exception as e:
+            logger.exception(f"Worker {worker_id}: falha no shard {shard.name}: {e}")
+            finish_shard(spool_dir, shard, worker_id, error=str(e))
+            continue
+        if finish_shard(spool_dir, shard, worker_id):
+            summary["shards"] += 1
+            ok = sum(1 for r in relatorio if r["status"] == STATUS_OK)
+            summary["notas"] += ok
+            summary["erros"] += len(relatorio) - ok
+    logger.info(f"Worker {worker_id} encerrado: {summary}")
+    return summary
+
+def _unique_name(name: str, used: set[str]) -> str:
+    """Nome de PDF ainda não usado no arquivo final (shards diferentes podem gerar o mesmo nome)."""
+    candidate, suffix = name, 1
+    while candidate in used:
+        suffix += 1
+        candidate = f"{Path(name).stem}_{suffix}{Path(name).suffix}"
+    used.add(candidate)
+    return candidate
+
+def merge_shards(
+    spool_dir: Union[str, Path], sink: OutputSink, allow_incomplete: bool = False
+) -> tuple[Union[Path, Any], list[dict]]:
+    """
+    Monta o arquivo final no `sink` com os PDFs de todos os shards e o relatório consolidado,
+    na ordem da planilha. Exige todos os shards concluídos; com `allow_incomplete`, as linhas
+    de shards não concluídos entram no relatório com ERRO. Retorna (sink.result(), relatorio).
+    """
+    spool_dir = Path(spool_dir)
+    status = queue_status(spool_dir)
+    shards = list_shards(spool_dir)
+    pending = [s.name for s in shards if s.status != SHARD_DONE]
+    if not status["publicacao_concluida"] or (pending and not allow_incomplete):
+        detail = ", ".join(pending[:10]) + (" ..." if len(pending) > 10 else "")
+        raise ShardQueueError(
+            f"Há shards não concluídos no spool {spool_dir}: {detail or 'publicação em andamento'}"
+        )
+
+    frames = []
+    for shard in shards:
+        job_manifest = spool_dir / SHARD_JOBS_DIR / shard.name / MANIFEST_NAME
+        done = read_manifest(job_manifest) if job_manifest.exists() and job_manifest.stat().st_size else None
+        if done is not None:
+            frames.append(done.assign(_shard=shard.name))
+        if shard.status != SHARD_DONE:
+            # Linhas que nenhuma tentativa chegou a gravar
+            linhas = range(shard.row_offset + 2, shard.row_offset + 2 + shard.rows)
+            missing = sorted(set(linhas) - (set(done["linha_planilha"]) if done is not None else set()))
+            frames.append(pd.DataFrame({
+                "linha_planilha": missing, "razao_social": "Desconhecido", "numero_cobranca": "N/A",
+                "status": "ERRO", "mensagem_erro": f"Shard {shard.name} não concluído: {shard.error or shard.status}",
+                "nome_arquivo_pdf": "", "_shard": "",
+            }))
+    relatorio = []
+    used: set[str] = set()
+    with sink:
+        if frames:
+            consolidated = pd.concat(frames, ignore_index=True).fillna("").sort_values("linha_planilha", kind="stable")
+            for linha in consolidated.to_dict("records"):
+                shard_name = linha.pop("_shard")
+                linha["linha_planilha"] = int(linha["linha_planilha"])
+                if shard_name and linha["status"] == STATUS_OK:
+                    path = spool_dir / SHARD_JOBS_DIR / shard_name / JOB_PDF_DIR / linha["nome_arquivo_pdf"]
+                    if path.is_file():
+                        linha["nome_arquivo_pdf"] = sink.add(_unique_name(path.name, used), path.read_bytes())
+                    else:
+                        linha.update(status="ERRO", mensagem_erro=f"PDF ausente no shard {shard_name}", nome_arquivo_pdf="")
+                relatorio.append(linha)
+        sink.write_manifest(pd.DataFrame(relatorio).to_csv(index=False, sep=";", encoding="utf-8-sig"))
+    logger.info(f"Merge do spool {spool_dir}: {len(shards)} shard(s), {len(relatorio)} linha(s) no relatório.")
+    return sink.result(), relatorio
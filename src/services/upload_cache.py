@@ -0,0 +1,131 @@
+"""
+Cache em memória das planilhas enviadas ao app e dos dados derivados delas.
+
+O Streamlit reexecuta o script inteiro a cada interação; sem cache, trocar um toggle relia a
+planilha e refazia validação, checagem de vencimentos, total e preview. A chave é o hash do
+conteúdo enviado (mais o nome, que define o formato, e a data do dia, da qual dependem os
+vencimentos expirados). O cache é limitado a settings.UPLOAD_CACHE_ENTRIES planilhas, descarta
+primeiro as usadas há mais tempo e expira entradas após settings.UPLOAD_CACHE_TTL_SECONDS,
+para não manter dados pessoais em memória além do necessário.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Optional
+import pandas as pd
+from config.settings import settings
+from src.core.utils import validate_columns, find_column_in_df, parse_currency_series, prepare_contexts
+from src.core.date_handler import check_expiration_column
+from src.services.ingestion import read_spreadsheet
+from src.core.logger import logger
+
+PREVIEW_ROWS = 5
+# Previews por planilha (combinações de LGPD e data de vencimento escolhida); as usadas há mais tempo saem primeiro
+PREVIEW_CACHE_ENTRIES = 8
+
+@dataclass
+class ParsedUpload:
+    """Planilha lida e os dados derivados que o app exibe antes da geração."""
+    df: pd.DataFrame
+    missing_cols: list[str]
+    col_vencimento: Optional[str]
+    linhas_expiradas: list[dict]
+    col_total: Optional[str]
+    total_consolidado: float
+    total_invalidos: int
+    previews: OrderedDict[Any, pd.DataFrame] = field(default_factory=OrderedDict)
+
+_upload_lock = threading.Lock()
+_uploads: OrderedDict[tuple, tuple[float, ParsedUpload]] = OrderedDict()
+_upload_stats = {"acertos": 0, "falhas": 0, "descartes": 0}
+
+def _parse_upload(data: bytes, filename: str) -> ParsedUpload:
+    df = read_spreadsheet(BytesIO(data), filename)
+    missing_cols = validate_columns(df)
+    col_vencimento = find_column_in_df(df, ['Vencimento', 'Data Vencimento'])
+    linhas_expiradas = check_expiration_column(df, col_vencimento) if col_vencimento and not missing_cols else []
+    col_total = find_column_in_df(df, ['Total a pagar', 'Total calculado R$', 'Valor consolidado', 'Valor emitido', 'Total'])
+    total_consolidado, total_invalidos = 0.0, 0
+    if col_total:
+        valores_total, invalidos_total = parse_currency_series(df[col_total])
+        total_consolidado = float(valores_total.sum())
+        total_invalidos = int(invalidos_total.sum())
+    return ParsedUpload(
+        df=df,
+        missing_cols=missing_cols,
+        col_vencimento=col_vencimento,
+        linhas_expiradas=linhas_expiradas,
+        col_total=col_total,
+        total_consolidado=total_consolidado,
+        total_invalidos=total_invalidos,
+    )
+
+def _evict_expired(now: float) -> None:
+    ttl = settings.UPLOAD_CACHE_TTL_SECONDS
+    for key in [k for k, (stored_at, _) in _uploads.items() if now - stored_at > ttl]:
+        del _uploads[key]
+        _upload_stats["descartes"] += 1
+
+def load_upload(data: bytes, filename: str) -> ParsedUpload:
+    """
+    Lê a planilha enviada (bytes do upload) e calcula validação, vencimentos expirados e total,
+    reaproveitando o resultado enquanto o mesmo arquivo estiver em cache.
+    O DataFrame retornado é compartilhado: copie-o (df.copy()) antes de alterá-lo.
+    """
+    key = (hashlib.sha256(data).hexdigest(), Path(filename).suffix.lower(), date.today())
+    now = time.monotonic()
+    with _upload_lock:
+        _evict_expired(now)
+        entry = _uploads.get(key)
+        if entry is not None:
+            _uploads.move_to_end(key)
+            _upload_stats["acertos"] += 1
+            return entry[1]
+        _upload_stats["falhas"] += 1
+
+    start = time.perf_counter()
+    upload = _parse_upload(data, filename)
+    logger.info(f"Planilha {filename} processada em {(time.perf_counter() - start) * 1000:.0f} ms (cache de uploads)")
+
+    with _upload_lock:
+        _uploads[key] = (now, upload)
+        _uploads.move_to_end(key)
+        while len(_uploads) > max(1, settings.UPLOAD_CACHE_ENTRIES):
+            _uploads.popitem(last=False)
+            _upload_stats["descartes"] += 1
+    return upload
+
+def get_preview(upload: ParsedUpload, df: pd.DataFrame, mask_data: bool, variant: Any = None) -> pd.DataFrame:
+    """
+    Pré-visualização das primeiras linhas de `df` (a planilha do upload, possivelmente com datas
+    substituídas), em cache por mask_data e `variant` (o que diferencia `df` do original), até
+    PREVIEW_CACHE_ENTRIES por planilha.
+    """
+    key = (mask_data, variant)
+    with _upload_lock:
+        preview = upload.previews.get(key)
+        if preview is not None:
+            upload.previews.move_to_end(key)
+            return preview
+
+    contexts = prepare_contexts(df.head(PREVIEW_ROWS), mask_data=mask_data)
+    preview = pd.DataFrame(contexts).drop(columns=['_raw_total'], errors='ignore')
+    with _upload_lock:
+        upload.previews[key] = preview
+        upload.previews.move_to_end(key)
+        while len(upload.previews) > PREVIEW_CACHE_ENTRIES:
+            upload.previews.popitem(last=False)
+    return preview
+
+def clear_upload_cache() -> None:
+    with _upload_lock:
+        _uploads.clear()
+
+def get_upload_cache_stats() -> dict:
+    with _upload_lock:
+        return {**_upload_stats, "planilhas": len(_uploads)}
@@ -1,58 +1,413 @@
-import zipfile
+import cProfile
+import hashlib
+import os
+import pstats
+import time
+import multiprocessing
+import numpy as np
 import pandas as pd
-from io import BytesIO
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import StringIO
 from datetime import datetime
 from jinja2 import Template
-from typing import Callable, Optional
-from src.core.utils import prepare_context, clean_filename_text
-from src.services.pdf_engine import generate_pdf
-from src.core.logger import logger
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Union
+from config.settings import settings
+from src.core.utils import (
+    ContextPlan,
+    compile_context_plan,
+    build_context,
+    iter_context_rows,
+    note_metadata,
+    clean_filename_text,
+    format_text_cache_hit_rates,
+    get_text_cache_stats,
+)
+from src.services.pdf_engine import (
+    engine_fingerprint,
+    generate_merged_pdf,
+    generate_merged_pdf_native,
+    generate_pdf,
+    generate_pdf_native,
+    get_compiled_template,
+    get_html_template,
+    is_registry_template,
+    resolve_pdf_engine
+)
+from src.services.pdf_cache import PdfCache, get_pdf_cache, make_cache_key
+from src.services.output_sinks import OutputSink, ZipSink, create_zip_output
+from src.core.logger import logger, configure_worker_logging, get_worker_log_queue
+
+# Renderizador montado uma única vez por processo worker (ver _init_worker)
+_worker_render: Optional[Callable[[dict[str, Any]], tuple[Optional[bytes], Optional[str]]]] = None
+
+def resolve_worker_count(workers: Optional[int] = None) -> int:
+    """Resolve o nº de processos: None usa settings.PDF_WORKERS; 0 usa todos os núcleos."""
+    if workers is None:
+        workers = settings.PDF_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+# Etapas instrumentadas (ver generate_notes_zip(timings=True)) e colunas opcionais do relatório
+TIMING_STAGES = ("contexto", "render", "pdf", "zip")
+
+class _Job(NamedTuple):
+    """
+    Linha pronta para gravação: contexto, metadados para o destino (ver note_metadata), função
+    que gera o PDF e dados de cache/instrumentação.
+    """
+    linha_planilha: int
+    ctx: Union[dict, Exception]
+    meta: dict[str, str]
+    render: Optional[Callable]
+    cache_key: Optional[str]
+    cached: Optional[bytes]
+    context_seconds: float
+
+def _render_note(template_jinja: Template, ctx: dict[str, Any]) -> tuple[Optional[bytes], Optional[str]]:
+    """Renderiza o HTML de uma nota e converte para PDF."""
+    html = template_jinja.render(ctx)
+    return generate_pdf(html)
+
+def _render_note_timed(template_jinja: Template, ctx: dict[str, Any]) -> tuple[Optional[bytes], Optional[str], dict]:
+    """_render_note com os segundos gastos no Jinja ("render") e no xhtml2pdf ("pdf")."""
+    start = time.perf_counter()
+    html = template_jinja.render(ctx)
+    rendered = time.perf_counter()
+    pdf, err = generate_pdf(html)
+    return pdf, err, {"render": rendered - start, "pdf": time.perf_counter() - rendered}
+
+def _render_native_timed(template_name: str, ctx: dict[str, Any]) -> tuple[Optional[bytes], Optional[str], dict]:
+    start = time.perf_counter()
+    pdf, err = generate_pdf_native(template_name, ctx)
+    return pdf, err, {"pdf": time.perf_counter() - start}
+
+def _make_renderer(template_spec: tuple[str, str], timed: bool = False) -> Callable:
+    """
+    Monta a função contexto → (pdf, erro) a partir de `template_spec`: ("name", nome no registro),
+    ("source", código-fonte HTML) ou ("native", nome do template com layout ReportLab).
+    Com `timed`, a função devolve também o dicionário de tempos por etapa.
+    """
+    kind, value = template_spec
+    if kind == "native":
+        return partial(_render_native_timed if timed else generate_pdf_native, value)
+    template = get_compiled_template(value) if kind == "name" else Template(value)
+    return partial(_render_note_timed if timed else _render_note, template)
+
+def _init_worker(template_spec: tuple[str, str], timed: bool = False, log_queue=None) -> None:
+    """
+    Inicializa o worker: carrega o template uma vez e mantém o motor de PDF carregado.
+    Os logs do worker seguem por `log_queue` para o processo principal.
+    """
+    global _worker_render
+    if log_queue is not None:
+        configure_worker_logging(log_queue)
+    _worker_render = _make_renderer(template_spec, timed)
+
+def _render_in_worker(ctx: dict[str, Any]) -> tuple:
+    return _worker_render(ctx)
+
+def _build_context(
+    values: list, plan: ContextPlan, mask_data: bool, precomputed: dict[str, Any]
+) -> Union[dict[str, Any], Exception]:
+    try:
+        return build_context(values, plan, mask_data=mask_data, precomputed=precomputed)
+    except Exception as e:
+        return e
+
+def _cache_namespace(template_spec: Optional[tuple[str, str]]) -> Optional[str]:
+    """Namespace das chaves do cache: motor + versão e hash do fonte do template (None se desconhecido)."""
+    if template_spec is None:
+        return None
+    kind, value = template_spec
+    source = value if kind == "source" else get_html_template(value)
+    engine = "reportlab" if kind == "native" else "xhtml2pdf"
+    return f"{engine_fingerprint(engine)}:{hashlib.sha256(source.encode('utf-8')).hexdigest()}"
+
+def _cache_lookup(
+    cache: Optional[PdfCache], namespace: Optional[str], mask_data: bool, ctx: Union[dict, Exception]
+) -> tuple[Optional[str], Optional[bytes]]:
+    """Retorna (chave, PDF em cache ou None); (None, None) com o cache desativado."""
+    if cache is None or namespace is None or not isinstance(ctx, dict):
+        return None, None
+    key = make_cache_key(namespace, ctx, mask_data)
+    return key, cache.get(key)
+
+def _timed_build_context(
+    values: list, plan: ContextPlan, mask_data: bool, precomputed: dict[str, Any], timed: bool
+) -> tuple[Union[dict[str, Any], Exception], float]:
+    if not timed:
+        return _build_context(values, plan, mask_data, precomputed), 0.0
+    start = time.perf_counter()
+    ctx = _build_context(values, plan, mask_data, precomputed)
+    return ctx, time.perf_counter() - start
+
+def _iter_rows(
+    frames: Iterable[pd.DataFrame], mask_data: bool = False, row_offset: int = 0,
+    skip_rows: Optional[set[int]] = None
+) -> Iterator[tuple[int, list, dict[str, Any], ContextPlan]]:
+    """
+    Linhas de um ou mais DataFrames (blocos da planilha) como (linha da planilha, valores,
+    campos pré-calculados, plano de contexto do bloco). A linha vem da posição (contada desde o
+    primeiro bloco, mais `row_offset` linhas anteriores), não do índice. As linhas em
+    `skip_rows` são puladas sem mudar a numeração das demais.
+    Com `mask_data`, o mascaramento LGPD é feito de uma vez por bloco (ver mask_lgpd_series).
+    """
+    first = row_offset + 2
+    for frame in frames:
+        linhas = np.arange(first, first + len(frame))
+        first += len(frame)
+        if skip_rows:
+            pending = ~np.isin(linhas, list(skip_rows))
+            frame, linhas = frame[pending], linhas[pending]
+        plan = compile_context_plan(frame.columns)
+        for linha, (_, values, pre) in zip(linhas.tolist(), iter_context_rows(frame, plan, mask_data)):
+            yield linha, values, pre, plan
+
+def _iter_serial(
+    rows: Iterator[tuple[int, list, dict[str, Any], ContextPlan]], render: Callable, mask_data: bool,
+    lookup: Callable, timed: bool = False
+) -> Iterator[_Job]:
+    for linha, values, pre, plan in rows:
+        ctx, ctx_seconds = _timed_build_context(values, plan, mask_data, pre, timed)
+        key, cached = lookup(ctx)
+        yield _Job(linha, ctx, note_metadata(values, plan), partial(render, ctx), key, cached, ctx_seconds)
+
+def _iter_parallel(
+    rows: Iterator[tuple[int, list, dict[str, Any], ContextPlan]], template_spec: tuple[str, str],
+    mask_data: bool, workers: int, lookup: Callable, timed: bool = False
+) -> Iterator[_Job]:
+    """
+    Envia as linhas para um pool de processos e devolve os resultados na ordem da planilha.
+    Mantém no máximo `workers * PDF_WORKER_PREFETCH` linhas pendentes para limitar a memória.
+    Linhas encontradas no cache de PDFs não são enviadas ao pool.
+    """
+    window = max(1, workers * settings.PDF_WORKER_PREFETCH)
+    pending = deque()
+
+    # 'spawn' evita herdar threads/locks do processo do Streamlit via fork
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(template_spec, timed, get_worker_log_queue(mp_context=mp_context))
+    ) as executor:
+        def submit_next() -> bool:
+            try:
+                linha, values, pre, plan = next(rows)
+            except StopIteration:
+                return False
+            ctx, ctx_seconds = _timed_build_context(values, plan, mask_data, pre, timed)
+            key, cached = lookup(ctx)
+            future = None
+            if isinstance(ctx, dict) and cached is None:
+                future = executor.submit(_render_in_worker, ctx)
+            pending.append((linha, ctx, note_metadata(values, plan), future, key, cached, ctx_seconds))
+            return True
+
+        while len(pending) < window and submit_next():
+            pass
+
+        while pending:
+            linha, ctx, meta, future, key, cached, ctx_seconds = pending.popleft()
+            submit_next()
+            yield _Job(linha, ctx, meta, (future.result if future else None), key, cached, ctx_seconds)
+
+def _resolve_template(
+    template_jinja: Union[Template, str], engine: Optional[str]
+) -> tuple[Template, Optional[tuple[str, str]]]:
+    """
+    Compila o template (se vier o código-fonte) e monta o template_spec usado pelos workers e
+    pelo cache: ("source", HTML), ("name", nome no registro), ("native", nome) ou None (avulso).
+    """
+    template_spec = None
+    if isinstance(template_jinja, str):
+        template_spec = ("source", template_jinja)
+        template_jinja = Template(template_jinja)
+    elif is_registry_template(template_jinja):
+        template_spec = ("name", template_jinja.name)
+
+    template_name = template_spec[1] if template_spec and template_spec[0] == "name" else None
+    if resolve_pdf_engine(template_name, engine) == "reportlab":
+        template_spec = ("native", template_name)
+        logger.info(f"Motor de PDF: layout nativo ReportLab ({template_name}).")
+    return template_jinja, template_spec
+
+def _log_timing_summary(
+    samples: dict[str, list[float]], total_rows: int, elapsed: float,
+    text_cache_start: Optional[dict[str, tuple[int, int]]] = None
+) -> None:
+    """
+    Registra p50/p95/máx. (ms) de cada etapa, a vazão do lote e a taxa de acerto dos caches
+    de limpeza de texto desde `text_cache_start` (get_text_cache_stats no início do lote).
+    """
+    partes = []
+    for stage, values in samples.items():
+        if values:
+            p50, p95 = np.percentile(values, [50, 95])
+            partes.append(f"{stage}: p50={p50:.1f} p95={p95:.1f} max={max(values):.1f}")
+    hit_rates = format_text_cache_hit_rates(text_cache_start)
+    if hit_rates:
+        partes.append(f"acertos do cache de texto: {hit_rates}")
+    logger.info(
+        f"Tempos por etapa (ms, {total_rows} linhas em {elapsed:.2f} s, "
+        f"{total_rows / elapsed if elapsed else 0:.1f} notas/s) — " + " | ".join(partes)
+    )
+
+def _write_profile(profiler: cProfile.Profile, profile_path: Path) -> None:
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(str(profile_path))
+    resumo = StringIO()
+    pstats.Stats(profiler, stream=resumo).sort_stats("cumulative").print_stats(15)
+    logger.info(f"Perfil cProfile gravado em {profile_path}\n{resumo.getvalue()}")
 
 def generate_notes_zip(
-    df: pd.DataFrame,
-    template_jinja: Template,
+    df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    template_jinja: Union[Template, str],
     mask_data: bool = True,
-    progress_callback: Optional[Callable[[int, int], None]] = None
-) -> tuple[BytesIO, list[dict], list[str]]:
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    workers: Optional[int] = None,
+    output: Optional[BinaryIO] = None,
+    engine: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    timings: Optional[bool] = None,
+    profile: Optional[bool] = None,
+    total_rows: Optional[int] = None,
+    sink: Optional[OutputSink] = None,
+    row_offset: int = 0,
+    skip_rows: Optional[set[int]] = None
+) -> tuple[Union[BinaryIO, Path], list[dict], list[str]]:
     """
-    Gera um buffer ZIP contendo os PDFs das notas e um relatório de processamento CSV.
-    Retorna: (zip_buffer, relatorio, erros)
+    Gera um ZIP contendo os PDFs das notas e um relatório de processamento CSV.
+    `df` pode ser a planilha inteira ou um iterável de blocos (ver iter_spreadsheet_chunks),
+    consumido sob demanda: cada bloco só é lido quando as linhas anteriores já foram enviadas
+    para renderização. Com blocos, `total_rows` (se conhecido) é repassado ao progress_callback,
+    que recebe None como total caso contrário.
+    `template_jinja` pode ser um Template do registro (get_compiled_template), outro Template
+    já compilado ou o código-fonte HTML. O modo paralelo (workers > 1) recarrega o template
+    em cada processo pelo nome (registro) ou pelo código-fonte; um Template avulso roda em serial.
+    Os PDFs são gravados no ZIP à medida que ficam prontos, em `output` (arquivo binário
+    gravável e posicionável) ou, se omitido, no destino criado por create_zip_output().
+    `sink` troca o ZIP por outro destino (ver output_sinks: ZIP dividido, pastas, tar); nesse
+    caso `output` é ignorado e a coluna nome_arquivo_pdf traz o caminho dentro do destino.
+    A linha_planilha de cada nota vem da posição da linha (índice + 2 só num RangeIndex desde 0);
+    `row_offset` é o nº de linhas da planilha antes de `df` (ex: um shard) e as linhas em
+    `skip_rows` (já geradas numa execução anterior) não são renderizadas.
+    `engine` escolhe o motor de PDF (ver resolve_pdf_engine): templates do registro com layout
+    nativo são desenhados direto em ReportLab; os demais passam pelo xhtml2pdf.
+    Com o cache de PDFs ativo (`use_cache`, padrão settings.PDF_CACHE_ENABLED), notas já geradas
+    com o mesmo template, motor e contexto são copiadas do cache, e o relatório ganha a
+    coluna "cache_pdf" (ACERTO/FALHA).
+    `timings` (padrão settings.PDF_TIMINGS) mede cada etapa por linha — contexto, render Jinja,
+    PDF e gravação no ZIP —, acrescenta as colunas tempo_*_ms e tamanho_pdf_bytes ao relatório
+    e registra p50/p95/máx. no log. `profile` (padrão settings.PDF_PROFILE) grava um dump
+    cProfile/pstats do processo principal em settings.LOGS_DIR/profiles.
+    Retorna: (zip_buffer, relatorio, erros) — zip_buffer é o arquivo de saída na posição 0
+    (ou sink.result(): a pasta de saída para ZIP dividido e pastas).
     """
-    zip_buffer = BytesIO()
+    if sink is None:
+        sink = ZipSink(output)
     erros = []
     relatorio = []
     sucesso = 0
-    total_rows = len(df)
-    
-    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zf:
-        for i, row in df.iterrows():
+    if isinstance(df, pd.DataFrame):
+        frames = (df,)
+        total_rows = len(df)
+        if skip_rows:
+            total_rows -= len(skip_rows & set(range(row_offset + 2, row_offset + 2 + len(df))))
+    else:
+        frames = df
+    rows = _iter_rows(frames, mask_data, row_offset, skip_rows)
+
+    workers = resolve_worker_count(workers)
+    template_jinja, template_spec = _resolve_template(template_jinja, engine)
+
+    if workers > 1 and template_spec is None:
+        logger.warning("Modo paralelo requer um template do registro ou o código-fonte; gerando em modo serial.")
+        workers = 1
+
+    pdf_cache = get_pdf_cache() if use_cache is None or use_cache else None
+    if use_cache and pdf_cache is None:
+        logger.info("Cache de PDFs desativado nas configurações (PDF_CACHE_ENABLED).")
+    namespace = _cache_namespace(template_spec) if pdf_cache is not None else None
+    if pdf_cache is not None and namespace is None:
+        # Template avulso sem fonte conhecida: não há como montar uma chave confiável
+        pdf_cache = None
+    lookup = partial(_cache_lookup, pdf_cache, namespace, mask_data)
+
+    timed = settings.PDF_TIMINGS if timings is None else timings
+    profile = settings.PDF_PROFILE if profile is None else profile
+
+    parallel = workers > 1 and (total_rows is None or total_rows > 1)
+    if parallel:
+        logger.info(f"Gerando {total_rows if total_rows is not None else 'as'} notas com {workers} processos.")
+        jobs = _iter_parallel(rows, template_spec, mask_data, workers, lookup, timed)
+    else:
+        if template_spec and template_spec[0] == "native":
+            render = _make_renderer(template_spec, timed)
+        else:
+            render = partial(_render_note_timed if timed else _render_note, template_jinja)
+        jobs = _iter_serial(rows, render, mask_data, lookup, timed)
+
+    profiler = None
+    if profile:
+        if parallel:
+            logger.info("Perfil cProfile cobre apenas o processo principal (os workers não são perfilados).")
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    stage_samples = {stage: [] for stage in (*TIMING_STAGES, "total")} if timed else None
+    text_cache_start = get_text_cache_stats() if timed else None
+    batch_start = time.perf_counter()
+    cache_hits = cache_misses = 0
+    with sink:
+        for n, (linha_planilha, ctx, meta, render, cache_key, cached, ctx_seconds) in enumerate(jobs, start=1):
+            stages = {"contexto": ctx_seconds} if timed else None
+            pdf = None
             if progress_callback:
-                progress_callback(i + 1, total_rows)
-            
+                progress_callback(n, total_rows)
+
             # Variáveis para Log
             log_razao = "Desconhecido"
             log_cobranca = "N/A"
-            
+
             try:
-                ctx = prepare_context(row, mask_data=mask_data)
+                if isinstance(ctx, Exception):
+                    raise ctx
                 log_razao = ctx.get('razao_social', 'Desconhecido')
                 log_cobranca = ctx.get('numero_cobranca', 'N/A')
 
-                html = template_jinja.render(ctx)
-                pdf, err = generate_pdf(html)
-                
+                if cached is not None:
+                    pdf, err = cached, None
+                elif timed:
+                    pdf, err, render_stages = render()
+                    stages.update(render_stages)
+                else:
+                    pdf, err = render()
+                if pdf and cache_key and cached is None:
+                    pdf_cache.put(cache_key, pdf)
+
                 if pdf:
                     nome = clean_filename_text(ctx['razao_social'])[:25]
                     venc = clean_filename_text(ctx['data_vencimento']).replace('/','-')
                     raw_id = clean_filename_text(ctx['numero_cobranca'])
-                    id_unico = raw_id[-8:] if raw_id else f"L{i+1}"
-                    
+                    id_unico = raw_id[-8:] if raw_id else f"L{linha_planilha - 1}"
+
                     filename = f"NOTA_{nome}_{venc}_{id_unico}.pdf"
-                    zf.writestr(filename, pdf)
+                    if timed:
+                        zip_start = time.perf_counter()
+                        filename = sink.add(filename, pdf, meta)
+                        stages["zip"] = time.perf_counter() - zip_start
+                    else:
+                        filename = sink.add(filename, pdf, meta)
                     sucesso += 1
-                    
+
                     relatorio.append({
-                        "linha_planilha": i + 2,
+                        "linha_planilha": linha_planilha,
                         "razao_social": log_razao,
                         "numero_cobranca": log_cobranca,
                         "status": "SUCESSO",
@@ -61,34 +416,180 @@ def generate_notes_zip(
                     })
                 else:
                     msg_erro = f"Erro layout: {err}"
-                    erros.append(f"Linha {i+2} ({log_razao}): {err}")
+                    erros.append(f"Linha {linha_planilha} ({log_razao}): {err}")
                     relatorio.append({
-                        "linha_planilha": i + 2,
+                        "linha_planilha": linha_planilha,
                         "razao_social": log_razao,
                         "numero_cobranca": log_cobranca,
                         "status": "ERRO",
                         "mensagem_erro": msg_erro,
                         "nome_arquivo_pdf": ""
                     })
-                    logger.error(f"Erro na geração de PDF linha {i+2}: {msg_erro}")
+                    logger.error(f"Erro na geração de PDF linha {linha_planilha}: {msg_erro}")
 
             except Exception as e:
                 msg_erro = str(e)
-                erros.append(f"Linha {i+2}: {msg_erro}")
+                erros.append(f"Linha {linha_planilha}: {msg_erro}")
                 relatorio.append({
-                    "linha_planilha": i + 2,
+                    "linha_planilha": linha_planilha,
                     "razao_social": log_razao,
                     "numero_cobranca": log_cobranca,
                     "status": "ERRO",
                     "mensagem_erro": msg_erro,
                     "nome_arquivo_pdf": ""
                 })
-                logger.exception(f"Exceção ao processar linha {i+2}: {msg_erro}")
+                logger.exception(f"Exceção ao processar linha {linha_planilha}: {msg_erro}")
+
+            if pdf_cache is not None:
+                if cached is not None:
+                    cache_hits += 1
+                elif cache_key:
+                    cache_misses += 1
+                relatorio[-1]["cache_pdf"] = "ACERTO" if cached is not None else ("FALHA" if cache_key else "")
+
+            if timed:
+                linha = relatorio[-1]
+                for stage in TIMING_STAGES:
+                    ms = stages[stage] * 1000 if stage in stages else None
+                    linha[f"tempo_{stage}_ms"] = round(ms, 3) if ms is not None else ""
+                    if ms is not None:
+                        stage_samples[stage].append(ms)
+                total_ms = sum(stages.values()) * 1000
+                linha["tempo_total_ms"] = round(total_ms, 3)
+                linha["tamanho_pdf_bytes"] = len(pdf) if pdf else ""
+                stage_samples["total"].append(total_ms)
+            sink.record(relatorio[-1])
+
+        if pdf_cache is not None:
+            logger.info(f"Cache de PDFs: {cache_hits} acerto(s), {cache_misses} falha(s) — {pdf_cache.stats()}")
+        if timed:
+            _log_timing_summary(
+                stage_samples, len(relatorio), time.perf_counter() - batch_start, text_cache_start
+            )
 
-        # Gera CSV de relatório e inclui no ZIP
+        # Gera CSV de relatório e inclui no destino
         if relatorio:
             csv_data = pd.DataFrame(relatorio).to_csv(index=False, sep=";", encoding="utf-8-sig")
-            zf.writestr("relatorio_processamento.csv", csv_data)
-            
-    zip_buffer.seek(0)
-    return zip_buffer, relatorio, erros
+            sink.write_manifest(csv_data)
+
+    if profiler is not None:
+        profiler.disable()
+        _write_profile(profiler, settings.LOGS_DIR / "profiles" / f"generate_notes_zip_{datetime.now():%Y%m%d_%H%M%S}.pstats")
+
+    return sink.result(), relatorio, erros
+
+def _merged_title(ctx: dict[str, Any], linha_planilha: int) -> str:
+    """Título do marcador da nota no índice do PDF único: número da cobrança e razão social."""
+    numero = ctx.get('numero_cobranca') or f"Linha {linha_planilha}"
+    return f"{numero} - {ctx.get('razao_social', '')}".strip(" -")
+
+def generate_notes_pdf(
+    df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    template_jinja: Union[Template, str],
+    mask_data: bool = True,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    output: Optional[BinaryIO] = None,
+    engine: Optional[str] = None,
+    notes_per_file: Optional[int] = None,
+    total_rows: Optional[int] = None,
+    sink: Optional[OutputSink] = None
+) -> tuple[Union[BinaryIO, Path], list[dict], list[str]]:
+    """
+    Modo de impressão: gera as notas em PDFs de várias páginas em vez de um PDF por nota.
+    Cada arquivo (NOTAS_001.pdf, NOTAS_002.pdf, ...) reúne até `notes_per_file` notas (padrão
+    settings.PDF_MERGE_NOTES_PER_FILE; 0 = todas num único arquivo), renderizadas numa única
+    passagem do motor, com quebra de página entre as notas e um marcador por nota no índice do
+    PDF (número da cobrança e razão social). Os arquivos vão para o ZIP (ou `sink`) junto com o
+    relatorio_processamento.csv, que indica o arquivo e a página inicial de cada nota.
+    Parâmetros e retorno como em generate_notes_zip; o modo é serial e não usa o cache de PDFs.
+    Com xhtml2pdf, o arquivo inteiro usa só o <head> (CSS e @page) da primeira nota dele: estilos
+    que variam por nota (ex: cores condicionais no <head>) não se aplicam às demais.
+    Uma falha de layout invalida o arquivo inteiro: as notas dele ficam com status ERRO.
+    """
+    if sink is None:
+        sink = ZipSink(output)
+    erros = []
+    relatorio = []
+    if isinstance(df, pd.DataFrame):
+        frames = (df,)
+        total_rows = len(df)
+    else:
+        frames = df
+
+    template_jinja, template_spec = _resolve_template(template_jinja, engine)
+    native = template_spec is not None and template_spec[0] == "native"
+    if notes_per_file is None:
+        notes_per_file = settings.PDF_MERGE_NOTES_PER_FILE
+    batch_start = time.perf_counter()
+    total_bytes = files = 0
+
+    with sink:
+        def flush(batch: list[tuple[int, Union[dict, Exception], str, Optional[str]]]) -> None:
+            """Gera o PDF das notas do lote e registra todas as linhas dele, na ordem da planilha."""
+            nonlocal total_bytes, files
+            notes = [(title, ctx if native else html) for _, ctx, title, html in batch if isinstance(ctx, dict)]
+            pdf = err = pages = None
+            if notes:
+                files += 1
+                filename = f"NOTAS_{files:03d}.pdf"
+                if native:
+                    pdf, err, pages = generate_merged_pdf_native(template_spec[1], notes)
+                else:
+                    pdf, err, pages = generate_merged_pdf(notes)
+                if pdf:
+                    filename = sink.add(filename, pdf)
+                    total_bytes += len(pdf)
+                else:
+                    logger.error(f"Erro na geração do PDF único {filename} ({len(notes)} notas): {err}")
+
+            k = 0
+            for linha_planilha, ctx, _, _ in batch:
+                if isinstance(ctx, Exception):
+                    erros.append(f"Linha {linha_planilha}: {ctx}")
+                    linha = {"razao_social": "Desconhecido", "numero_cobranca": "N/A", "status": "ERRO",
+                             "mensagem_erro": str(ctx), "nome_arquivo_pdf": "", "pagina_inicial": ""}
+                else:
+                    linha = {
+                        "razao_social": ctx.get('razao_social', 'Desconhecido'),
+                        "numero_cobranca": ctx.get('numero_cobranca', 'N/A'),
+                        "status": "SUCESSO" if pdf else "ERRO",
+                        "mensagem_erro": "" if pdf else f"Erro layout: {err}",
+                        "nome_arquivo_pdf": filename if pdf else "",
+                        "pagina_inicial": pages[k] if pdf and pages else "",
+                    }
+                    if not pdf:
+                        erros.append(f"Linha {linha_planilha} ({linha['razao_social']}): {err}")
+                    k += 1
+                relatorio.append({"linha_planilha": linha_planilha, **linha})
+
+        batch, notes_in_batch = [], 0
+        for n, (linha_planilha, values, pre, plan) in enumerate(_iter_rows(frames, mask_data), start=1):
+            if progress_callback:
+                progress_callback(n, total_rows)
+            html = None
+            try:
+                ctx = build_context(values, plan, mask_data=mask_data, precomputed=pre)
+                if not native:
+                    html = template_jinja.render(ctx)
+            except Exception as e:
+                logger.exception(f"Exceção ao processar linha {linha_planilha}: {e}")
+                batch.append((linha_planilha, e, "", None))
+                continue
+            batch.append((linha_planilha, ctx, _merged_title(ctx, linha_planilha), html))
+            notes_in_batch += 1
+            if notes_per_file > 0 and notes_in_batch >= notes_per_file:
+                flush(batch)
+                batch, notes_in_batch = [], 0
+        if batch:
+            flush(batch)
+
+        elapsed = time.perf_counter() - batch_start
+        logger.info(
+            f"PDF único: {len(relatorio)} notas em {files} arquivo(s), {total_bytes / 1024:.0f} KB, {elapsed:.2f} s "
+            f"({len(relatorio) / elapsed if elapsed else 0:.1f} notas/s)"
+        )
+        if relatorio:
+            csv_data = pd.DataFrame(relatorio).to_csv(index=False, sep=";", encoding="utf-8-sig")
+            sink.write_manifest(csv_data)
+
+    return sink.result(), relatorio, erros
@@ -0,0 +1,221 @@
+"""
+Geração distribuída pela linha de comando: um lote grande dividido em shards e processado por
+workers em várias máquinas, com uma pasta compartilhada (spool) como fila. Ver
+src/services/sharding.py.
+
+Uso:
+    # Coordenador: publica a planilha em shards
+    python -m src.shard_cli publish planilha.xlsx --spool /mnt/lote [-t Modelo_Padrao_Hube.html] [--no-lgpd]
+        [--engine auto|reportlab|xhtml2pdf] [--expired keep|replace --new-date DD/MM/AAAA] [--shard-rows N]
+    # Em cada máquina (quantos processos quiser): processa shards até a fila esvaziar
+    python -m src.shard_cli work --spool /mnt/lote [--workers N] [--worker-id ID] [--wait]
+    # Acompanhamento
+    python -m src.shard_cli status --spool /mnt/lote
+    # No fim: arquivo final e relatório consolidado
+    python -m src.shard_cli merge --spool /mnt/lote -o notas.zip [--sink zip|zip-split|dir|tar]
+        [--compression deflated|stored] [--split-mb MB] [--split-notes N] [--partition consorcio|uf]
+        [--allow-incomplete]
+
+Códigos de saída (como em src.cli): 0 = ok; 1 = alguma linha ou shard falhou; 2 = entrada inválida.
+"""
+import argparse
+import os
+import shutil
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Optional
+from config.settings import settings
+from src.cli import (
+    EXIT_INVALID_INPUT, EXIT_OK, EXIT_ROW_ERRORS, _parse_cli_date, _print_expired, _progress_printer,
+)
+from src.core.date_handler import apply_date_replacement, check_expiration_column
+from src.core.utils import find_column_in_df, validate_columns
+from src.services.ingestion import read_spreadsheet
+from src.services.output_sinks import PARTITIONS, SINKS, ZIP_COMPRESSIONS, create_sink
+from src.services.pdf_engine import PDF_ENGINES, list_templates
+from src.services.sharding import (
+    SHARD_DONE, SHARD_FAILED, ShardQueueError, list_shards, merge_shards, publish_shards, queue_status, run_worker,
+)
+from src.core.logger import logger
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.shard_cli",
+        description="Geração distribuída de notas de débito em shards (fila numa pasta compartilhada).",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish = commands.add_parser("publish", help="Publica a planilha em shards no spool")
+    publish.add_argument("input", type=Path, help="Planilha de entrada (.xlsx ou .csv)")
+    publish.add_argument("--spool", type=Path, required=True, help="Pasta compartilhada da fila")
+    publish.add_argument("-t", "--template", default="Modelo_Padrao_Hube.html",
+                         help="Template HTML em templates/ (padrão: Modelo_Padrao_Hube.html)")
+    publish.add_argument("--lgpd", action=argparse.BooleanOptionalAction, default=True,
+                         help="Mascara nomes e documentos (padrão: ativado)")
+    publish.add_argument("--expired", choices=("keep", "replace"), default="keep",
+                         help="Vencimentos expirados: manter ou substituir por --new-date")
+    publish.add_argument("--new-date", type=_parse_cli_date, metavar="DD/MM/AAAA",
+                         help="Nova data de vencimento (expirados ou planilha sem coluna de vencimento)")
+    publish.add_argument("--engine", choices=PDF_ENGINES, default=None,
+                         help="Motor de PDF (padrão: settings.PDF_ENGINE)")
+    publish.add_argument("--shard-rows", type=int, default=None, metavar="N",
+                         help="Linhas por shard (padrão: settings.SHARD_ROWS)")
+
+    work = commands.add_parser("work", help="Processa shards da fila até ela esvaziar")
+    work.add_argument("--spool", type=Path, required=True, help="Pasta compartilhada da fila")
+    work.add_argument("--workers", type=int, default=None,
+                      help="Processos de renderização por shard (0 = todos os núcleos)")
+    work.add_argument("--worker-id", default=None, help="Identificação na fila (padrão: máquina:PID)")
+    work.add_argument("--wait", action="store_true",
+                      help="Aguarda o fim da publicação e os shards de outros workers (assume os abandonados)")
+    work.add_argument("--quiet", action="store_true", help="Não exibe o progresso")
+
+    status = commands.add_parser("status", help="Exibe o estado dos shards")
+    status.add_argument("--spool", type=Path, required=True, help="Pasta compartilhada da fila")
+
+    merge = commands.add_parser("merge", help="Monta o arquivo final e o relatório consolidado")
+    merge.add_argument("--spool", type=Path, required=True, help="Pasta compartilhada da fila")
+    merge.add_argument("-o", "--output", type=Path, required=True,
+                       help="Arquivo de saída (zip, tar) ou pasta (zip-split, dir)")
+    merge.add_argument("--sink", choices=SINKS, default="zip", help="Destino da saída (padrão: zip)")
+    merge.add_argument("--compression", choices=tuple(ZIP_COMPRESSIONS), default=None,
+                       help="Compressão dos ZIPs (padrão: settings.ZIP_COMPRESSION)")
+    merge.add_argument("--split-mb", type=float, default=None, metavar="MB",
+                       help="zip-split: tamanho máximo de cada ZIP (MB)")
+    merge.add_argument("--split-notes", type=int, default=None, metavar="N",
+                       help="zip-split: nº máximo de notas por ZIP")
+    merge.add_argument("--partition", choices=tuple(PARTITIONS), default=None,
+                       help="dir: subpastas por consórcio ou UF")
+    merge.add_argument("--allow-incomplete", action="store_true",
+                       help="Monta o arquivo mesmo com shards com erro (as linhas deles saem com ERRO)")
+    return parser
+
+def _publish(args: argparse.Namespace) -> int:
+    if not args.input.exists():
+        print(f"Erro: arquivo não encontrado: {args.input}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.template not in list_templates():
+        print(f"Erro: template '{args.template}' não encontrado em {settings.TEMPLATES_DIR}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.expired == "replace" and args.new_date is None:
+        print("Erro: --expired replace requer --new-date DD/MM/AAAA", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    try:
+        df = read_spreadsheet(args.input)
+    except Exception as e:
+        print(f"Erro ao ler a planilha: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    missing_cols = validate_columns(df)
+    if missing_cols:
+        print("Erro: a planilha não possui todas as colunas necessárias:", file=sys.stderr)
+        for m in missing_cols:
+            print(f"  - {m}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    # Os vencimentos são tratados uma vez aqui: os workers recebem as linhas prontas
+    col_vencimento = find_column_in_df(df, ['Vencimento', 'Data Vencimento'])
+    if not col_vencimento:
+        if args.new_date:
+            df['Vencimento'] = args.new_date.strftime('%d/%m/%Y')
+        else:
+            print("Aviso: a planilha não possui coluna de Vencimento (use --new-date para informar).",
+                  file=sys.stderr)
+    else:
+        linhas_expiradas = check_expiration_column(df, col_vencimento)
+        if linhas_expiradas and args.expired == "replace":
+            df = apply_date_replacement(df, col_vencimento, linhas_expiradas, args.new_date)
+        _print_expired(linhas_expiradas, args)
+
+    params = {
+        "planilha": args.input.name, "template": args.template, "lgpd": args.lgpd, "engine": args.engine,
+        "expired": args.expired, "new_date": args.new_date.isoformat() if args.new_date else None,
+    }
+    try:
+        total = publish_shards(args.spool, df, params, shard_rows=args.shard_rows)
+    except (ShardQueueError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    print(f"{total} shard(s) publicado(s) em {args.spool} ({len(df)} linha(s)).")
+    return EXIT_OK
+
+def _work(args: argparse.Namespace) -> int:
+    try:
+        summary = run_worker(
+            args.spool, worker_id=args.worker_id, workers=args.workers, wait=args.wait,
+            progress_callback=_progress_printer(args.quiet)
+        )
+    except ShardQueueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    print(f"Shards concluídos: {summary['shards']} | notas geradas: {summary['notas']} | erros: {summary['erros']}")
+    return EXIT_ROW_ERRORS if summary["erros"] else EXIT_OK
+
+def _status(args: argparse.Namespace) -> int:
+    try:
+        status = queue_status(args.spool)
+        shards = list_shards(args.spool)
+    except ShardQueueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    counts = " | ".join(f"{name}: {n}" for name, n in status["shards"].items())
+    publicacao = "concluída" if status["publicacao_concluida"] else "em andamento"
+    print(f"{len(shards)} shard(s), {status['linhas']} linha(s), publicação {publicacao}")
+    print(counts)
+    for shard in shards:
+        if shard.status not in (SHARD_DONE,):
+            detail = f" - {shard.error}" if shard.error else ""
+            print(f"  {shard.name}: {shard.status} ({shard.worker or '-'}, tentativa(s) {shard.attempts}){detail}")
+    return EXIT_ROW_ERRORS if status["shards"][SHARD_FAILED] else EXIT_OK
+
+def _merge(args: argparse.Namespace) -> int:
+    if args.sink == "zip-split" and not (args.split_mb or args.split_notes):
+        print("Erro: --sink zip-split requer --split-mb e/ou --split-notes", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    if args.sink in ("zip-split", "dir") and args.output.exists():
+        print(f"Erro: a pasta de saída já existe: {args.output}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+
+    # Como em src.cli: grava no caminho parcial e renomeia no fim
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = args.output.with_name(args.output.name + ".part")
+    try:
+        with ExitStack() as stack:
+            target = partial_path if args.sink in ("zip-split", "dir") else stack.enter_context(open(partial_path, "w+b"))
+            sink = create_sink(
+                args.sink, target, compression=args.compression,
+                max_bytes=int(args.split_mb * 1024 * 1024) if args.split_mb else None,
+                max_notes=args.split_notes, partition=args.partition
+            )
+            _, relatorio = merge_shards(args.spool, sink, allow_incomplete=args.allow_incomplete)
+        os.replace(partial_path, args.output)
+    except ShardQueueError as e:
+        _discard(partial_path)
+        print(f"Erro: {e}", file=sys.stderr)
+        return EXIT_INVALID_INPUT
+    except BaseException:
+        _discard(partial_path)
+        raise
+
+    erros = [r for r in relatorio if r["status"] != "SUCESSO"]
+    print(f"Arquivo final: {len(relatorio) - len(erros)}/{len(relatorio)} nota(s) ({len(erros)} erro(s))")
+    print(f"Saída: {args.output}")
+    for r in erros:
+        print(f"  Linha {r['linha_planilha']} ({r['razao_social']}): {r['mensagem_erro']}", file=sys.stderr)
+    return EXIT_ROW_ERRORS if erros else EXIT_OK
+
+def _discard(partial_path: Path) -> None:
+    if partial_path.is_dir():
+        shutil.rmtree(partial_path, ignore_errors=True)
+    else:
+        partial_path.unlink(missing_ok=True)
+
+COMMANDS = {"publish": _publish, "work": _work, "status": _status, "merge": _merge}
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logger.info(f"Geração distribuída: comando {args.command}, spool {args.spool}")
+    return COMMANDS[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+import pytest
+from config.settings import settings
+
+@pytest.fixture(autouse=True)
+def isolated_pdf_cache(tmp_path, monkeypatch):
+    """Cache de PDFs desligado e isolado em tmp_path; os testes do cache o reativam explicitamente."""
+    monkeypatch.setattr(settings, "PDF_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "PDF_CACHE_DIR", tmp_path / "pdf_cache")
@@ -0,0 +1,21 @@
+import pytest
+from benchmarks.compare import compare
+from benchmarks.datagen import ALIAS_SETS, make_spreadsheet
+from src.core.utils import validate_columns, prepare_contexts
+
+@pytest.mark.parametrize("aliases", range(len(ALIAS_SETS)))
+def test_synthetic_spreadsheet_is_valid(aliases):
+    df = make_spreadsheet(50, aliases=aliases)
+
+    assert validate_columns(df) == []
+    ctx = prepare_contexts(df)[0]
+    assert ctx["razao_social"] and ctx["total_pagar"].startswith("R$") and ctx["dados_bancarios"]
+
+def test_compare_flags_only_relevant_regressions():
+    def result(us, seconds):
+        return {"us_per_row": us, "seconds": seconds}
+    base = {("ingestion", 100, "csv"): result(10, 0.5), ("validate_columns", 100, "csv"): result(1, 0.0001)}
+    new = {("ingestion", 100, "csv"): result(15, 0.75), ("validate_columns", 100, "csv"): result(5, 0.0005)}
+
+    flags = {key[0]: regressed for key, *_, regressed in compare(base, new, 0.2, 0.005)}
+    assert flags == {"ingestion": True, "validate_columns": False}
@@ -0,0 +1,119 @@
+import zipfile
+from io import BytesIO
+import pandas as pd
+import pytest
+from src.services.checkpoint import (
+    CheckpointError,
+    CheckpointSink,
+    assemble_archive,
+    open_job,
+    read_manifest,
+    rows_to_skip,
+)
+from src.services.output_sinks import MANIFEST_NAME, ZipSink
+
+def _linha(n, status="SUCESSO", arquivo=""):
+    return {"linha_planilha": n, "razao_social": f"Cliente {n}", "numero_cobranca": f"COB{n}",
+            "status": status, "mensagem_erro": "" if status == "SUCESSO" else "falhou",
+            "nome_arquivo_pdf": arquivo}
+
+def _run(sink, linhas):
+    with sink:
+        for linha in linhas:
+            if linha["status"] == "SUCESSO":
+                linha["nome_arquivo_pdf"] = sink.add(f"NOTA_{linha['linha_planilha']}.pdf", b"%PDF-fake")
+            sink.record(linha)
+
+def test_checkpoint_sink_writes_manifest_incrementally(tmp_path):
+    sink = CheckpointSink(tmp_path / "job")
+    with sink:
+        sink.add("NOTA_2.pdf", b"%PDF-fake")
+        sink.record(_linha(2, arquivo="NOTA_2.pdf"))
+        # Gravado antes do fim do lote
+        assert read_manifest(tmp_path / "job" / MANIFEST_NAME)["linha_planilha"].tolist() == [2]
+        sink.record(_linha(3, status="ERRO"))
+    assert (tmp_path / "job" / "notas" / "NOTA_2.pdf").exists()
+    assert read_manifest(tmp_path / "job" / MANIFEST_NAME)["status"].tolist() == ["SUCESSO", "ERRO"]
+
+def test_read_manifest_skips_truncated_line_and_keeps_last_attempt(tmp_path):
+    path = tmp_path / MANIFEST_NAME
+    path.write_text(
+        "linha_planilha;razao_social;numero_cobranca;status;mensagem_erro;nome_arquivo_pdf\n"
+        "2;A;C2;ERRO;x;\n3;B;C3;SUCESSO;;NOTA_3.pdf\n2;A;C2;SUCESSO;;NOTA_2.pdf\n4;C;C4;SUC",
+        encoding="utf-8-sig",
+    )
+    manifest = read_manifest(path)
+    assert manifest["linha_planilha"].tolist() == [2, 3]
+    assert manifest["status"].tolist() == ["SUCESSO", "SUCESSO"]
+
+@pytest.mark.parametrize("truncated", ["3;B;C3;SUCE", "3;B;C3;SUCESSO;;", "3;B;C3;SUCESSO", "3;B;C3;ERRO;;"])
+def test_truncated_last_line_is_rendered_again_on_resume(tmp_path, truncated):
+    job_dir = tmp_path / "job"
+    _run(open_job(job_dir, {"template": "a"}), [_linha(2)])
+    with open(job_dir / MANIFEST_NAME, "a", encoding="utf-8", newline="") as f:
+        f.write(truncated)
+
+    assert rows_to_skip(job_dir) == {2}
+    _, relatorio = assemble_archive(job_dir, ZipSink(BytesIO()))
+    assert [(r["linha_planilha"], r["status"]) for r in relatorio] == [(2, "SUCESSO")]
+
+@pytest.mark.parametrize("truncated", ["3;X;C3;SUCE", '3;"Empresa; Ltda', "3;X;C3;SUCESSO;;N3"])
+def test_resume_after_crash_mid_line_keeps_every_row(tmp_path, truncated):
+    job_dir = tmp_path / "job"
+    _run(open_job(job_dir, {"template": "a"}), [_linha(2)])
+    with open(job_dir / MANIFEST_NAME, "a", encoding="utf-8", newline="") as f:
+        f.write(truncated)  # queda durante a gravação da linha 3
+
+    skip = rows_to_skip(job_dir)
+    pendentes = [_linha(n) for n in (3, 4) if n not in skip]
+    _run(open_job(job_dir, {"template": "a"}, resume=True), pendentes)
+
+    buffer = BytesIO()
+    _, relatorio = assemble_archive(job_dir, ZipSink(buffer))
+    assert [(r["linha_planilha"], r["status"]) for r in relatorio] == [(2, "SUCESSO"), (3, "SUCESSO"), (4, "SUCESSO")]
+    with zipfile.ZipFile(buffer) as zf:
+        assert sorted(zf.namelist()) == ["NOTA_2.pdf", "NOTA_3.pdf", "NOTA_4.pdf", MANIFEST_NAME]
+
+def test_rows_to_skip(tmp_path):
+    job_dir = tmp_path / "job"
+    _run(open_job(job_dir, {"template": "a"}), [_linha(2), _linha(3, status="ERRO"), _linha(4)])
+    (job_dir / "notas" / "NOTA_4.pdf").unlink()  # PDF perdido: a linha é refeita
+
+    assert rows_to_skip(job_dir) == {2, 3}
+    assert rows_to_skip(job_dir, retry_failed=True) == {2}
+
+def test_open_job_requires_resume_and_same_params(tmp_path):
+    job_dir = tmp_path / "job"
+    open_job(job_dir, {"template": "a", "lgpd": True}).close()
+    with pytest.raises(CheckpointError, match="retomada"):
+        open_job(job_dir, {"template": "a", "lgpd": True})
+    with pytest.raises(CheckpointError, match="lgpd"):
+        open_job(job_dir, {"template": "a", "lgpd": False}, resume=True)
+    open_job(job_dir, {"template": "a", "lgpd": True}, resume=True).close()
+
+def test_assemble_archive_merges_attempts_and_previous_manifest(tmp_path):
+    job_dir = tmp_path / "job"
+    _run(open_job(job_dir, {}), [_linha(2), _linha(3, status="ERRO")])
+    _run(open_job(job_dir, {}, resume=True), [_linha(3)])
+
+    # Relatório de uma execução anterior (ZIP já entregue) com a linha 4 certa e a 5 com erro
+    previous = tmp_path / "anterior.csv"
+    pd.DataFrame([_linha(4, arquivo="NOTA_4.pdf"), _linha(5, status="ERRO")]).to_csv(
+        previous, sep=";", index=False, encoding="utf-8-sig"
+    )
+    output = BytesIO()
+    _, relatorio = assemble_archive(job_dir, ZipSink(output), manifest=previous)
+
+    # A nota 4 está certa, mas o PDF dela fica no arquivo da execução anterior
+    assert [(r["linha_planilha"], r["status"], r["origem_pdf"]) for r in relatorio] == [
+        (2, "SUCESSO", "ESTE_ARQUIVO"), (3, "SUCESSO", "ESTE_ARQUIVO"),
+        (4, "SUCESSO", "ARQUIVO_ANTERIOR"), (5, "ERRO", "ARQUIVO_ANTERIOR"),
+    ]
+    with zipfile.ZipFile(output) as zf:
+        assert sorted(zf.namelist()) == ["NOTA_2.pdf", "NOTA_3.pdf", MANIFEST_NAME]
+        manifest = pd.read_csv(BytesIO(zf.read(MANIFEST_NAME)), sep=";", encoding="utf-8-sig")
+    assert manifest["origem_pdf"].tolist() == ["ESTE_ARQUIVO", "ESTE_ARQUIVO", "ARQUIVO_ANTERIOR", "ARQUIVO_ANTERIOR"]
+
+    # Sem relatório de outra execução, todas as notas estão no arquivo e não há a coluna
+    _, relatorio = assemble_archive(job_dir, ZipSink(BytesIO()))
+    assert "origem_pdf" not in relatorio[0]
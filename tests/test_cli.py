@@ -0,0 +1,220 @@
+import zipfile
+import pandas as pd
+import pytest
+from config.settings import settings
+from src import cli
+from src.cli import main, EXIT_OK, EXIT_ROW_ERRORS, EXIT_INVALID_INPUT
+from src.services.pdf_engine import clear_template_cache
+
+def make_sheet(n=3):
+    return pd.DataFrame({
+        'Nome': [f'Cliente {i}' for i in range(n)],
+        'Endereço': ['Rua A, 1'] * n,
+        'UF': ['SP'] * n,
+        'CNPJ/CPF': ['123.456.789-01'] * n,
+        'Número da conta': [f'{i:06d}' for i in range(n)],
+        'Nº da cobrança': [f'COB{i:04d}' for i in range(n)],
+        'Mês de Referência': ['12/2098'] * n,
+        'Vencimento': ['01/01/2020'] + ['01/01/2099'] * (n - 1),
+        'Total a pagar': ['R$ 10,00'] * n,
+        'Dados bancários': ['Banco X'] * n,
+    })
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = tmp_path / "base.csv"
+    make_sheet().to_csv(path, index=False, sep=";")
+    return path
+
+def test_cli_generates_zip_and_replaces_expired_dates(sheet, tmp_path, capsys):
+    out = tmp_path / "saida" / "notas.zip"
+    code = main([str(sheet), "-o", str(out), "--expired", "replace", "--new-date", "05/02/2099",
+                 "--workers", "1", "--quiet"])
+
+    assert code == EXIT_OK
+    assert "Notas geradas: 3/3" in capsys.readouterr().out
+    with zipfile.ZipFile(out) as zf:
+        names = zf.namelist()
+    assert len(names) == 4
+    assert any("05022099" in n for n in names)
+    assert not out.with_name("notas.zip.part").exists()
+
+def test_cli_returns_error_code_when_rows_fail(sheet, tmp_path, monkeypatch):
+    tpl_dir = tmp_path / "templates"
+    tpl_dir.mkdir()
+    (tpl_dir / "quebrado.html").write_text(
+        "{% if numero_cobranca == 'COB0001' %}{{ 1 / 0 }}{% endif %}<p>{{ razao_social }}</p>", encoding="utf-8"
+    )
+    monkeypatch.setattr(settings, "TEMPLATES_DIR", tpl_dir)
+    monkeypatch.setattr(settings, "TEMPLATE_CACHE_DIR", tmp_path / "cache")
+    clear_template_cache()
+
+    code = main([str(sheet), "-o", str(tmp_path / "notas.zip"), "-t", "quebrado.html", "--quiet"])
+    clear_template_cache()
+
+    assert code == EXIT_ROW_ERRORS
+
+def test_cli_rejects_invalid_input(tmp_path):
+    incompleta = tmp_path / "incompleta.csv"
+    make_sheet().drop(columns=['UF']).to_csv(incompleta, index=False, sep=";")
+    out = str(tmp_path / "notas.zip")
+
+    assert main([str(incompleta), "-o", out]) == EXIT_INVALID_INPUT
+    assert main([str(tmp_path / "nao_existe.csv"), "-o", out]) == EXIT_INVALID_INPUT
+    assert main([str(incompleta), "-o", out, "-t", "inexistente.html"]) == EXIT_INVALID_INPUT
+    with pytest.raises(SystemExit):
+        main([str(incompleta), "-o", out, "--new-date", "2099-01-01"])
+
+def test_cli_stream_mode_matches_full_read(sheet, tmp_path, capsys):
+    out_full, out_stream = tmp_path / "full.zip", tmp_path / "stream.zip"
+    args = ["--expired", "replace", "--new-date", "05/02/2099", "--workers", "1", "--quiet"]
+
+    assert main([str(sheet), "-o", str(out_full), *args]) == EXIT_OK
+    assert main([str(sheet), "-o", str(out_stream), "--stream", "--chunk-size", "2", *args]) == EXIT_OK
+
+    assert "1 vencimento(s) expirado(s) substituído(s)" in capsys.readouterr().out
+    with zipfile.ZipFile(out_full) as zf, zipfile.ZipFile(out_stream) as zs:
+        assert zs.namelist() == zf.namelist()
+        assert zs.read("relatorio_processamento.csv") == zf.read("relatorio_processamento.csv")
+
+def test_cli_stream_mode_rejects_invalid_columns(tmp_path):
+    incompleta = tmp_path / "incompleta.csv"
+    make_sheet().drop(columns=['UF']).to_csv(incompleta, index=False, sep=";")
+    out = tmp_path / "notas.zip"
+
+    assert main([str(incompleta), "-o", str(out), "--stream"]) == EXIT_INVALID_INPUT
+    assert not out.exists()
+
+def test_cli_merge_mode_writes_multi_page_pdfs(sheet, tmp_path, capsys):
+    out = tmp_path / "impressao.zip"
+    code = main([str(sheet), "-o", str(out), "--merge", "--notes-per-file", "2", "--quiet"])
+
+    assert code == EXIT_OK
+    assert "Notas geradas: 3/3" in capsys.readouterr().out
+    with zipfile.ZipFile(out) as zf:
+        assert zf.namelist() == ["NOTAS_001.pdf", "NOTAS_002.pdf", "relatorio_processamento.csv"]
+
+def test_cli_split_zip_sink(sheet, tmp_path, capsys):
+    out = tmp_path / "volumes"
+    code = main([str(sheet), "-o", str(out), "--sink", "zip-split", "--split-notes", "2",
+                 "--compression", "stored", "--quiet"])
+
+    assert code == EXIT_OK
+    assert sorted(p.name for p in out.iterdir()) == ["notas_001.zip", "notas_002.zip", "relatorio_processamento.csv"]
+    assert not out.with_name("volumes.part").exists()
+    assert main([str(sheet), "-o", str(out), "--sink", "dir", "--quiet"]) == EXIT_INVALID_INPUT
+
+def test_cli_job_dir_resumes_interrupted_batch(tmp_path, monkeypatch, capsys):
+    sheet = tmp_path / "base.csv"
+    make_sheet(5).to_csv(sheet, index=False, sep=";")
+    job_dir = tmp_path / "job"
+    out = tmp_path / "notas.zip"
+
+    # Simula a queda do lote na 4ª nota: as 3 primeiras já estão na pasta do job
+    calls = {"n": 0}
+    def crash(current, total):
+        calls["n"] += 1
+        if calls["n"] == 4:
+            raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(cli, "_progress_printer", lambda quiet: crash)
+        with pytest.raises(KeyboardInterrupt):
+            main([str(sheet), "-o", str(out), "--job-dir", str(job_dir), "--workers", "1"])
+    assert not out.exists()
+    assert len(list((job_dir / "notas").iterdir())) == 3
+
+    # Sem --resume a pasta com geração anterior é recusada
+    assert main([str(sheet), "-o", str(out), "--job-dir", str(job_dir), "--quiet"]) == EXIT_INVALID_INPUT
+
+    capsys.readouterr()
+    code = main([str(sheet), "-o", str(out), "--job-dir", str(job_dir), "--resume", "--workers", "1", "--quiet"])
+    assert code == EXIT_OK
+    saida = capsys.readouterr().out
+    assert "Notas geradas: 2/2" in saida
+    assert "Arquivo final: 5/5" in saida
+    with zipfile.ZipFile(out) as zf:
+        assert len([n for n in zf.namelist() if n.endswith(".pdf")]) == 5
+        relatorio = zf.read("relatorio_processamento.csv").decode("utf-8-sig")
+    assert [int(l.split(";")[0]) for l in relatorio.splitlines()[1:]] == [2, 3, 4, 5, 6]
+
+def test_cli_retry_failed_renders_only_failed_rows(sheet, tmp_path, monkeypatch, capsys):
+    tpl_dir = tmp_path / "templates"
+    tpl_dir.mkdir()
+    template = tpl_dir / "nota.html"
+    template.write_text(
+        "{% if numero_cobranca == 'COB0001' %}{{ 1 / 0 }}{% endif %}<p>{{ razao_social }}</p>", encoding="utf-8"
+    )
+    monkeypatch.setattr(settings, "TEMPLATES_DIR", tpl_dir)
+    monkeypatch.setattr(settings, "TEMPLATE_CACHE_DIR", tmp_path / "cache")
+    clear_template_cache()
+    job_dir = tmp_path / "job"
+    args = [str(sheet), "-o", str(tmp_path / "notas.zip"), "-t", "nota.html", "--job-dir", str(job_dir),
+            "--workers", "1", "--quiet"]
+    try:
+        assert main(args) == EXIT_ROW_ERRORS
+        # Só --resume não refaz as linhas com erro
+        assert main(args + ["--resume"]) == EXIT_ROW_ERRORS
+
+        template.write_text("<p>{{ razao_social }}</p>", encoding="utf-8")
+        clear_template_cache()
+        capsys.readouterr()
+        assert main(args + ["--retry-failed"]) == EXIT_OK
+    finally:
+        clear_template_cache()
+    saida = capsys.readouterr().out
+    assert "Notas geradas: 1/1" in saida
+    assert "Arquivo final: 3/3" in saida
+
+def test_cli_retry_failed_from_previous_report_marks_its_notes(sheet, tmp_path, monkeypatch, capsys):
+    tpl_dir = tmp_path / "templates"
+    tpl_dir.mkdir()
+    template = tpl_dir / "nota.html"
+    template.write_text(
+        "{% if numero_cobranca == 'COB0001' %}{{ 1 / 0 }}{% endif %}<p>{{ razao_social }}</p>", encoding="utf-8"
+    )
+    monkeypatch.setattr(settings, "TEMPLATES_DIR", tpl_dir)
+    monkeypatch.setattr(settings, "TEMPLATE_CACHE_DIR", tmp_path / "cache")
+    clear_template_cache()
+    first = tmp_path / "notas.zip"
+    args = [str(sheet), "-t", "nota.html", "--workers", "1", "--quiet"]
+    try:
+        assert main(args + ["-o", str(first)]) == EXIT_ROW_ERRORS
+        relatorio = tmp_path / "relatorio.csv"
+        with zipfile.ZipFile(first) as zf:
+            relatorio.write_bytes(zf.read("relatorio_processamento.csv"))
+
+        template.write_text("<p>{{ razao_social }}</p>", encoding="utf-8")
+        clear_template_cache()
+        capsys.readouterr()
+        retry = tmp_path / "refeitas.zip"
+        assert main(args + ["-o", str(retry), "--job-dir", str(tmp_path / "job"),
+                            "--retry-failed", str(relatorio)]) == EXIT_OK
+    finally:
+        clear_template_cache()
+    saida = capsys.readouterr().out
+    assert "Arquivo final: 3/3" in saida
+    assert "2 nota(s) certa(s) de relatorio.csv não estão neste arquivo" in saida
+    with zipfile.ZipFile(retry) as zf:
+        manifest = pd.read_csv(zf.open("relatorio_processamento.csv"), sep=";", encoding="utf-8-sig")
+        assert len(zf.namelist()) == 2
+    assert manifest["origem_pdf"].tolist() == ["ARQUIVO_ANTERIOR", "ESTE_ARQUIVO", "ARQUIVO_ANTERIOR"]
+
+def test_cli_dry_run_does_not_generate(sheet, tmp_path, monkeypatch, capsys):
+    out = tmp_path / "notas.zip"
+    assert main([str(sheet), "-o", str(out), "--dry-run", "--workers", "1"]) == EXIT_OK
+    saida = capsys.readouterr().out
+    assert "Tempo estimado" in saida and "Tamanho estimado" in saida
+    assert not out.exists()
+
+    tpl_dir = tmp_path / "templates"
+    tpl_dir.mkdir()
+    (tpl_dir / "erro.html").write_text("<p>{{ razao_socail }}</p>", encoding="utf-8")
+    monkeypatch.setattr(settings, "TEMPLATES_DIR", tpl_dir)
+    monkeypatch.setattr(settings, "TEMPLATE_CACHE_DIR", tmp_path / "cache")
+    clear_template_cache()
+    try:
+        code = main([str(sheet), "-o", str(out), "-t", "erro.html", "--dry-run"])
+    finally:
+        clear_template_cache()
+    assert code == EXIT_ROW_ERRORS
+    assert "Variáveis desconhecidas no template: razao_socail" in capsys.readouterr().out
@@ -2,7 +2,7 @@ import pytest
 import pandas as pd
 from datetime import date
 from src.core.date_handler import check_expiration_column, apply_date_replacement
-from src.core.utils import parse_date
+from src.core.utils import parse_date, parse_date_series
 
 def test_parse_date_formats():
     assert parse_date("01/01/2024") == date(2024, 1, 1)
@@ -40,3 +40,51 @@ def test_apply_date_replacement():
     
     assert df_fixed.iloc[0]['Vencimento'] == '31/12/2025'
     assert df_fixed.iloc[1]['Vencimento'] == '01/01/2099'
+
+def test_parse_date_series_matches_parse_date():
+    valores = ["01/01/2024", "2024-01-01", "01-01-2024", "2024/01/01", "", None,
+               "invalida", date(2024, 1, 1), "01/01/0202", "01/01/2024"]
+    s = pd.Series(valores, dtype=object)
+
+    resultado = parse_date_series(s)
+
+    for v, r in zip(valores, resultado):
+        esperado = parse_date(v)
+        if esperado is None:
+            assert pd.isna(r)
+        else:
+            assert r.date() == esperado
+
+def test_check_expiration_column_datetime_dtype():
+    df = pd.DataFrame({
+        'Nome': ['Cliente A', 'Cliente B'],
+        'Vencimento': pd.to_datetime(['2020-01-01 10:30', '2099-01-01 00:00'])
+    })
+
+    expirados = check_expiration_column(df, 'Vencimento')
+
+    assert len(expirados) == 1
+    assert expirados[0]['Vencimento'] == '01/01/2020'
+
+def test_apply_date_replacement_non_range_index():
+    df = pd.DataFrame({
+        'Nome': ['Cliente A', 'Cliente B', 'Cliente C'],
+        'Vencimento': ['01/01/2099', '01/01/2020', '01/01/2021']
+    }, index=['x', 'y', 'z'])
+
+    expirados = check_expiration_column(df, 'Vencimento')
+    assert [r['Linha'] for r in expirados] == [3, 4]
+
+    df_fixed = apply_date_replacement(df, 'Vencimento', expirados, date(2025, 12, 31))
+
+    assert df_fixed['Vencimento'].tolist() == ['01/01/2099', '31/12/2025', '31/12/2025']
+    assert len(df_fixed) == 3
+
+def test_check_expiration_column_row_offset():
+    df = pd.DataFrame({'Nome': ['A', 'B'], 'Vencimento': ['01/01/2099', '01/01/2020']}, index=[100, 101])
+
+    linhas = check_expiration_column(df, 'Vencimento', row_offset=100)
+
+    assert linhas == [{'Linha': 103, 'Razão Social': 'B', 'Vencimento': '01/01/2020'}]
+    df_fixed = apply_date_replacement(df, 'Vencimento', linhas, date(2099, 5, 2), row_offset=100)
+    assert df_fixed['Vencimento'].tolist() == ['01/01/2099', '02/05/2099']
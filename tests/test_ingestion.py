@@ -0,0 +1,85 @@
+from io import BytesIO
+import pandas as pd
+import pytest
+from benchmarks.datagen import make_spreadsheet, write_spreadsheet
+from src.core.utils import prepare_contexts
+from src.services.ingestion import iter_spreadsheet_chunks, read_spreadsheet, select_columns, sniff_delimiter
+
+def make_wide_sheet(n=4):
+    """Planilha com colunas extras e "Dados bancários" só na posição de fallback (coluna AD)."""
+    data = {'Instalação': [f'00{i:05d}' for i in range(n)], 'Nome': [f'Cliente {i}' for i in range(n)]}
+    for k in range(2, 29):
+        data[f'Extra {k}'] = [f'x{k}'] * n
+    data['Banco (AD)'] = [f'Banco {i}' for i in range(n)]
+    data['Observações'] = ['ignorar'] * n
+    data.update({
+        'CNPJ/CPF': ['012.345.678-90'] * n,
+        'Vencimento': ['01/01/2099'] * n,
+        'Total a pagar': ['R$ 1.500,00'] * n,
+        'Nome Consórcio': ['Consórcio Hube'] * n,
+    })
+    return pd.DataFrame(data)
+
+@pytest.mark.parametrize("suffix", [".csv", ".xlsx"])
+def test_read_spreadsheet_keeps_fallback_positions(tmp_path, suffix):
+    df = make_wide_sheet()
+    path = write_spreadsheet(df, tmp_path / f"base{suffix}")
+
+    loaded = read_spreadsheet(path)
+
+    assert list(loaded.columns[:30]) == list(df.columns[:30])
+    assert "Observações" not in loaded.columns
+    assert loaded['Extra 5'].isna().all()
+    assert loaded['Nome Consórcio'].dtype == "category"
+    ctx = prepare_contexts(loaded)[0]
+    assert ctx["numero_instalacao"] == "0000000"
+    assert ctx["dados_bancarios"] == "Banco 0"
+    assert ctx["cnpj_consorciado"] == "012.345.678-90"
+
+@pytest.mark.parametrize("suffix", [".csv", ".xlsx"])
+def test_read_spreadsheet_matches_full_read(tmp_path, suffix):
+    df = make_spreadsheet(30, aliases=1)
+    path = write_spreadsheet(df, tmp_path / f"base{suffix}")
+
+    projected = prepare_contexts(read_spreadsheet(path), mask_data=True)
+    full = prepare_contexts(read_spreadsheet(path, project=False), mask_data=True)
+
+    for ctx in projected + full:
+        ctx.pop("data_emissao")
+    assert projected == full
+
+def test_read_spreadsheet_from_upload_buffer():
+    buffer = BytesIO("Nome,UF\nAna,SP\nBruno,MG\n".encode("utf-8"))
+
+    loaded = read_spreadsheet(buffer, "upload.CSV")
+
+    assert loaded['Nome'].tolist() == ['Ana', 'Bruno']
+    assert loaded['UF'].tolist() == ['SP', 'MG']
+
+def test_sniff_delimiter():
+    assert sniff_delimiter("﻿Nome;CPF;UF\n".encode("utf-8")) == ";"
+    assert sniff_delimiter(b"Nome\tCPF\n") == "\t"
+    assert sniff_delimiter(b"Nome\n") == ","
+
+def test_select_columns():
+    assert select_columns(['Código', 'Nome', 'Observações', 'UF']) == [0, 1, 3]
+
+@pytest.mark.parametrize("suffix", [".csv", ".xlsx"])
+def test_iter_spreadsheet_chunks_matches_full_read(tmp_path, suffix):
+    path = write_spreadsheet(make_spreadsheet(25), tmp_path / f"base{suffix}")
+
+    chunks = list(iter_spreadsheet_chunks(path, chunksize=10))
+
+    assert [len(c) for c in chunks] == [10, 10, 5]
+    assert list(chunks[2].index) == list(range(20, 25))
+    merged = pd.concat([c.astype(object) for c in chunks])
+    pd.testing.assert_frame_equal(merged, read_spreadsheet(path).astype(object))
+
+@pytest.mark.parametrize("suffix", [".csv", ".xlsx"])
+def test_iter_spreadsheet_chunks_empty_sheet_yields_columns(tmp_path, suffix):
+    path = write_spreadsheet(make_spreadsheet(0).reindex(columns=['Nome', 'UF']), tmp_path / f"vazia{suffix}")
+
+    chunks = list(iter_spreadsheet_chunks(path, chunksize=10))
+
+    assert len(chunks) == 1 and chunks[0].empty
+    assert list(chunks[0].columns) == ['Nome', 'UF']
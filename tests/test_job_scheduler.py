@@ -0,0 +1,109 @@
+import threading
+import pytest
+from src.services.job_scheduler import (
+    JOB_CANCELLED,
+    JOB_DONE,
+    JOB_FAILED,
+    JobScheduler,
+    SchedulerFullError,
+)
+
+@pytest.fixture
+def scheduler():
+    sched = JobScheduler(workers=1, max_queued=10, max_per_user=5, result_ttl=60)
+    yield sched
+    sched.shutdown()
+
+def blocking_target(gate, order=None, name=None):
+    def target(progress):
+        if order is not None:
+            order.append(name)
+        progress(1, 2)
+        gate.wait(5)
+        progress(2, 2)
+        return name
+    return target
+
+def test_jobs_are_served_fairly_across_users(scheduler):
+    gate, order = threading.Event(), []
+    first = scheduler.submit("ana", blocking_target(gate, order, "ana-1"))
+    while first.current == 0:
+        pass
+    jobs = [scheduler.submit("ana", blocking_target(gate, order, f"ana-{k}")) for k in (2, 3)]
+    jobs.append(scheduler.submit("bia", blocking_target(gate, order, "bia-1")))
+
+    assert scheduler.queue_position(jobs[0].id) == 1
+    gate.set()
+    for job in [first, *jobs]:
+        assert scheduler.wait(job.id, timeout=5).status == JOB_DONE
+
+    assert order == ["ana-1", "bia-1", "ana-2", "ana-3"]
+    assert first.result == "ana-1" and first.progress == 1.0
+
+def test_cancel_pending_and_running_jobs(scheduler):
+    gate = threading.Event()
+    running = scheduler.submit("ana", blocking_target(gate))
+    pending = scheduler.submit("ana", blocking_target(gate))
+    while running.current == 0:
+        pass
+
+    assert scheduler.cancel(pending.id)
+    assert pending.status == JOB_CANCELLED
+    assert scheduler.cancel(running.id)
+    gate.set()
+
+    assert scheduler.wait(running.id, timeout=5).status == JOB_CANCELLED
+    assert not scheduler.cancel(running.id)
+
+def test_admission_control():
+    sched = JobScheduler(workers=1, max_queued=2, max_per_user=2, result_ttl=60)
+    gate = threading.Event()
+    try:
+        sched.submit("ana", blocking_target(gate))
+        sched.submit("ana", blocking_target(gate))
+        with pytest.raises(SchedulerFullError):
+            sched.submit("ana", blocking_target(gate))
+        sched.submit("bia", blocking_target(gate))
+        with pytest.raises(SchedulerFullError):
+            sched.submit("caio", blocking_target(gate))
+    finally:
+        gate.set()
+        sched.shutdown()
+
+def test_failed_job_and_result_release(scheduler):
+    def broken(progress):
+        raise ValueError("planilha inválida")
+    released = []
+
+    failed = scheduler.submit("ana", broken)
+    done = scheduler.submit("ana", lambda progress: "zip", on_discard=released.append)
+
+    assert scheduler.wait(failed.id, timeout=5).status == JOB_FAILED
+    assert failed.error == "planilha inválida"
+    assert scheduler.wait(done.id, timeout=5).status == JOB_DONE
+    assert [j.id for j in scheduler.jobs_for_user("ana")] == [failed.id, done.id]
+
+    scheduler.discard(done.id)
+    assert released == ["zip"]
+    assert scheduler.get(done.id) is None
+
+def test_finished_results_expire(scheduler):
+    released = []
+    job = scheduler.submit("ana", lambda progress: "zip", on_discard=released.append)
+    scheduler.wait(job.id, timeout=5)
+    scheduler.result_ttl = -1
+
+    assert scheduler.jobs_for_user("ana") == []
+    assert released == ["zip"]
+
+def test_take_result_hands_off_once(scheduler):
+    released = []
+    job = scheduler.submit("ana", lambda progress: "zip", on_discard=released.append)
+    scheduler.wait(job.id, timeout=5)
+
+    assert scheduler.take_result(job.id) == "zip"
+    assert scheduler.take_result(job.id) is None
+    assert job.result is None and job.result_taken
+    # Entregue: descartar o job não libera de novo o resultado
+    scheduler.discard(job.id)
+    assert released == []
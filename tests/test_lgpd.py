@@ -1,4 +1,5 @@
-from src.core.utils import mask_cpf_cnpj, mask_name, clean_filename_text
+import pandas as pd
+from src.core.utils import mask_cpf_cnpj, mask_name, clean_filename_text, mask_lgpd_series, prepare_context, prepare_contexts
 
 def test_mask_cpf():
     assert mask_cpf_cnpj("123.456.789-01") == "***.***.789-01"
@@ -28,6 +29,33 @@ def test_clean_filename():
     assert clean_filename_text("São Paulo") == "SAO_PAULO"
     assert clean_filename_text("João da Silva") == "JOAO_DA_SILVA"
 
+def test_mask_lgpd_series_matches_scalar_functions():
+    docs = ["123.456.789-01", "12345678000190", "12.345.678/0001-90", "", "abc", "1234", "12.345.678/0001-9"]
+    names = ["Stefan Pratti", "  Maria   da  Silva ", "Hube Ltda", "", "X", "João", "Ana B C"]
+    pairs = [(n, d) for n in names for d in docs]
+    # Índice repetido, como em blocos concatenados da planilha
+    index = [0] * len(pairs)
+    masked_names, masked_docs = mask_lgpd_series(
+        pd.Series([n for n, _ in pairs], index=index), pd.Series([d for _, d in pairs], index=index)
+    )
+    assert list(masked_names) == [mask_name(n, doc=d) for n, d in pairs]
+    assert list(masked_docs) == [mask_cpf_cnpj(d) for _, d in pairs]
+    assert list(masked_names.index) == index
+
+def test_prepare_contexts_masks_like_prepare_context():
+    df = pd.DataFrame({
+        "Nome": ["Stefan Pratti", "Hube Soluções Ltda", None, "Ana Maria"],
+        "CNPJ/CPF": ["123.456.789-01", "12.345.678/0001-90", "123.456.789-01", None],
+        "Total a pagar": ["10,00", "20,00", "30,00", "40,00"],
+    })
+    contexts = prepare_contexts(df, mask_data=True)
+    for (_, row), ctx in zip(df.iterrows(), contexts):
+        expected = prepare_context(row, mask_data=True)
+        assert ctx["razao_social"] == expected["razao_social"]
+        assert ctx["cnpj_consorciado"] == expected["cnpj_consorciado"]
+    assert contexts[0]["razao_social"] == "Stefan ******"
+    assert contexts[1]["razao_social"] == "Hube Soluções Ltda"
+
 if __name__ == "__main__":
     test_mask_cpf()
     test_mask_cnpj()
@@ -0,0 +1,82 @@
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from src.core.logger import (
+    configure_worker_logging,
+    get_worker_log_queue,
+    mask_sensitive,
+    setup_logger,
+    shutdown_logger,
+)
+
+def test_mask_sensitive():
+    assert mask_sensitive("CPF 123.456.789-01 ok") == "CPF ***.***.***-** ok"
+    assert mask_sensitive("doc 12345678901.") == "doc ***********."
+    assert mask_sensitive("CNPJ 12.345.678/0001-90") == "CNPJ **.***.***/****-**"
+    # 14 dígitos seguidos não são um CPF
+    assert mask_sensitive("conta 12345678000190") == "conta 12345678000190"
+
+def test_setup_logger_json_masks_arguments(tmp_path):
+    log_file = tmp_path / "app.log"
+    log = setup_logger("test_json_logger", log_file=log_file, fmt="json")
+    log.info("Cliente %s sem vencimento", "123.456.789-01")
+    shutdown_logger("test_json_logger")
+
+    record = json.loads(log_file.read_text(encoding="utf-8").splitlines()[0])
+    assert record["message"] == "Cliente ***.***.***-** sem vencimento"
+    assert record["level"] == "INFO"
+    assert record["logger"] == "test_json_logger"
+
+def test_setup_logger_invalid_format(tmp_path):
+    with pytest.raises(ValueError):
+        setup_logger("test_invalid_logger", log_file=tmp_path / "app.log", fmt="xml")
+    assert not logging.getLogger("test_invalid_logger").handlers
+
+def _log_from_worker(text):
+    logging.getLogger("test_worker_logger").info(text)
+    return os.getpid()
+
+def test_worker_logs_reach_main_process(tmp_path):
+    log_file = tmp_path / "app.log"
+    setup_logger("test_worker_logger", log_file=log_file, fmt="json")
+    with ProcessPoolExecutor(
+        max_workers=1,
+        initializer=configure_worker_logging,
+        initargs=(get_worker_log_queue("test_worker_logger"), "test_worker_logger")
+    ) as executor:
+        pid = executor.submit(_log_from_worker, "nota do CNPJ 12.345.678/0001-90").result()
+    shutdown_logger("test_worker_logger")
+
+    records = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert records == [{**records[0], "process": pid, "message": "nota do CNPJ **.***.***/****-**"}]
+    assert pid != os.getpid()
+
+def _log_after_fork(name, conn):
+    import src.core.logger as log_module
+    logging.getLogger(name).info("nota do CPF 123.456.789-01 no filho")
+    conn.send((name in log_module._listeners, get_worker_log_queue(name) is not None))
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="requer fork")
+def test_forked_child_sends_records_to_parent_listener(tmp_path):
+    log_file = tmp_path / "app.log"
+    setup_logger("test_fork_logger", log_file=log_file, fmt="json")
+    ctx = multiprocessing.get_context("fork")
+    parent_conn, child_conn = ctx.Pipe()
+    child = ctx.Process(target=_log_after_fork, args=("test_fork_logger", child_conn))
+    child.start()
+    has_listener, has_worker_queue = parent_conn.recv()
+    child.join(timeout=30)
+    shutdown_logger("test_fork_logger")
+
+    # O filho não tem listener próprio (não grava nem rotaciona o arquivo), mas repassa filas a seus workers
+    assert (has_listener, has_worker_queue) == (False, True)
+    records = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert [(r["process"], r["message"]) for r in records] == [(child.pid, "nota do CPF ***.***.***-** no filho")]
+
+def test_get_worker_log_queue_after_shutdown(tmp_path):
+    setup_logger("test_closed_logger", log_file=tmp_path / "app.log")
+    shutdown_logger("test_closed_logger")
+    assert get_worker_log_queue("test_closed_logger") is None
@@ -0,0 +1,99 @@
+import tarfile
+import zipfile
+import pandas as pd
+import pytest
+from src.services.output_sinks import (
+    MANIFEST_NAME,
+    DirectorySink,
+    SplitZipSink,
+    TarSink,
+    ZipSink,
+    create_sink,
+)
+from src.core.utils import prepare_context
+from src.services.zip_builder import generate_notes_zip
+
+TEMPLATE = "<html><body><p>{{ razao_social }}</p></body></html>"
+
+def make_df(n=4):
+    return pd.DataFrame({
+        'Nome': [f'Cliente {i}' for i in range(n)],
+        'CNPJ/CPF': ['123.456.789-01'] * n,
+        'UF': ['SP', 'MG'] * (n // 2),
+        'Vencimento': ['01/01/2099'] * n,
+        'Nº da cobrança': [f'COB{i:04d}' for i in range(n)],
+        'Total a pagar': ['R$ 1.500,00'] * n,
+    })
+
+@pytest.mark.parametrize("compression, expected", [("stored", zipfile.ZIP_STORED), ("deflated", zipfile.ZIP_DEFLATED)])
+def test_zip_sink_compression(compression, expected):
+    with ZipSink(compression=compression) as sink:
+        assert sink.add("a.pdf", b"%PDF-a" * 100) == "a.pdf"
+        sink.write_manifest("linha;status\n")
+
+    with zipfile.ZipFile(sink.result()) as zf:
+        assert [i.compress_type for i in zf.infolist()] == [expected, expected]
+        assert zf.read(MANIFEST_NAME) == b"linha;status\n"
+
+def test_zip_sink_invalid_compression():
+    with pytest.raises(ValueError):
+        ZipSink(compression="lzma")
+
+def test_split_zip_sink_rolls_over_by_notes_and_bytes(tmp_path):
+    with SplitZipSink(tmp_path / "por_nota", max_notes=2) as sink:
+        names = [sink.add(f"{k}.pdf", b"x" * 10) for k in range(5)]
+        sink.write_manifest("ok")
+    assert names[2] == "notas_002.zip/2.pdf"
+    assert [p.name for p in sink.volumes] == ["notas_001.zip", "notas_002.zip", "notas_003.zip"]
+    assert (tmp_path / "por_nota" / MANIFEST_NAME).read_text() == "ok"
+
+    with SplitZipSink(tmp_path / "por_tamanho", max_bytes=25) as sink:
+        names = [sink.add(f"{k}.pdf", b"x" * size) for k, size in enumerate([10, 10, 10, 40])]
+    assert [n.split("/")[0] for n in names] == ["notas_001.zip", "notas_001.zip", "notas_002.zip", "notas_003.zip"]
+    with zipfile.ZipFile(sink.volumes[0]) as zf:
+        assert zf.namelist() == ["0.pdf", "1.pdf"]
+
+def test_directory_sink_partitions_and_keeps_duplicates(tmp_path):
+    with DirectorySink(tmp_path, partition="uf") as sink:
+        first = sink.add("NOTA.pdf", b"1", {"uf": "SP"})
+        second = sink.add("NOTA.pdf", b"2", {"uf": "SP"})
+        other = sink.add("NOTA.pdf", b"3", {"uf": ""})
+
+    assert (first, second, other) == ("SP/NOTA.pdf", "SP/NOTA_2.pdf", "SEM_UF/NOTA.pdf")
+    assert (tmp_path / "SP" / "NOTA_2.pdf").read_bytes() == b"2"
+
+def test_tar_sink():
+    with TarSink() as sink:
+        sink.add("a.pdf", b"%PDF")
+        sink.write_manifest("ok")
+
+    with tarfile.open(fileobj=sink.result()) as tar:
+        assert tar.getnames() == ["a.pdf", MANIFEST_NAME]
+        assert tar.extractfile("a.pdf").read() == b"%PDF"
+
+def test_create_sink_requires_directory():
+    with pytest.raises(ValueError):
+        create_sink("dir")
+    with pytest.raises(ValueError):
+        create_sink("nuvem", "saida")
+
+def test_generate_notes_zip_with_directory_sink(tmp_path):
+    root, relatorio, erros = generate_notes_zip(
+        make_df(), TEMPLATE, workers=1, sink=DirectorySink(tmp_path / "notas", partition="uf")
+    )
+
+    assert erros == []
+    assert root == tmp_path / "notas"
+    assert [r['nome_arquivo_pdf'].split("/")[0] for r in relatorio] == ["SP", "MG", "SP", "MG"]
+    for r in relatorio:
+        assert (root / r['nome_arquivo_pdf']).read_bytes().startswith(b"%PDF")
+    manifest = pd.read_csv(root / MANIFEST_NAME, sep=";")
+    assert manifest['nome_arquivo_pdf'].tolist() == [r['nome_arquivo_pdf'] for r in relatorio]
+
+def test_partition_field_stays_out_of_template_context():
+    assert "uf" not in prepare_context(make_df().iloc[0])
+
+def test_output_sink_is_abstract():
+    from src.services.output_sinks import OutputSink
+    with pytest.raises(TypeError):
+        OutputSink()
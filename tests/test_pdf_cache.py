@@ -0,0 +1,81 @@
+import os
+import zipfile
+import pandas as pd
+import pytest
+from config.settings import settings
+from src.services.pdf_cache import PdfCache, get_pdf_cache, make_cache_key
+from src.services.zip_builder import generate_notes_zip
+from tests.test_zip_builder import TEMPLATE, make_df
+
+@pytest.fixture
+def pdf_cache_on(monkeypatch):
+    monkeypatch.setattr(settings, "PDF_CACHE_ENABLED", True)
+    return settings.PDF_CACHE_DIR
+
+def test_pdf_cache_evicts_least_recently_used(tmp_path):
+    cache = PdfCache(tmp_path, max_bytes=250)
+    cache.put("aa01", b"x" * 100)
+    cache.put("bb02", b"x" * 100)
+    assert cache.get("aa01") == b"x" * 100  # aa01 passa a ser o mais recente
+
+    cache.put("cc03", b"x" * 100)
+
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") is not None and cache.get("cc03") is not None
+    assert cache.stats()["descartes"] == 1
+    assert not (tmp_path / "bb" / "bb02.pdf").exists()
+
+def test_pdf_cache_index_survives_new_instance(tmp_path):
+    first = PdfCache(tmp_path, max_bytes=250)
+    first.put("aa01", b"x" * 100)
+    first.put("bb02", b"x" * 100)
+    # Acesso mais antigo em aa01 (mtime), como se tivesse sido usado antes
+    os.utime(tmp_path / "aa" / "aa01.pdf", (1, 1))
+
+    second = PdfCache(tmp_path, max_bytes=250)
+    second.put("cc03", b"x" * 100)
+
+    assert second.get("aa01") is None
+    assert second.get("bb02") == b"x" * 100
+
+def test_make_cache_key_depends_on_context_and_mask():
+    ctx = {"razao_social": "Cliente", "total_pagar": "R$ 1,00"}
+    key = make_cache_key("ns", ctx, True)
+
+    assert key == make_cache_key("ns", dict(reversed(list(ctx.items()))), True)
+    assert key != make_cache_key("ns", ctx, False)
+    assert key != make_cache_key("outro", ctx, True)
+    assert key != make_cache_key("ns", {**ctx, "total_pagar": "R$ 2,00"}, True)
+
+def test_generate_notes_zip_reuses_cached_pdfs(pdf_cache_on):
+    df = make_df(4)
+    _, rel1, _ = generate_notes_zip(df, TEMPLATE, workers=1)
+    assert [r["cache_pdf"] for r in rel1] == ["FALHA"] * 4
+
+    df.loc[2, "Total a pagar"] = "R$ 9.999,00"
+    buf, rel2, _ = generate_notes_zip(df, TEMPLATE, workers=1)
+
+    assert [r["cache_pdf"] for r in rel2] == ["ACERTO", "ACERTO", "FALHA", "ACERTO"]
+    with zipfile.ZipFile(buf) as zf:
+        csv = pd.read_csv(zf.open("relatorio_processamento.csv"), sep=";", encoding="utf-8-sig")
+        assert list(csv["cache_pdf"]) == ["ACERTO", "ACERTO", "FALHA", "ACERTO"]
+        assert all(zf.read(r["nome_arquivo_pdf"]).startswith(b"%PDF") for r in rel2)
+
+    # Mascaramento diferente gera outra chave
+    _, rel3, _ = generate_notes_zip(df, TEMPLATE, workers=1, mask_data=False)
+    assert [r["cache_pdf"] for r in rel3] == ["FALHA"] * 4
+
+def test_generate_notes_zip_parallel_uses_cache(pdf_cache_on):
+    df = make_df(4)
+    _, rel_s, _ = generate_notes_zip(df, TEMPLATE, workers=1)
+    _, rel_p, _ = generate_notes_zip(df, TEMPLATE, workers=2)
+
+    assert [r["cache_pdf"] for r in rel_p] == ["ACERTO"] * 4
+    assert [r["nome_arquivo_pdf"] for r in rel_p] == [r["nome_arquivo_pdf"] for r in rel_s]
+
+def test_pdf_cache_disabled_writes_nothing():
+    _, rel, _ = generate_notes_zip(make_df(2), TEMPLATE, workers=1, use_cache=True)
+
+    assert get_pdf_cache() is None
+    assert "cache_pdf" not in rel[0]
+    assert not settings.PDF_CACHE_DIR.exists()
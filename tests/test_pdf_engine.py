@@ -0,0 +1,246 @@
+import os
+import pytest
+from io import BytesIO
+from config.settings import settings
+from src.services.pdf_engine import (
+    get_compiled_template,
+    get_template_stats,
+    clear_template_cache,
+    list_templates,
+    optimize_template_html,
+    generate_pdf,
+    generate_pdf_native,
+    get_html_template,
+    resolve_pdf_engine,
+    resolve_asset,
+    clear_asset_cache,
+    get_asset_stats,
+    AssetError
+)
+
+@pytest.fixture
+def templates_dir(tmp_path, monkeypatch):
+    tpl_dir = tmp_path / "templates"
+    tpl_dir.mkdir()
+    monkeypatch.setattr(settings, "TEMPLATES_DIR", tpl_dir)
+    monkeypatch.setattr(settings, "TEMPLATE_CACHE_DIR", tmp_path / "cache")
+    clear_template_cache()
+    yield tpl_dir
+    clear_template_cache()
+
+def test_compiled_template_is_reused(templates_dir):
+    (templates_dir / "nota.html").write_text("<p>{{ razao_social }}</p>", encoding="utf-8")
+
+    t1 = get_compiled_template("nota.html")
+    t2 = get_compiled_template("nota.html")
+
+    assert t1 is t2
+    assert t1.render(razao_social="Hube") == "<p>Hube</p>"
+    stats = get_template_stats()
+    assert stats["compilacoes"] == 1
+    assert stats["acertos_memoria"] == 1
+
+def test_compiled_template_reloads_on_mtime_change(templates_dir):
+    path = templates_dir / "nota.html"
+    path.write_text("<p>v1</p>", encoding="utf-8")
+    assert get_compiled_template("nota.html").render() == "<p>v1</p>"
+
+    path.write_text("<p>v2</p>", encoding="utf-8")
+    mtime = path.stat().st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+    assert get_compiled_template("nota.html").render() == "<p>v2</p>"
+    assert get_template_stats()["compilacoes"] == 2
+
+def test_bytecode_cache_survives_new_environment(templates_dir):
+    (templates_dir / "nota.html").write_text("<p>{{ uf }}</p>", encoding="utf-8")
+    get_compiled_template("nota.html")
+
+    # Simula um novo processo: Environment descartado, bytecode em disco mantido
+    clear_template_cache()
+    template = get_compiled_template("nota.html")
+
+    assert template.render(uf="SP") == "<p>SP</p>"
+    stats = get_template_stats()
+    assert stats["acertos_bytecode"] == 1
+    assert stats["compilacoes"] == 0
+
+def test_missing_template_renders_error_page(templates_dir):
+    html = get_compiled_template("inexistente.html").render()
+    assert "Template não encontrado" in html
+
+def test_list_templates_refreshes_when_dir_changes(templates_dir):
+    (templates_dir / "b.html").write_text("", encoding="utf-8")
+    assert list_templates() == ["b.html"]
+
+    (templates_dir / "a.html").write_text("", encoding="utf-8")
+    mtime = templates_dir.stat().st_mtime + 10
+    os.utime(templates_dir, (mtime, mtime))
+
+    assert list_templates() == ["a.html", "b.html"]
+
+def test_optimize_template_html_minifies():
+    html = (
+        "<html><head><!-- comentário --><style>\n"
+        "  /* layout */\n  @page { size: A4; margin: 1cm; }\n  body { color: #000; }\n"
+        "</style></head>\n  <body>{{ nome }}</body></html>"
+    )
+    out = optimize_template_html(html)
+
+    assert "comentário" not in out and "layout" not in out
+    assert "<style>@page{size: A4;margin: 1cm;}body{color: #000;}</style>" in out
+    assert "{{ nome }}" in out
+
+def test_optimize_template_html_keeps_jinja_in_style():
+    html = "<style>body { color: {{ cor }}; }</style>"
+    assert optimize_template_html(html) == html
+
+@pytest.mark.parametrize("template_name", ["Modelo_Padrao_Hube.html", "Modelo_Simples_Hube.html"])
+def test_optimized_pdf_matches_original_text(template_name):
+    pypdf = pytest.importorskip("pypdf")
+    from jinja2 import Template
+    from src.core.utils import prepare_contexts
+    from tests.test_zip_builder import make_df
+
+    ctx = prepare_contexts(make_df(1))[0]
+
+    original, _ = generate_pdf(Template(get_html_template(template_name)).render(**ctx))
+    template = get_compiled_template(template_name)
+    optimized = [generate_pdf(template.render(**ctx))[0] for _ in range(2)]
+
+    def extract(pdf_bytes):
+        reader = pypdf.PdfReader(BytesIO(pdf_bytes))
+        return [" ".join(page.extract_text().split()) for page in reader.pages]
+
+    expected = extract(original)
+    assert expected and expected[0]
+    for pdf_bytes in optimized:
+        assert extract(pdf_bytes) == expected
+
+NATIVE_CTX = {
+    "nome_consorcio": "Consórcio Hube & Cia",
+    "endereco_consorcio": "Av. Paulista, 1000 - São Paulo/SP",
+    "cnpj_consorcio": "12.345.678/0001-90",
+    "dados_bancarios": "Banco do Brasil\nAgência 1234-5 Conta 67890-1\nPIX: financeiro@hube.com.br",
+}
+
+@pytest.mark.parametrize("template_name", ["Modelo_Padrao_Hube.html", "Modelo_Simples_Hube.html"])
+def test_native_layout_matches_xhtml2pdf_text(template_name):
+    pypdf = pytest.importorskip("pypdf")
+    from collections import Counter
+    from jinja2 import Template
+    from src.core.utils import prepare_contexts
+    from tests.test_zip_builder import make_df
+
+    ctx = {**prepare_contexts(make_df(1))[0], **NATIVE_CTX}
+    html_pdf, _ = generate_pdf(Template(get_html_template(template_name)).render(**ctx))
+    native_pdf, err = generate_pdf_native(template_name, ctx)
+    assert err is None
+
+    def extract(pdf_bytes):
+        reader = pypdf.PdfReader(BytesIO(pdf_bytes))
+        return len(reader.pages), Counter(" ".join(p.extract_text() for p in reader.pages).split())
+
+    # Mesmas palavras e mesmo nº de páginas (a posição exata das quebras de linha pode variar)
+    assert extract(native_pdf) == extract(html_pdf)
+    # Saída determinística: o mesmo contexto gera os mesmos bytes
+    assert generate_pdf_native(template_name, ctx)[0] == native_pdf
+
+def test_resolve_pdf_engine(monkeypatch):
+    # Layout nativo só quando pedido
+    assert resolve_pdf_engine("Modelo_Padrao_Hube.html") == "xhtml2pdf"
+    assert resolve_pdf_engine("Modelo_Padrao_Hube.html", "reportlab") == "reportlab"
+    assert resolve_pdf_engine("Modelo_Padrao_Hube.html", "auto") == "reportlab"
+    assert resolve_pdf_engine("Modelo_Padrao_Hube.html", "xhtml2pdf") == "xhtml2pdf"
+    assert resolve_pdf_engine("Personalizado.html", "reportlab") == "xhtml2pdf"
+    assert resolve_pdf_engine(None) == "xhtml2pdf"
+
+    monkeypatch.setattr(settings, "PDF_ENGINE", "auto")
+    monkeypatch.setattr(settings, "PDF_ENGINE_TEMPLATES", {"Modelo_Simples_Hube.html": "xhtml2pdf"})
+    assert resolve_pdf_engine("Modelo_Simples_Hube.html") == "xhtml2pdf"
+    assert resolve_pdf_engine("Modelo_Padrao_Hube.html") == "reportlab"
+
+    with pytest.raises(ValueError):
+        resolve_pdf_engine("Modelo_Padrao_Hube.html", "wkhtmltopdf")
+
+def test_edited_builtin_template_falls_back_to_xhtml2pdf(templates_dir):
+    source = (settings.BASE_DIR / "templates" / "Modelo_Simples_Hube.html").read_text(encoding="utf-8")
+    path = templates_dir / "Modelo_Simples_Hube.html"
+
+    # Só indentação/quebras de linha diferentes: ainda é o mesmo layout
+    path.write_text(source.replace("\n", "\r\n    "), encoding="utf-8")
+    assert resolve_pdf_engine("Modelo_Simples_Hube.html", "auto") == "reportlab"
+
+    path.write_text(source.replace("Aviso de Débito", "Nota de Débito"), encoding="utf-8")
+    mtime = path.stat().st_mtime + 10
+    os.utime(path, (mtime, mtime))
+    assert resolve_pdf_engine("Modelo_Simples_Hube.html", "auto") == "xhtml2pdf"
+
+@pytest.fixture
+def asset_dir(templates_dir):
+    from PIL import Image
+    import reportlab
+    from pathlib import Path
+    Image.new("RGB", (60, 20), (0, 128, 96)).save(templates_dir / "logo.png")
+    font = Path(reportlab.__file__).parent / "fonts" / "Vera.ttf"
+    (templates_dir / "Vera.ttf").write_bytes(font.read_bytes())
+    clear_asset_cache()
+    yield templates_dir
+    clear_asset_cache()
+
+def test_resolve_asset_reads_images_from_templates_dir(asset_dir):
+    data = resolve_asset("logo.png")
+    assert data == (asset_dir / "logo.png").read_bytes()
+    assert resolve_asset("file:logo.png") is data
+    assert resolve_asset("Vera.ttf") == str((asset_dir / "Vera.ttf").resolve())
+    assert resolve_asset("data:image/png;base64,AAAA") is None
+    stats = get_asset_stats()
+    assert stats["leituras"] == 1 and stats["acertos"] == 1
+
+def test_resolve_asset_blocks_remote_and_outside_paths(asset_dir):
+    for uri in ("https://exemplo.com/logo.png", "//exemplo.com/logo.png", "http://x/y.ttf"):
+        with pytest.raises(AssetError, match="remoto"):
+            resolve_asset(uri)
+    with pytest.raises(AssetError, match="fora da pasta"):
+        resolve_asset("../segredo.png")
+    with pytest.raises(AssetError, match="não encontrado"):
+        resolve_asset("ausente.png")
+
+def test_generate_pdf_with_logo_and_font_loads_assets_once(asset_dir):
+    html = (
+        "<html><head><style>@font-face { font-family: Vera; src: url(Vera.ttf); }"
+        " body { font-family: Vera; }</style></head>"
+        '<body><img src="logo.png" width="60" height="20"/><p>Nota</p></body></html>'
+    )
+    for _ in range(3):
+        pdf, err = generate_pdf(html)
+        assert err is None
+        assert b"Vera" in pdf
+    stats = get_asset_stats()
+    assert stats["leituras"] == 1
+    assert stats["fontes_carregadas"] <= 1
+    # O cache de fontes só vale durante generate_pdf: o xhtml2pdf do processo fica intacto
+    from xhtml2pdf import context as pisa_context
+    from reportlab.pdfbase.ttfonts import TTFont
+    assert pisa_context.TTFont is TTFont
+
+def test_image_cache_evicts_least_recently_used(asset_dir, monkeypatch):
+    from PIL import Image
+    from src.services import pdf_engine
+    monkeypatch.setattr(pdf_engine, "_ASSET_CACHE_MAX", 2)
+    for name in ("a.png", "b.png", "c.png"):
+        Image.new("RGB", (4, 4)).save(asset_dir / name)
+
+    resolve_asset("a.png")
+    resolve_asset("b.png")
+    resolve_asset("a.png")  # a passa a ser a mais recente
+    resolve_asset("c.png")  # descarta b, não o cache inteiro
+    resolve_asset("a.png")
+    stats = get_asset_stats()
+    assert stats["imagens"] == 2
+    assert (stats["leituras"], stats["acertos"]) == (3, 2)
+
+def test_generate_pdf_with_remote_asset_returns_error(asset_dir):
+    pdf, err = generate_pdf('<html><body><img src="https://exemplo.com/logo.png"/></body></html>')
+    assert pdf is None
+    assert "remoto" in err
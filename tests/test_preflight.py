@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from config.settings import settings
+from src.services.pdf_engine import clear_template_cache
+from src.services.preflight import run_preflight
+
+def make_sheet(n=6):
+    return pd.DataFrame({
+        'Nome': [f'Cliente {i}' for i in range(n)],
+        'CNPJ/CPF': ['123.456.789-01'] * n,
+        'Nº da cobrança': [f'COB{i:04d}' for i in range(n)],
+        'Vencimento': ['01/01/2099'] * n,
+        'Total a pagar': ['R$ 10,00'] * n,
+    })
+
+@pytest.fixture
+def templates_dir(tmp_path, monkeypatch):
+    tpl_dir = tmp_path / "templates"
+    tpl_dir.mkdir()
+    monkeypatch.setattr(settings, "TEMPLATES_DIR", tpl_dir)
+    monkeypatch.setattr(settings, "TEMPLATE_CACHE_DIR", tmp_path / "cache")
+    clear_template_cache()
+    yield tpl_dir
+    clear_template_cache()
+
+def test_preflight_estimates_time_and_size(templates_dir):
+    (templates_dir / "nota.html").write_text(
+        "<html><body><p>{{ razao_social }} - {{ total_pagar }}</p></body></html>", encoding="utf-8"
+    )
+    report = run_preflight(make_sheet(), "nota.html", workers=2, sample_rows=3)
+
+    assert report.ok
+    assert report.engine == "xhtml2pdf"
+    assert len(report.sample_ms) == 3
+    assert report.estimated_seconds == pytest.approx(report.ms_per_note / 1000 * 6 / 2)
+    assert report.estimated_pdf_bytes > 0 and report.estimated_zip_bytes > 0
+    assert report.validated_rows == 6
+
+def test_preflight_reports_undefined_variables(templates_dir):
+    (templates_dir / "nota.html").write_text(
+        "<p>{{ razao_socail }}{% for i in range(2) %}{{ i }}{% endfor %}</p>", encoding="utf-8"
+    )
+    report = run_preflight(make_sheet(), "nota.html", sample_rows=1)
+
+    assert report.undefined_vars == ["razao_socail"]
+    assert not report.ok
+    # Com StrictUndefined todas as linhas falham: no lote sairiam com o campo em branco
+    assert report.estimated_failures == 6
+    assert "razao_socail" in report.failed_rows[0]["mensagem_erro"]
+
+def test_preflight_predicts_failing_rows(templates_dir):
+    (templates_dir / "nota.html").write_text(
+        "{% if numero_cobranca == 'COB0003' %}{{ 1 / 0 }}{% endif %}<p>{{ razao_social }}</p>", encoding="utf-8"
+    )
+    # Índice que não é RangeIndex: a linha da planilha vem da posição
+    report = run_preflight(make_sheet().set_axis(list("abcdef")), "nota.html", sample_rows=2, validate_rows=0)
+
+    assert report.undefined_vars == []
+    assert [f["linha_planilha"] for f in report.failed_rows] == [5]
+    assert "Linhas com erro previsto: 1" in "\n".join(report.summary_lines())
+
+def test_preflight_native_engine_skips_html_checks():
+    report = run_preflight(make_sheet(3), "Modelo_Padrao_Hube.html", engine="reportlab", sample_rows=2)
+    assert report.engine == "reportlab"
+    assert report.ok
+    assert len(report.sample_ms) == 2
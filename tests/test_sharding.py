@@ -0,0 +1,197 @@
+import multiprocessing
+import time
+import zipfile
+import pandas as pd
+import pytest
+from src.services.output_sinks import MANIFEST_NAME, ZipSink
+from src.services.pdf_engine import get_compiled_template
+from src.services.sharding import (
+    SHARD_DONE,
+    SHARD_FAILED,
+    SHARD_LEASED,
+    SHARD_PENDING,
+    ShardLeaseLostError,
+    ShardQueueError,
+    claim_shard,
+    finish_shard,
+    list_shards,
+    merge_shards,
+    process_shard,
+    publish_shards,
+    queue_status,
+    renew_lease,
+    run_worker,
+)
+from src.services.zip_builder import generate_notes_zip
+from src.shard_cli import main
+from src.cli import EXIT_OK
+from tests.test_cli import make_sheet as make_full_sheet
+
+PARAMS = {"template": "Modelo_Padrao_Hube.html", "lgpd": True, "engine": "reportlab"}
+
+def make_sheet(n=7):
+    return pd.DataFrame({
+        'Nome': [f'Cliente {i}' for i in range(n)],
+        'CNPJ/CPF': ['123.456.789-01'] * n,
+        'Nº da cobrança': [f'COB{i:04d}' for i in range(n)],
+        'Vencimento': ['01/01/2099'] * n,
+        'Total a pagar': ['R$ 10,00'] * n,
+    })
+
+def test_publish_splits_rows(tmp_path):
+    df = make_sheet(7)
+    # Blocos de tamanhos diferentes do shard, como na leitura em blocos
+    assert publish_shards(tmp_path, [df.iloc[:2], df.iloc[2:6], df.iloc[6:]], PARAMS, shard_rows=3) == 3
+
+    shards = list_shards(tmp_path)
+    assert [(s.name, s.rows, s.row_offset, s.status) for s in shards] == [
+        ("shard_0001", 3, 0, SHARD_PENDING), ("shard_0002", 3, 3, SHARD_PENDING), ("shard_0003", 1, 6, SHARD_PENDING),
+    ]
+    rows = pd.read_csv(tmp_path / "entrada" / "shard_0002.csv", dtype=str)
+    assert rows["Nº da cobrança"].tolist() == ["COB0003", "COB0004", "COB0005"]
+    assert queue_status(tmp_path)["linhas"] == 7
+    with pytest.raises(ShardQueueError):
+        publish_shards(tmp_path, df, PARAMS)
+
+def test_lease_expiry_hands_shard_to_another_worker(tmp_path):
+    publish_shards(tmp_path, make_sheet(2), PARAMS, shard_rows=2)
+
+    shard = claim_shard(tmp_path, "a", lease_seconds=60)
+    assert shard.status == SHARD_LEASED and shard.attempts == 1
+    assert claim_shard(tmp_path, "b") is None
+
+    # Worker "a" para de renovar: a posse expira e "b" assume o shard
+    assert renew_lease(tmp_path, shard, "a", lease_seconds=-1)
+    taken = claim_shard(tmp_path, "b", lease_seconds=60)
+    assert (taken.name, taken.worker, taken.attempts) == ("shard_0001", "b", 2)
+    assert not renew_lease(tmp_path, shard, "a")
+    assert not finish_shard(tmp_path, shard, "a")
+    assert finish_shard(tmp_path, taken, "b")
+    assert list_shards(tmp_path)[0].status == SHARD_DONE
+
+def test_shard_fails_after_max_attempts(tmp_path):
+    publish_shards(tmp_path, make_sheet(2), PARAMS, shard_rows=2)
+    shard = claim_shard(tmp_path, "a", max_attempts=2)
+    assert finish_shard(tmp_path, shard, "a", error="boom", max_attempts=2)
+    assert list_shards(tmp_path)[0].status == SHARD_PENDING
+
+    # Segunda tentativa abandonada: esgota as tentativas
+    claim_shard(tmp_path, "b", lease_seconds=-1, max_attempts=2)
+    assert claim_shard(tmp_path, "c", max_attempts=2) is None
+    failed = list_shards(tmp_path)[0]
+    assert failed.status == SHARD_FAILED and "2 tentativa" in failed.error
+    assert queue_status(tmp_path)["finalizada"]
+
+def test_abandoned_shard_resumes_from_job_dir(tmp_path):
+    publish_shards(tmp_path, make_sheet(4), PARAMS, shard_rows=4)
+    shard = claim_shard(tmp_path, "a", lease_seconds=60)
+
+    def crash(current, total):
+        if current == 3:
+            raise KeyboardInterrupt  # queda do worker no meio do shard
+    with pytest.raises(KeyboardInterrupt):
+        process_shard(tmp_path, shard, "a", PARAMS, workers=1, progress_callback=crash)
+    renew_lease(tmp_path, shard, "a", lease_seconds=-1)
+
+    assert run_worker(tmp_path, worker_id="b", workers=1) == {"shards": 1, "notas": 2, "erros": 0}
+    _, relatorio = merge_shards(tmp_path, ZipSink())
+    assert [r["linha_planilha"] for r in relatorio] == [2, 3, 4, 5]
+    assert all(r["status"] == "SUCESSO" for r in relatorio)
+
+def test_heartbeat_keeps_lease_during_slow_note(tmp_path):
+    publish_shards(tmp_path, make_sheet(2), PARAMS, shard_rows=2)
+    shard = claim_shard(tmp_path, "a", lease_seconds=0.6)
+    claimed_by_other = []
+
+    def slow(current, total):
+        if current == 1:
+            time.sleep(1.2)  # nota lenta: o callback de progresso não é chamado por duas posses
+            claimed_by_other.append(claim_shard(tmp_path, "b"))
+    relatorio = process_shard(tmp_path, shard, "a", PARAMS, workers=1, lease_seconds=0.6, progress_callback=slow)
+
+    assert claimed_by_other == [None]
+    assert len(relatorio) == 2 and finish_shard(tmp_path, shard, "a")
+
+def test_lost_lease_stops_generation(tmp_path):
+    publish_shards(tmp_path, make_sheet(3), PARAMS, shard_rows=3)
+    shard = claim_shard(tmp_path, "a", lease_seconds=60)
+
+    def taken_over(current, total):
+        if current == 1:
+            renew_lease(tmp_path, shard, "a", lease_seconds=-1)
+            assert claim_shard(tmp_path, "b", lease_seconds=60) is not None
+            time.sleep(0.5)
+    with pytest.raises(ShardLeaseLostError):
+        process_shard(tmp_path, shard, "a", PARAMS, workers=1, lease_seconds=0.3, progress_callback=taken_over)
+
+def test_shard_rows_render_like_the_sheet(tmp_path):
+    df = make_sheet(3)
+    df["Vencimento"] = pd.to_datetime(["2099-01-01", "2099-02-01", "2099-03-01"])
+    df["Total a pagar"] = [1500.5, None, 7]
+    df["CNPJ/CPF"] = ["012.345.678-90", None, "98765432100"]
+    publish_shards(tmp_path, df, PARAMS, shard_rows=2)
+    run_worker(tmp_path, worker_id="a", workers=1)
+    _, relatorio = merge_shards(tmp_path, ZipSink())
+
+    _, esperado, _ = generate_notes_zip(df, get_compiled_template(PARAMS["template"]), engine="reportlab")
+    assert relatorio == esperado
+
+def _work(spool, worker_id):
+    run_worker(spool, worker_id=worker_id, workers=1, wait=True, poll_seconds=0.05)
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="requer fork")
+def test_several_local_workers_and_merge(tmp_path):
+    spool = tmp_path / "spool"
+    publish_shards(spool, make_sheet(9), PARAMS, shard_rows=2)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_work, args=(spool, f"w{n}")) for n in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=120)
+    assert all(p.exitcode == 0 for p in procs)
+
+    shards = list_shards(spool)
+    assert all(s.status == SHARD_DONE for s in shards) and len(shards) == 5
+    out = tmp_path / "notas.zip"
+    with open(out, "w+b") as f:
+        _, relatorio = merge_shards(spool, ZipSink(f))
+    assert [r["linha_planilha"] for r in relatorio] == list(range(2, 11))
+    with zipfile.ZipFile(out) as zf:
+        names = zf.namelist()
+    assert MANIFEST_NAME in names and len(names) == 10
+
+def test_merge_requires_all_shards_unless_incomplete_allowed(tmp_path):
+    publish_shards(tmp_path, make_sheet(4), PARAMS, shard_rows=2)
+    first = claim_shard(tmp_path, "a")
+    process_shard(tmp_path, first, "a", PARAMS, workers=1)
+    finish_shard(tmp_path, first, "a")
+    second = claim_shard(tmp_path, "a")
+    finish_shard(tmp_path, second, "a", error="sem memória", max_attempts=1)
+
+    with pytest.raises(ShardQueueError, match="shard_0002"):
+        merge_shards(tmp_path, ZipSink())
+    _, relatorio = merge_shards(tmp_path, ZipSink(), allow_incomplete=True)
+    assert [r["status"] for r in relatorio] == ["SUCESSO", "SUCESSO", "ERRO", "ERRO"]
+    assert relatorio[2]["mensagem_erro"] == "Shard shard_0002 não concluído: sem memória"
+
+def test_shard_cli_publish_work_merge(tmp_path, capsys):
+    sheet = tmp_path / "base.csv"
+    make_full_sheet(5).to_csv(sheet, index=False, sep=";")
+    spool = tmp_path / "spool"
+    out = tmp_path / "notas.zip"
+
+    assert main([
+        "publish", str(sheet), "--spool", str(spool), "--shard-rows", "2", "--engine", "reportlab",
+        "--expired", "replace", "--new-date", "05/02/2099",
+    ]) == EXIT_OK
+    assert main(["work", "--spool", str(spool), "--workers", "1", "--quiet"]) == EXIT_OK
+    assert main(["status", "--spool", str(spool)]) == EXIT_OK
+    assert main(["merge", "--spool", str(spool), "-o", str(out)]) == EXIT_OK
+    saida = capsys.readouterr().out
+    assert "3 shard(s) publicado(s)" in saida
+    assert "1 vencimento(s) expirado(s) substituído(s) por 05/02/2099" in saida
+    assert "CONCLUIDO: 3" in saida
+    assert "Arquivo final: 5/5 nota(s)" in saida
+    with zipfile.ZipFile(out) as zf:
+        assert len(zf.namelist()) == 6
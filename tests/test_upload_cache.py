@@ -0,0 +1,68 @@
+import pytest
+from config.settings import settings
+from src.services import upload_cache
+from src.services.upload_cache import clear_upload_cache, get_preview, get_upload_cache_stats, load_upload
+
+def csv_bytes(nome="Ana", vencimento="01/01/2020", total="R$ 10,00"):
+    header = "Nome;Endereço;UF;CNPJ/CPF;Número da conta;Mês de Referência;Vencimento;Total a pagar;Dados bancários"
+    row = f"{nome};Rua A;SP;123.456.789-01;0001;12/2098;{vencimento};{total};Banco X"
+    return f"{header}\n{row}\n{row}\n".encode("utf-8")
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_upload_cache()
+    yield
+    clear_upload_cache()
+
+def test_load_upload_reuses_parsed_data():
+    first = load_upload(csv_bytes(), "base.csv")
+    again = load_upload(csv_bytes(), "base.csv")
+
+    assert again is first
+    assert first.missing_cols == []
+    assert first.col_vencimento == "Vencimento"
+    assert [r["Linha"] for r in first.linhas_expiradas] == [2, 3]
+    assert first.total_consolidado == 20.0 and first.total_invalidos == 0
+    stats = get_upload_cache_stats()
+    assert (stats["acertos"], stats["falhas"]) == (1, 1)
+
+def test_load_upload_key_is_content(monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CACHE_ENTRIES", 2)
+
+    a = load_upload(csv_bytes("Ana"), "base.csv")
+    b = load_upload(csv_bytes("Bia"), "base.csv")
+    load_upload(csv_bytes("Caio"), "base.csv")
+
+    assert b is not a
+    assert load_upload(csv_bytes("Bia"), "outro_nome.csv") is b
+    # "Ana" foi a menos usada recentemente e saiu do cache
+    assert load_upload(csv_bytes("Ana"), "base.csv") is not a
+    assert get_upload_cache_stats()["planilhas"] == 2
+
+def test_load_upload_ttl(monkeypatch):
+    first = load_upload(csv_bytes(), "base.csv")
+    monkeypatch.setattr(settings, "UPLOAD_CACHE_TTL_SECONDS", -1)
+
+    assert load_upload(csv_bytes(), "base.csv") is not first
+
+def test_get_preview_cached_per_option():
+    upload = load_upload(csv_bytes(), "base.csv")
+
+    masked = get_preview(upload, upload.df, True)
+    assert get_preview(upload, upload.df, True) is masked
+    plain = get_preview(upload, upload.df, False)
+
+    assert plain.loc[0, "razao_social"] == "Ana"
+    assert masked.loc[0, "cnpj_consorciado"] != plain.loc[0, "cnpj_consorciado"]
+    assert "_raw_total" not in masked.columns
+
+def test_get_preview_keeps_most_recent_variants(monkeypatch):
+    monkeypatch.setattr(upload_cache, "PREVIEW_CACHE_ENTRIES", 2)
+    upload = load_upload(csv_bytes(), "base.csv")
+
+    first = get_preview(upload, upload.df, True, variant="a")
+    get_preview(upload, upload.df, True, variant="b")
+    assert get_preview(upload, upload.df, True, variant="a") is first
+    get_preview(upload, upload.df, True, variant="c")
+
+    assert list(upload.previews) == [(True, "a"), (True, "c")]
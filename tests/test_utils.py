@@ -1,11 +1,20 @@
 import pytest
 import pandas as pd
+import numpy as np
 from src.core.utils import (
     sanitize_text,
     format_currency,
     parse_currency,
+    parse_currency_series,
+    format_currency_series,
     clean_filename_text,
-    prepare_context
+    prepare_context,
+    prepare_contexts,
+    compile_context_plan,
+    normalize_col_name,
+    clear_text_caches,
+    get_text_cache_stats,
+    format_text_cache_hit_rates
 )
 
 # Testes para sanitize_text
@@ -18,6 +27,27 @@ def test_sanitize_text_none():
 def test_sanitize_text_special_chars():
     # Testa caracteres que poderiam quebrar
     assert "café" in sanitize_text("café") 
+
+def test_sanitize_text_strips_control_chars():
+    # Caminho ASCII (tabela de tradução) e caminho unicode (NFKC + categorias)
+    assert sanitize_text(" Rua\x00 A\x7f, 10\r\n") == "Rua A, 10"
+    assert sanitize_text("Ｃａｆé\u200b\x07 ") == "Café"
+    assert sanitize_text(123) == "123"
+
+def test_text_caches_process_each_value_once():
+    clear_text_caches()
+    for _ in range(3):
+        assert sanitize_text("Consórcio Hube") == "Consórcio Hube"
+        assert clean_filename_text("São Paulo") == "SAO_PAULO"
+        assert normalize_col_name("Nº da cobrança") == "nodacobranca"
+    stats = get_text_cache_stats()
+    assert stats["sanitize_text"] == (2, 1)
+    assert stats["clean_filename_text"] == (2, 1)
+    assert stats["normalize_col_name"] == (2, 1)
+
+    snapshot = get_text_cache_stats()
+    sanitize_text("Consórcio Hube")
+    assert format_text_cache_hit_rates(snapshot) == "sanitize_text: 100% de 1"
     
 # Testes para format_currency
 def test_format_currency_valid():
@@ -40,6 +70,28 @@ def test_parse_currency_valid():
 def test_parse_currency_none():
     assert parse_currency(None) == 0.0
 
+def test_parse_currency_us_style():
+    assert parse_currency("1,234.56") == 1234.56
+    assert format_currency("$1,234.56".replace("$", "")) == "R$ 1.234,56"
+
+# Testes para as versões colunares
+def test_parse_currency_series():
+    s = pd.Series(["R$ 1.000,50", "1,234.56", "1000.50", "", None, "abc", 7.25])
+    valores, invalidos = parse_currency_series(s)
+    assert valores.tolist() == [1000.50, 1234.56, 1000.50, 0.0, 0.0, 0.0, 7.25]
+    assert invalidos.tolist() == [False, False, False, False, False, True, False]
+
+def test_currency_series_all_nan_numeric_column():
+    s = pd.Series([np.nan, np.nan])
+    valores, invalidos = parse_currency_series(s)
+    assert valores.tolist() == [0.0, 0.0]
+    assert invalidos.tolist() == [False, False]
+    assert format_currency_series(s).tolist() == ["R$ 0,00", "R$ 0,00"]
+
+def test_format_currency_series_matches_scalar():
+    s = pd.Series(["R$ 1.000,50", "1,234.56", "1000.5", "", None, "invalid", 1000.50, "-3,2"])
+    assert format_currency_series(s).tolist() == [format_currency(v) for v in s]
+
 # Testes para clean_filename_text
 def test_clean_filename_text_basic():
     assert clean_filename_text("Empresa S.A.") == "EMPRESA_SA"
@@ -78,3 +130,36 @@ def test_prepare_context_fallbacks():
     
     ctx = prepare_context(row)
     assert ctx['dados_bancarios'] == "Banco X - Ag 123 - CC 456"
+
+def test_prepare_contexts_matches_prepare_context():
+    df = pd.DataFrame({
+        'Instalacao': ['111', None, '333'],
+        'Razão Social': ['Empresa A', 'Fulano de Tal', ''],
+        'CPF': ['12.345.678/0001-90', '123.456.789-01', None],
+        'Endereco Consorcio': ['Rua X, 1', 'Rua Y, 2', None],
+        'Cidade': ['Campinas', None, 'Santos'],
+        'UF': ['SP', 'SP', 'SP'],
+        'Total calculado R$': ['1.234,56', None, '10.5'],
+        'Total': ['999', '2,50', '1'],
+        'Data de Emissão': ['01/02/2024', '01/02/2024', '01/02/2024'],
+    })
+
+    for mask in (True, False):
+        batch = prepare_contexts(df, mask_data=mask)
+        single = [prepare_context(row, mask_data=mask) for _, row in df.iterrows()]
+        assert batch == single
+
+    ctx = prepare_contexts(df)
+    assert ctx[0]['endereco_consorciado'] == 'Rua X, 1, Campinas - SP'
+    assert ctx[0]['total_pagar'] == 'R$ 1.234,56'
+    assert ctx[1]['total_pagar'] == 'R$ 2,50'
+    assert ctx[1]['_raw_total'] == 2.5
+    assert ctx[1]['numero_instalacao'] == ''
+    assert ctx[2]['numero_instalacao'] == '333'
+
+def test_compile_context_plan_positions():
+    plan = compile_context_plan(['CNPJ', 'Nome', 'cpf', 'Número da Conta'])
+    assert plan.fields['razao_social'] == (1,)
+    assert plan.fields['cnpj_consorciado'] == (0, 2)
+    assert plan.fields['dados_bancarios'] == (3,)
+    assert plan.fields['economia_mes'] == ()
@@ -0,0 +1,187 @@
+import zipfile
+import pytest
+import pandas as pd
+from io import BytesIO
+from pypdf import PdfReader
+from src.services.zip_builder import generate_notes_zip, generate_notes_pdf, create_zip_output
+from src.services.pdf_engine import get_compiled_template
+
+TEMPLATE = "<html><body><p>{{ razao_social }}</p><p>{{ total_pagar }}</p></body></html>"
+
+def make_df(n=6):
+    return pd.DataFrame({
+        'Nome': [f'Cliente {i}' for i in range(n)],
+        'CNPJ/CPF': ['123.456.789-01'] * n,
+        'Vencimento': ['01/01/2099'] * n,
+        'Nº da cobrança': [f'COB{i:04d}' for i in range(n)],
+        'Total a pagar': ['R$ 1.500,00'] * n,
+    })
+
+def test_generate_notes_zip_parallel_matches_serial():
+    df = make_df()
+    serial_calls, parallel_calls = [], []
+
+    buf_s, rel_s, err_s = generate_notes_zip(
+        df, TEMPLATE, progress_callback=lambda c, t: serial_calls.append((c, t)), workers=1
+    )
+    buf_p, rel_p, err_p = generate_notes_zip(
+        df, TEMPLATE, progress_callback=lambda c, t: parallel_calls.append((c, t)), workers=2
+    )
+
+    assert rel_p == rel_s
+    assert err_p == err_s == []
+    assert parallel_calls == serial_calls == [(i + 1, 6) for i in range(6)]
+
+    with zipfile.ZipFile(buf_s) as zs, zipfile.ZipFile(buf_p) as zp:
+        assert zp.namelist() == zs.namelist()
+        assert zp.namelist()[-1] == "relatorio_processamento.csv"
+
+def test_generate_notes_zip_parallel_reports_errors():
+    df = make_df(3)
+    broken = "{{ razao_social.missing() }}"
+
+    _, rel_s, err_s = generate_notes_zip(df, broken, workers=1)
+    _, rel_p, err_p = generate_notes_zip(df, broken, workers=2)
+
+    assert [r['status'] for r in rel_p] == ['ERRO'] * 3
+    assert rel_p == rel_s
+    assert err_p == err_s
+
+def test_generate_notes_zip_disk_output():
+    df = make_df(3)
+
+    out = create_zip_output("disk")
+    buf, rel, _ = generate_notes_zip(df, TEMPLATE, workers=1, output=out)
+
+    assert buf is out
+    with zipfile.ZipFile(buf) as zf:
+        assert len(zf.namelist()) == 4
+        assert zf.namelist() == [r['nome_arquivo_pdf'] for r in rel] + ["relatorio_processamento.csv"]
+    buf.close()
+
+def test_create_zip_output_invalid_mode():
+    with pytest.raises(ValueError):
+        create_zip_output("nuvem")
+
+def test_generate_notes_zip_parallel_with_registry_template():
+    df = make_df(3)
+    template = get_compiled_template("Modelo_Simples_Hube.html")
+
+    _, rel_s, _ = generate_notes_zip(df, template, workers=1)
+    _, rel_p, _ = generate_notes_zip(df, template, workers=2)
+
+    assert [r['status'] for r in rel_p] == ['SUCESSO'] * 3
+    assert rel_p == rel_s
+
+def test_generate_notes_zip_engines_produce_same_files():
+    df = make_df(3)
+    template = get_compiled_template("Modelo_Padrao_Hube.html")
+
+    buf_n, rel_n, err_n = generate_notes_zip(df, template, workers=1, engine="reportlab")
+    buf_h, rel_h, err_h = generate_notes_zip(df, template, workers=1, engine="xhtml2pdf")
+
+    assert err_n == err_h == []
+    assert rel_n == rel_h
+    with zipfile.ZipFile(buf_n) as zn:
+        assert zn.read(rel_n[0]['nome_arquivo_pdf']).startswith(b"%PDF")
+
+TIMING_COLUMNS = ["tempo_contexto_ms", "tempo_render_ms", "tempo_pdf_ms", "tempo_zip_ms",
+                  "tempo_total_ms", "tamanho_pdf_bytes"]
+
+def test_generate_notes_zip_timings_columns():
+    df = make_df(3)
+
+    _, rel_off, _ = generate_notes_zip(df, TEMPLATE, workers=1)
+    _, rel_s, _ = generate_notes_zip(df, TEMPLATE, workers=1, timings=True)
+    _, rel_p, _ = generate_notes_zip(df, TEMPLATE, workers=2, timings=True)
+
+    assert not set(TIMING_COLUMNS) & set(rel_off[0])
+    for rel in (rel_s, rel_p):
+        assert list(rel[0])[-len(TIMING_COLUMNS):] == TIMING_COLUMNS
+        assert all(r["tamanho_pdf_bytes"] > 0 and r["tempo_pdf_ms"] > 0 for r in rel)
+        assert all(r["tempo_total_ms"] >= r["tempo_pdf_ms"] for r in rel)
+        # Sem as colunas de instrumentação, o relatório é o mesmo
+        assert [{k: v for k, v in r.items() if k not in TIMING_COLUMNS} for r in rel] == rel_off
+
+def test_generate_notes_zip_timings_native_has_no_render_stage():
+    template = get_compiled_template("Modelo_Simples_Hube.html")
+
+    _, rel, _ = generate_notes_zip(make_df(2), template, workers=1, engine="reportlab", timings=True)
+
+    assert [r["tempo_render_ms"] for r in rel] == ["", ""]
+    assert all(r["tempo_pdf_ms"] > 0 for r in rel)
+
+def test_generate_notes_zip_profile_dump(tmp_path, monkeypatch):
+    import pstats
+    from config.settings import settings
+    monkeypatch.setattr(settings, "LOGS_DIR", tmp_path)
+
+    generate_notes_zip(make_df(2), TEMPLATE, workers=1, profile=True)
+
+    dumps = list((tmp_path / "profiles").glob("generate_notes_zip_*.pstats"))
+    assert len(dumps) == 1
+    assert pstats.Stats(str(dumps[0])).total_calls > 0
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_generate_notes_zip_from_chunks_matches_dataframe(workers):
+    df = make_df(5)
+    chunks = (df.iloc[start:start + 2] for start in range(0, 5, 2))
+    calls = []
+
+    buf_c, rel_c, err_c = generate_notes_zip(
+        chunks, TEMPLATE, workers=workers, progress_callback=lambda c, t: calls.append((c, t))
+    )
+    buf_d, rel_d, err_d = generate_notes_zip(df, TEMPLATE, workers=1)
+
+    assert rel_c == rel_d
+    assert err_c == err_d == []
+    assert calls == [(i + 1, None) for i in range(5)]
+    with zipfile.ZipFile(buf_c) as zc, zipfile.ZipFile(buf_d) as zd:
+        assert zc.namelist() == zd.namelist()
+
+def test_generate_notes_zip_numbers_rows_by_position():
+    df = make_df(4).set_index(pd.Index(['x', 'y', 'z', 'w']))
+    df['Nº da cobrança'] = ''
+
+    buf, rel, err = generate_notes_zip(df.iloc[::-1], TEMPLATE, workers=1)
+    assert [r['linha_planilha'] for r in rel] == [2, 3, 4, 5]
+    assert [r['nome_arquivo_pdf'].rsplit('_', 1)[1] for r in rel] == ['L1.pdf', 'L2.pdf', 'L3.pdf', 'L4.pdf']
+
+    # Shard com 10 linhas antes dele e duas linhas já geradas: as demais mantêm a numeração
+    calls = []
+    _, rel, _ = generate_notes_zip(
+        df, TEMPLATE, workers=2, row_offset=10, skip_rows={12, 14},
+        progress_callback=lambda c, t: calls.append((c, t))
+    )
+    assert [r['linha_planilha'] for r in rel] == [13, 15]
+    assert calls == [(1, 2), (2, 2)]
+
+@pytest.mark.parametrize("engine", ["reportlab", "xhtml2pdf"])
+def test_generate_notes_pdf_merges_notes_with_bookmarks(engine):
+    df = make_df(5)
+    template = get_compiled_template("Modelo_Padrao_Hube.html")
+
+    buf, rel, err = generate_notes_pdf(df, template, engine=engine, notes_per_file=3)
+
+    assert err == []
+    assert [(r['nome_arquivo_pdf'], r['pagina_inicial']) for r in rel] == [
+        ("NOTAS_001.pdf", 1), ("NOTAS_001.pdf", 2), ("NOTAS_001.pdf", 3),
+        ("NOTAS_002.pdf", 1), ("NOTAS_002.pdf", 2),
+    ]
+    with zipfile.ZipFile(buf) as zf:
+        assert zf.namelist() == ["NOTAS_001.pdf", "NOTAS_002.pdf", "relatorio_processamento.csv"]
+        reader = PdfReader(BytesIO(zf.read("NOTAS_001.pdf")))
+    assert len(reader.pages) == 3
+    assert [item.title.split(" - ")[0] for item in reader.outline] == ["COB0000", "COB0001", "COB0002"]
+
+def test_generate_notes_pdf_single_file_and_errors():
+    df = make_df(4)
+    template = "<html><body><p>{{ razao_social }}</p>{% if numero_cobranca == 'COB0002' %}{{ 1 / 0 }}{% endif %}</body></html>"
+
+    buf, rel, err = generate_notes_pdf(df, template, notes_per_file=0)
+
+    assert [r['status'] for r in rel] == ['SUCESSO', 'SUCESSO', 'ERRO', 'SUCESSO']
+    assert len(err) == 1 and err[0].startswith("Linha 4")
+    assert [r['pagina_inicial'] for r in rel] == [1, 2, '', 3]
+    with zipfile.ZipFile(buf) as zf:
+        assert zf.namelist() == ["NOTAS_001.pdf", "relatorio_processamento.csv"]